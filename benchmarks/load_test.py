@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""Drive a traffic mix against a running server and report throughput and latency.
+
+Seed a dataset first with benchmarks/seed_dataset.py, start the server, then run one
+or more mixes:
+
+    python benchmarks/load_test.py --mix browse --duration 30 --concurrency 32
+    python benchmarks/load_test.py --mix browse chat-poll login --output results.json
+
+Mixes:
+  browse     store listing pages, store and catalogue reads, search and nearby lookups
+  chat-poll  many participants polling /api/chats/sync without waiting, with occasional sends
+             (each worker logs in as its participant first)
+  login      a burst of customer and shopkeeper logins (bcrypt bound)
+
+Results are JSON: per mix and per route, request count, errors, throughput, latency
+percentiles and database statements per request (read from the server's /metrics,
+so the load generator must run on the same machine as the server).
+"""
+import argparse
+import gzip
+import http.client
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+from datetime import datetime, timezone
+
+DEFAULT_MANIFEST = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dataset.json')
+METRIC_LINE = re.compile(r'^localkirana_db_queries_per_request_(sum|count)\{route="([^"]*)",method="([^"]*)"\} (\S+)$')
+WORKERS_LINE = re.compile(r'^localkirana_workers(_reporting)? (\S+)$')
+
+class Client:
+    """One keep-alive HTTP connection per worker, reopened whenever the server closes it"""
+
+    def __init__(self, base_url, timeout):
+        parsed = urllib.parse.urlparse(base_url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.timeout = timeout
+        self.conn = None
+
+    def request(self, method, path, body=None, token=None):
+        """Send one request, as the session token's user if given, and return (status code, decoded body bytes)"""
+        headers = {'Accept-Encoding': 'gzip'}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self.conn.request(method, path, body=payload, headers=headers)
+                response = self.conn.getresponse()
+                data = response.read()
+                if response.getheader('Content-Encoding') == 'gzip':
+                    data = gzip.decompress(data)
+                if response.will_close:
+                    self.close()
+                return response.status, data
+            except (http.client.HTTPException, ConnectionError):
+                # A connection the server already closed fails once; retry on a fresh one
+                self.close()
+                if attempt:
+                    raise
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+class Mix:
+    """Picks the next request of a traffic mix; each worker gets its own instance and RNG"""
+
+    def __init__(self, manifest, rng):
+        self.manifest = manifest
+        self.rng = rng
+        # Session token the requests are sent with, once the mix has logged in
+        self.token = None
+
+    def next_request(self):
+        """Return (route label, method, path, body)"""
+        raise NotImplementedError
+
+    def observe(self, route, status, data):
+        """See a response, e.g. to carry a cursor into the next request"""
+
+class BrowseMix(Mix):
+    def next_request(self):
+        m, rng = self.manifest, self.rng
+        roll = rng.random()
+        if roll < 0.35:
+            page = rng.randint(1, max(1, m['counts']['stores'] // 50))
+            return '/api/stores', 'GET', f'/api/stores?page={page}', None
+        if roll < 0.55:
+            return '/api/stores/{id}', 'GET', f'/api/stores/{rng.choice(m["store_ids"])}', None
+        if roll < 0.70:
+            return ('/api/stores/{id}/products', 'GET',
+                    f'/api/stores/{rng.choice(m["store_ids"])}/products', None)
+        if roll < 0.90:
+            query = urllib.parse.urlencode({'q': rng.choice(m['search_terms']), 'limit': 20})
+            return '/api/search', 'GET', f'/api/search?{query}', None
+        if roll < 0.95:
+            return ('/api/stores/nearby', 'GET',
+                    f'/api/stores/nearby?pincode={rng.choice(m["pincodes"])}&k=10', None)
+        customer = rng.choice(m['customers'])
+        return '/api/bookings', 'GET', f'/api/bookings?customerId={customer["id"]}&limit=20', None
+
+class ChatPollMix(Mix):
+    def __init__(self, manifest, rng):
+        super().__init__(manifest, rng)
+        self.chat = rng.choice(manifest['chats'])
+        self.cursor = 0
+        # Sync only answers for the logged-in participant, so each worker polls as one side
+        if rng.random() < 0.5:
+            self.participant = ('customer', self.chat['customer_id'], self.chat['customer_phone'])
+        else:
+            self.participant = ('shopkeeper', self.chat['store_id'], self.chat['store_phone'])
+
+    def next_request(self):
+        chat, rng = self.chat, self.rng
+        participant_type, participant_id, phone = self.participant
+        if self.token is None:
+            route = f'/api/{participant_type}-login'
+            return route, 'POST', route, {'phone': phone, 'password': self.manifest['password']}
+        if rng.random() < 0.05:
+            body = {'id': chat['chat_id'], 'message': 'Is it available?',
+                    'senderId': participant_id, 'senderType': participant_type}
+            return '/api/save-chat', 'POST', '/api/save-chat', body
+        participant = f'participantType={participant_type}&participantId={participant_id}'
+        return ('/api/chats/sync', 'GET',
+                f'/api/chats/sync?{participant}&after={self.cursor}&wait=0', None)
+
+    def observe(self, route, status, data):
+        if route.endswith('-login') and status == 200:
+            self.token = json.loads(data).get('token')
+        if route == '/api/chats/sync' and status == 200:
+            self.cursor = max(self.cursor, json.loads(data).get('cursor') or 0)
+
+class LoginMix(Mix):
+    def next_request(self):
+        m, rng = self.manifest, self.rng
+        if rng.random() < 0.8:
+            body = {'phone': rng.choice(m['customers'])['phone'], 'password': m['password']}
+            return '/api/customer-login', 'POST', '/api/customer-login', body
+        body = {'phone': rng.choice(m['store_phones']), 'password': m['password']}
+        return '/api/shopkeeper-login', 'POST', '/api/shopkeeper-login', body
+
+MIXES = {'browse': BrowseMix, 'chat-poll': ChatPollMix, 'login': LoginMix}
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def scrape_queries(base_url, timeout):
+    """Return {route: [statements, requests]} from the server's per-request statement histogram"""
+    client = Client(base_url, timeout)
+    try:
+        status, data = client.request('GET', '/metrics')
+    except (OSError, http.client.HTTPException):
+        return None
+    finally:
+        client.close()
+    if status != 200:
+        return None
+    totals = {}
+    workers = {}
+    for line in data.decode('utf-8').splitlines():
+        match = METRIC_LINE.match(line)
+        if match:
+            kind, route, _, value = match.groups()
+            totals.setdefault(route, [0.0, 0.0])[0 if kind == 'sum' else 1] += float(value)
+        match = WORKERS_LINE.match(line)
+        if match:
+            workers['reporting' if match.group(1) else 'total'] = float(match.group(2))
+    # A multi-worker server adds every worker's counts into the scrape; one that timed out is missing
+    if workers.get('reporting', 1) < workers.get('total', 1):
+        print(f"Warning: /metrics covered {workers['reporting']:g} of {workers['total']:g} workers, "
+              f"so db_queries_per_request is unreliable", file=sys.stderr)
+    return totals
+
+def run_mix(name, args, manifest):
+    """Run one mix for the configured duration and summarise it"""
+    deadline_warmup = time.monotonic() + args.warmup
+    deadline = deadline_warmup + args.duration
+    samples = {}   # route -> list of latencies in seconds
+    errors = {}    # route -> count
+    lock = threading.Lock()
+    before = {}
+
+    def worker(index):
+        rng = random.Random(f'{args.seed}-{name}-{index}')
+        mix = MIXES[name](manifest, rng)
+        client = Client(args.base_url, args.timeout)
+        local_samples, local_errors = {}, {}
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            route, method, path, body = mix.next_request()
+            start = time.perf_counter()
+            try:
+                status, data = client.request(method, path, body, mix.token)
+            except (OSError, http.client.HTTPException):
+                status = data = None
+            elapsed = time.perf_counter() - start
+            if status is not None:
+                mix.observe(route, status, data)
+            if now < deadline_warmup:
+                continue
+            local_samples.setdefault(route, []).append(elapsed)
+            if status is None or status >= 400:
+                local_errors[route] = local_errors.get(route, 0) + 1
+        client.close()
+        with lock:
+            for route, values in local_samples.items():
+                samples.setdefault(route, []).extend(values)
+            for route, count in local_errors.items():
+                errors[route] = errors.get(route, 0) + count
+
+    def snapshot_after_warmup():
+        time.sleep(args.warmup)
+        before.update(scrape_queries(args.base_url, args.timeout) or {})
+
+    snapshotter = threading.Thread(target=snapshot_after_warmup)
+    snapshotter.start()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    snapshotter.join()
+    after = scrape_queries(args.base_url, args.timeout)
+
+    routes = {}
+    all_latencies = []
+    for route, values in sorted(samples.items()):
+        values.sort()
+        all_latencies.extend(values)
+        summary = summarise(values, errors.get(route, 0), args.duration)
+        # The server's counters include warmup stragglers and other clients, so this is approximate
+        if after is not None and route in after:
+            total, count = after[route]
+            base_total, base_count = before.get(route, (0.0, 0.0))
+            if count > base_count:
+                summary['db_queries_per_request'] = round((total - base_total) / (count - base_count), 2)
+        routes[route] = summary
+    all_latencies.sort()
+    result = summarise(all_latencies, sum(errors.values()), args.duration)
+    result['routes'] = routes
+    return result
+
+def summarise(latencies, error_count, duration):
+    ms = lambda value: None if value is None else round(value * 1000, 3)
+    return {
+        'requests': len(latencies),
+        'errors': error_count,
+        'throughput_rps': round(len(latencies) / duration, 2),
+        'p50_ms': ms(percentile(latencies, 0.50)),
+        'p90_ms': ms(percentile(latencies, 0.90)),
+        'p99_ms': ms(percentile(latencies, 0.99)),
+        'max_ms': ms(latencies[-1] if latencies else None),
+    }
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--mix', nargs='+', choices=sorted(MIXES), default=['browse'])
+    parser.add_argument('--duration', type=float, default=30, help='measured seconds per mix')
+    parser.add_argument('--warmup', type=float, default=5, help='unmeasured seconds before each mix')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--manifest', default=DEFAULT_MANIFEST)
+    parser.add_argument('--output', help='also write the JSON results to this file')
+    args = parser.parse_args()
+
+    try:
+        with open(args.manifest, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        sys.exit(f"No dataset manifest at {args.manifest}; run benchmarks/seed_dataset.py first")
+
+    results = {
+        'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'base_url': args.base_url,
+        'dataset': {'scale': manifest['scale'], 'seed': manifest['seed']},
+        'concurrency': args.concurrency,
+        'duration_s': args.duration,
+        'mixes': {name: run_mix(name, args, manifest) for name in args.mix},
+    }
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+
+if __name__ == '__main__':
+    main()
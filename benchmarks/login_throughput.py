@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""Compare bcrypt login verification throughput inline vs. on the worker pool.
+
+Usage: python benchmarks/login_throughput.py [--logins 200] [--threads 16]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bcrypt
+from services.auth import PasswordHasher
+
+def run(verify, hashed, logins, threads):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(lambda _: verify('password123', hashed), range(logins)))
+    return logins / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=16)
+    args = parser.parse_args()
+
+    hashed = bcrypt.hashpw(b'password123', bcrypt.gensalt()).decode('utf-8')
+    cores = os.cpu_count() or 1
+
+    # Before: bcrypt inline on a single-threaded server, one login at a time
+    inline = run(lambda p, h: bcrypt.checkpw(p.encode('utf-8'), h.encode('utf-8')), hashed, args.logins, 1)
+
+    hasher = PasswordHasher()
+    hasher.start()
+    hasher.verify_password('warmup', hashed)
+    pooled = run(hasher.verify_password, hashed, args.logins, args.threads)
+    hasher.shutdown()
+
+    print(json.dumps({
+        'cores': cores,
+        'bcrypt_workers': hasher.workers,
+        'inline_logins_per_sec': round(inline, 2),
+        'pooled_logins_per_sec': round(pooled, 2),
+        'inline_logins_per_sec_per_core': round(inline / cores, 2),
+        'pooled_logins_per_sec_per_core': round(pooled / cores, 2),
+    }, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""Seed a reproducible benchmark dataset into the configured database.
+
+Rows are generated from a fixed random seed, so the same --scale and --seed always
+produce the same data. Seeded stores and customers use @bench.localkirana emails
+and are removed by --reset along with their chats (bookings, products, requests and
+messages cascade). A manifest of ids, phones and search terms is written for
+benchmarks/load_test.py.
+
+Usage: python benchmarks/seed_dataset.py --scale 100k [--seed 42] [--reset]
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.connection import db
+from services.auth import password_hasher
+from services.bulk_catalogue import batched
+from services.product_search import parse_price
+
+BENCH_DOMAIN = 'bench.localkirana'
+BENCH_PASSWORD = 'bench-password'
+DEFAULT_MANIFEST = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dataset.json')
+INSERT_BATCH = 1000
+
+# Row counts per scale; the scale name is the number of products
+SCALES = {
+    '1k': {'stores': 20, 'products': 1000, 'customers': 200, 'bookings': 1000,
+           'requests': 500, 'chats': 200, 'messages': 1000},
+    '100k': {'stores': 1000, 'products': 100000, 'customers': 10000, 'bookings': 100000,
+             'requests': 50000, 'chats': 10000, 'messages': 100000},
+    '1m': {'stores': 10000, 'products': 1000000, 'customers': 100000, 'bookings': 1000000,
+           'requests': 500000, 'chats': 100000, 'messages': 1000000},
+}
+
+CATEGORIES = ['grocery', 'medical', 'stationery', 'electronics', 'general']
+ITEMS = {
+    'grocery': ['rice', 'dal', 'oil', 'sugar', 'atta', 'salt', 'tea', 'coffee', 'ghee', 'poha'],
+    'medical': ['paracetamol', 'syrup', 'bandage', 'antiseptic', 'thermometer', 'vitamin', 'ors', 'balm'],
+    'stationery': ['notebook', 'pen', 'pencil', 'eraser', 'stapler', 'marker', 'folder', 'glue'],
+    'electronics': ['charger', 'earphones', 'powerbank', 'cable', 'adapter', 'speaker', 'mouse', 'bulb'],
+    'general': ['soap', 'shampoo', 'toothpaste', 'detergent', 'candle', 'matchbox', 'broom', 'bucket'],
+}
+BRANDS = ['tata', 'amul', 'patanjali', 'fortune', 'aashirvaad', 'dabur', 'classmate', 'boat', 'syska', 'surf']
+SIZES = ['100g', '250g', '500g', '1kg', '5kg', '1L', 'pack of 2', 'pack of 10', 'large', 'small']
+STATUSES = ['pending', 'accepted', 'rejected', 'completed']
+
+def load_pincodes():
+    """Pincodes from the centroid table, so nearby-store queries find the seeded stores"""
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'pincode_centroids.csv')
+    with open(path, newline='', encoding='utf-8') as f:
+        return [row['pincode'] for row in csv.DictReader(line for line in f if not line.startswith('#'))]
+
+def insert_rows(query, rows):
+    """Insert rows in batches, one transaction per batch"""
+    total = 0
+    for batch in batched(rows, INSERT_BATCH):
+        with db.transaction():
+            db.execute_many(query, batch)
+        total += len(batch)
+    return total
+
+def select_ids(query, params=()):
+    ids = []
+    for rows in db.stream_query(query, params, batch_size=10000):
+        ids.extend(row['id'] for row in rows)
+    return ids
+
+def reset():
+    """Delete every seeded row"""
+    pattern = f'%@{BENCH_DOMAIN}'
+    with db.checkout():
+        db.execute("""DELETE FROM chats WHERE participant1_type = 'customer'
+                      AND participant1_id IN (SELECT id FROM customers WHERE email LIKE %s)""", (pattern,))
+        db.execute("DELETE FROM customers WHERE email LIKE %s", (pattern,))
+        db.execute("DELETE FROM stores WHERE email LIKE %s", (pattern,))
+
+def seed(scale, seed_value):
+    counts = SCALES[scale]
+    rng = random.Random(seed_value)
+    pincodes = load_pincodes()
+    password_hash = password_hasher.hash_password(BENCH_PASSWORD)
+    now = datetime.now().replace(microsecond=0)
+    timings = {}
+
+    def timed(name, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        timings[name] = round(time.perf_counter() - start, 3)
+        return result
+
+    def created_at():
+        return now - timedelta(seconds=rng.randrange(90 * 24 * 3600))
+
+    # Phones are unique per run of a seed: +91 7<seed:3><index:6> for stores, +91 6... for customers
+    stores = []
+    for i in range(counts['stores']):
+        category = CATEGORIES[i % len(CATEGORIES)]
+        stores.append((f'Bench Store {i}', f'Owner {i}', f'+91 7{seed_value % 1000:03d}{i:06d}',
+                       f'store{i}.{seed_value}@{BENCH_DOMAIN}', f'{i} Bench Road', rng.choice(pincodes),
+                       category, password_hash))
+    with db.checkout():
+        timed('stores', insert_rows,
+              """INSERT INTO stores (shop_name, owner_name, phone, email, address, pincode, category, password_hash)
+                 VALUES (%s, %s, %s, %s, %s, %s, %s, %s)""", stores)
+        store_ids = select_ids("SELECT id FROM stores WHERE email LIKE %s ORDER BY id",
+                               (f'%.{seed_value}@{BENCH_DOMAIN}',))
+        store_categories = {store_id: stores[i][6] for i, store_id in enumerate(store_ids)}
+
+        search_terms = set()
+
+        def products():
+            for i in range(counts['products']):
+                store_id = store_ids[i % len(store_ids)]
+                item = rng.choice(ITEMS[store_categories[store_id]])
+                brand = rng.choice(BRANDS)
+                search_terms.add(item)
+                price = f'₹{rng.randrange(5, 2000)}'
+                yield (store_id, f'{brand.title()} {item.title()} ({rng.choice(SIZES)})', price,
+                       f'{brand} {item}', rng.random() > 0.1, parse_price(price))
+        timed('products', insert_rows,
+              """INSERT INTO products (store_id, name, price, description, available, price_value)
+                 VALUES (%s, %s, %s, %s, %s, %s)""", products())
+
+        customers = [(f'Bench Customer {i}', f'+91 6{seed_value % 1000:03d}{i:06d}',
+                      f'customer{i}.{seed_value}@{BENCH_DOMAIN}', f'Sector {i % 100}', password_hash)
+                     for i in range(counts['customers'])]
+        timed('customers', insert_rows,
+              """INSERT INTO customers (name, phone, email, location, password_hash)
+                 VALUES (%s, %s, %s, %s, %s)""", customers)
+        customer_ids = select_ids("SELECT id FROM customers WHERE email LIKE %s ORDER BY id",
+                                  (f'%.{seed_value}@{BENCH_DOMAIN}',))
+
+        product_ids = {}
+        for rows in db.stream_query(
+                "SELECT p.id, p.store_id, p.name FROM products p JOIN stores s ON s.id = p.store_id "
+                "WHERE s.email LIKE %s ORDER BY p.id", (f'%.{seed_value}@{BENCH_DOMAIN}',), batch_size=10000):
+            for row in rows:
+                product_ids.setdefault(row['store_id'], []).append((row['id'], row['name']))
+
+        def bookings():
+            for _ in range(counts['bookings']):
+                index = rng.randrange(len(customer_ids))
+                store_index = rng.randrange(len(store_ids))
+                product_id, item_name = rng.choice(product_ids[store_ids[store_index]])
+                yield (customer_ids[index], store_ids[store_index], product_id, customers[index][0],
+                       customers[index][1], stores[store_index][0], stores[store_index][2], item_name,
+                       rng.choice(STATUSES), created_at())
+        timed('bookings', insert_rows,
+              """INSERT INTO bookings (customer_id, store_id, product_id, customer_name, customer_phone,
+                                       store_name, store_phone, item_name, status, created_at)
+                 VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""", bookings())
+
+        def requests():
+            for _ in range(counts['requests']):
+                index = rng.randrange(len(customer_ids))
+                category = rng.choice(CATEGORIES)
+                yield (customer_ids[index], customers[index][0], customers[index][1], customers[index][3],
+                       rng.choice(ITEMS[category]).title(), str(rng.randrange(1, 5)), '',
+                       'All Stores', rng.choice(STATUSES), created_at())
+        timed('requests', insert_rows,
+              """INSERT INTO requests (customer_id, customer_name, customer_phone, customer_location,
+                                       item_name, quantity, description, target_store, status, created_at)
+                 VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""", requests())
+
+        # Chat ids follow the app's customer_<id>_shopkeeper_<id> format so new messages notify pollers
+        chats = []
+        pairs = set()
+        while len(chats) < counts['chats']:
+            customer_id, store_id = rng.choice(customer_ids), rng.choice(store_ids)
+            if (customer_id, store_id) in pairs:
+                continue
+            pairs.add((customer_id, store_id))
+            chats.append((f'customer_{customer_id}_shopkeeper_{store_id}', customer_id, 'customer',
+                          store_id, 'shopkeeper', 'Hello', now))
+        timed('chats', insert_rows,
+              """INSERT INTO chats (chat_id, participant1_id, participant1_type, participant2_id,
+                                    participant2_type, last_message, last_message_time)
+                 VALUES (%s, %s, %s, %s, %s, %s, %s)""", chats)
+
+        def messages():
+            for _ in range(counts['messages']):
+                chat = rng.choice(chats)
+                if rng.random() < 0.5:
+                    sender_id, sender_type = chat[1], 'customer'
+                else:
+                    sender_id, sender_type = chat[3], 'shopkeeper'
+                yield (chat[0], sender_id, sender_type, rng.choice(['Is it available?', 'Yes', 'Thanks!']),
+                       created_at())
+        timed('messages', insert_rows,
+              """INSERT INTO messages (chat_id, sender_id, sender_type, message, created_at)
+                 VALUES (%s, %s, %s, %s, %s)""", messages())
+
+    sample = rng.sample(range(len(customer_ids)), min(1000, len(customer_ids)))
+    customer_phones = dict(zip(customer_ids, (customer[1] for customer in customers)))
+    store_phones = dict(zip(store_ids, (store[2] for store in stores)))
+    return {
+        'scale': scale,
+        'seed': seed_value,
+        'counts': counts,
+        'seed_seconds': timings,
+        'password': BENCH_PASSWORD,
+        'store_ids': store_ids[:10000],
+        'store_phones': [stores[i][2] for i in range(min(1000, len(stores)))],
+        'customers': [{'id': customer_ids[i], 'phone': customers[i][1]} for i in sample],
+        # Pollers log in as one of the chat's participants, so they need the phones too
+        'chats': [{'chat_id': chat[0], 'customer_id': chat[1], 'store_id': chat[3],
+                   'customer_phone': customer_phones[chat[1]], 'store_phone': store_phones[chat[3]]}
+                  for chat in chats[:1000]],
+        'pincodes': sorted({store[5] for store in stores})[:1000],
+        'categories': CATEGORIES,
+        'search_terms': sorted(search_terms),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', choices=sorted(SCALES), default='1k')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--reset', action='store_true', help='delete previously seeded rows first')
+    parser.add_argument('--manifest', default=DEFAULT_MANIFEST)
+    args = parser.parse_args()
+
+    if not db.connect():
+        sys.exit("Cannot connect to the database; check the DB_* environment variables")
+    password_hasher.workers = 0
+    if args.reset:
+        reset()
+    manifest = seed(args.scale, args.seed)
+    with open(args.manifest, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, default=str)
+    print(json.dumps({'scale': args.scale, 'seed': args.seed, 'manifest': args.manifest,
+                      'seed_seconds': manifest['seed_seconds']}, indent=2))
+    db.disconnect()
+
+if __name__ == '__main__':
+    main()
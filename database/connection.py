@@ -1,72 +1,692 @@
-import mysql.connector
-from mysql.connector import Error
+import itertools
 import os
+import queue
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 from dotenv import load_dotenv
+from database.errors import Error, InterfaceError, OperationalError, PoolError, ProgrammingError
+
+try:
+    import mysql.connector
+except ImportError:
+    # Only needed for the MySQL backend; SQLite deployments can run without it
+    mysql = None
 
 # Load environment variables
 load_dotenv()
 
+PLACEHOLDER = re.compile(r'%s')
+
+class StatementStats:
+    """Call count, total and worst time, and rows for each distinct SQL statement"""
+
+    def __init__(self, max_statements=500, slow_query_ms=200):
+        self.max_statements = max_statements
+        self.slow_query_seconds = slow_query_ms / 1000.0
+        self._lock = threading.Lock()
+        self._stats = {}  # normalized SQL -> [calls, total seconds, max seconds, rows]
+
+    def record(self, sql, seconds, rows):
+        with self._lock:
+            entry = self._stats.get(sql)
+            if entry is None:
+                # Dynamic SQL (IN lists, column lists) could grow this without bound
+                if len(self._stats) >= self.max_statements:
+                    sql = '<other>'
+                entry = self._stats.setdefault(sql, [0, 0.0, 0.0, 0])
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+            entry[3] += max(rows, 0)
+        if seconds >= self.slow_query_seconds:
+            print(f"Slow query ({seconds * 1000:.0f} ms, {rows} rows): {sql}")
+
+    def snapshot(self):
+        """Per-statement totals, most expensive first"""
+        with self._lock:
+            items = [(sql, list(entry)) for sql, entry in self._stats.items()]
+        return sorted(({'sql': sql, 'calls': calls, 'total_ms': round(total * 1000, 3),
+                        'max_ms': round(worst * 1000, 3), 'rows': rows}
+                       for sql, (calls, total, worst, rows) in items),
+                      key=lambda stat: stat['total_ms'], reverse=True)
+
+def normalize_sql(query):
+    """Collapse whitespace so the same statement always gets the same stats key"""
+    return ' '.join(query.split())
+
+class PreparedStatement:
+    """A server-side prepared statement bound to one connection"""
+
+    def __init__(self, key, sql, cursor):
+        self.key = key
+        self.sql = sql
+        self.cursor = cursor
+
+    def close(self):
+        try:
+            self.cursor.close()
+        except Error:
+            pass
+
+class ServerPool:
+    """Idle connections to one database server, and whether reads may be sent to it"""
+
+    def __init__(self, label, address, size):
+        self.label = label
+        self.address = address
+        self.size = size
+        # Idle connections as (connection, last_used) pairs; LIFO keeps the hottest ones in use
+        self.idle = queue.LifoQueue(maxsize=size)
+        self.opened = 0
+        self.in_use = 0
+        self.reads = 0
+        self.lock = threading.Lock()
+        self.healthy = True
+        self.lag = None
+        self.error = None
+        self.probe = None  # connection the replica health check runs on
+
+    def status(self):
+        return {'server': self.label, 'healthy': self.healthy, 'lag_seconds': self.lag,
+                'in_use': self.in_use, 'open': self.opened, 'reads': self.reads, 'error': self.error}
+
 class DatabaseConnection:
+    """Pooled MySQL connections; subclasses override the driver hooks for other engines.
+
+    Writes and transactions go to the primary (DB_HOST). With DB_REPLICAS set, reads
+    made inside replica_reads() go to the least busy healthy replica instead; a
+    background check takes replicas that are unreachable or more than
+    DB_REPLICA_MAX_LAG seconds behind out of rotation until they catch up.
+    """
+
+    name = 'MySQL'
+
     def __init__(self):
         self.host = os.getenv('DB_HOST', 'localhost')
         self.user = os.getenv('DB_USER')
         self.password = os.getenv('DB_PASSWORD')
         self.database = os.getenv('DB_NAME')
         self.port = int(os.getenv('DB_PORT', 3306))
-        self.connection = None
-    
+        self.pool_size = int(os.getenv('DB_POOL_SIZE', 10))
+        self.pool_timeout = float(os.getenv('DB_POOL_TIMEOUT', 10))
+        self.health_check_interval = float(os.getenv('DB_HEALTH_CHECK_INTERVAL', 30))
+        self.statement_cache_size = int(os.getenv('DB_STATEMENT_CACHE_SIZE', 64))
+        self.stats = StatementStats(slow_query_ms=float(os.getenv('DB_SLOW_QUERY_MS', 200)))
+        self.primary = ServerPool('primary', (self.host, self.port), self.pool_size)
+        self.replicas = [ServerPool(f'replica {entry.strip()}', self._replica_address(entry.strip()), self.pool_size)
+                         for entry in os.getenv('DB_REPLICAS', '').split(',') if entry.strip()]
+        self.replica_max_lag = float(os.getenv('DB_REPLICA_MAX_LAG', 5))
+        self.replica_check_interval = float(os.getenv('DB_REPLICA_CHECK_INTERVAL', 2))
+        # How long a client that wrote keeps reading from the primary; see replica_reads()
+        self.primary_sticky_seconds = float(os.getenv('DB_PRIMARY_STICKY_SECONDS', 5))
+        self._rotation = itertools.count()
+        self._replica_check_stop = threading.Event()
+        self._replica_checker = None
+        self._local = threading.local()
+        # Prepared statements per connection, least recently used first
+        self._statements = {}
+
+    def _replica_address(self, entry):
+        """Parse one DB_REPLICAS entry, host[:port]"""
+        host, _, port = entry.partition(':')
+        return host, int(port) if port else self.port
+
+    def _open(self, server):
+        """Open a new physical connection to a server"""
+        if mysql is None:
+            raise InterfaceError("mysql-connector-python is not installed; set DB_BACKEND=sqlite or install it")
+        host, port = server.address
+        return mysql.connector.connect(
+            host=host,
+            user=self.user,
+            password=self.password,
+            database=self.database,
+            port=port,
+            autocommit=True
+        )
+
+    def _replica_lag(self, conn):
+        """Seconds a replica is behind the primary, or None if its replication has stopped"""
+        cursor = conn.cursor(dictionary=True)
+        try:
+            try:
+                cursor.execute('SHOW REPLICA STATUS')
+            except ProgrammingError:
+                # MySQL before 8.0.22
+                cursor.execute('SHOW SLAVE STATUS')
+            row = cursor.fetchone()
+            cursor.fetchall()
+        finally:
+            cursor.close()
+        if row is None:
+            # Not replicating at all, e.g. a stand-in pointed at the primary itself
+            return 0.0
+        lag = row.get('Seconds_Behind_Source', row.get('Seconds_Behind_Master'))
+        return float(lag) if lag is not None else None
+
+    def _connection_failed(self, e):
+        """Whether an error means the connection itself is unusable"""
+        return isinstance(e, (OperationalError, InterfaceError))
+
+    def _ping(self, conn):
+        """Check an idle connection is still alive, reconnecting it if possible"""
+        conn.ping(reconnect=True, attempts=3, delay=0.2)
+
+    def _cursor(self, conn, dictionary=False):
+        return conn.cursor(dictionary=dictionary)
+
+    def _new_statement(self, conn, query):
+        key = normalize_sql(query)
+        # The cursor only skips re-preparing when handed the identical string object,
+        # so the ?-placeholder form is built once and reused for every execution
+        return PreparedStatement(key, PLACEHOLDER.sub('?', key), conn.cursor(prepared=True))
+
+    def _begin(self, conn):
+        conn.start_transaction()
+
+    def _commit(self, conn):
+        conn.commit()
+
+    def _rollback(self, conn):
+        conn.rollback()
+
+    def _discard(self, conn, server=None):
+        """Close a connection and free its slot in the pool"""
+        server = server or self.primary
+        self._statements.pop(conn, None)
+        try:
+            conn.close()
+        except Error:
+            pass
+        with server.lock:
+            server.opened -= 1
+
+    def _drain(self, server):
+        while True:
+            try:
+                conn, _ = server.idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn, server)
+
     def connect(self):
-        """Create database connection"""
+        """Create the connection pool and verify the database is reachable"""
         try:
-            self.connection = mysql.connector.connect(
-                host=self.host,
-                user=self.user,
-                password=self.password,
-                database=self.database,
-                port=self.port,
-                autocommit=True
-            )
-            if self.connection.is_connected():
-                print("Successfully connected to MySQL database")
-                return self.connection
+            conn = self.acquire()
+            self.release(conn)
+            print(f"Successfully connected to {self.name} database (pool size {self.pool_size})")
         except Error as e:
-            print(f"Error connecting to MySQL: {e}")
+            print(f"Error connecting to {self.name}: {e}")
             return None
-    
+        if self.replicas and self._replica_checker is None:
+            self._check_replicas()
+            healthy = sum(server.healthy for server in self.replicas)
+            print(f"{healthy} of {len(self.replicas)} read replicas in rotation")
+            self._replica_check_stop.clear()
+            self._replica_checker = threading.Thread(target=self._watch_replicas, name='replica-health',
+                                                     daemon=True)
+            self._replica_checker.start()
+        return conn
+
     def disconnect(self):
-        """Close database connection"""
-        if self.connection and self.connection.is_connected():
-            self.connection.close()
-            print("MySQL connection closed")
-    
-    def execute_query(self, query, params=None):
-        """Execute a query and return results"""
+        """Close all pooled connections"""
+        if self._replica_checker is not None:
+            self._replica_check_stop.set()
+            self._replica_checker.join()
+            self._replica_checker = None
+        for server in [self.primary] + self.replicas:
+            self._drain(server)
+            if server.probe is not None:
+                try:
+                    server.probe.close()
+                except Error:
+                    pass
+                server.probe = None
+        print(f"{self.name} connection pool closed")
+
+    def acquire(self, server=None):
+        """Check a healthy connection out of a server's pool (the primary's by default)"""
+        server = server or self.primary
+        conn = self._acquire(server)
+        with server.lock:
+            server.in_use += 1
+        return conn
+
+    def _acquire(self, server):
+        """Take an idle connection, opening or reconnecting as needed"""
         try:
-            cursor = self.connection.cursor(dictionary=True)
-            cursor.execute(query, params or ())
-            
-            if query.strip().upper().startswith('SELECT'):
-                result = cursor.fetchall()
+            conn, last_used = server.idle.get_nowait()
+        except queue.Empty:
+            with server.lock:
+                can_open = server.opened < server.size
+                if can_open:
+                    server.opened += 1
+            if can_open:
+                try:
+                    return self._open(server)
+                except Error:
+                    with server.lock:
+                        server.opened -= 1
+                    raise
+            try:
+                conn, last_used = server.idle.get(timeout=self.pool_timeout)
+            except queue.Empty:
+                raise PoolError(f"No database connection available after {self.pool_timeout}s")
+
+        # Only ping connections that have been idle long enough to have gone stale
+        if time.monotonic() - last_used > self.health_check_interval:
+            # A reconnect silently drops the server-side statements
+            self._close_statements(conn)
+            try:
+                self._ping(conn)
+            except Error:
+                self._discard(conn, server)
+                with server.lock:
+                    server.opened += 1
+                try:
+                    return self._open(server)
+                except Error:
+                    with server.lock:
+                        server.opened -= 1
+                    raise
+        return conn
+
+    def release(self, conn, broken=False, server=None):
+        """Return a connection to its server's pool, dropping it if it failed mid-request"""
+        server = server or self.primary
+        with server.lock:
+            server.in_use -= 1
+        if broken or not server.healthy:
+            self._discard(conn, server)
+            return
+        try:
+            server.idle.put_nowait((conn, time.monotonic()))
+        except queue.Full:
+            self._discard(conn, server)
+
+    @contextmanager
+    def checkout(self):
+        """Bind one pooled connection to the current thread for the duration of a request"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            yield conn
+            return
+
+        conn = self.acquire()
+        self._local.conn = conn
+        self._local.broken = False
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self.release(conn, broken=self._local.broken)
+
+    @contextmanager
+    def replica_reads(self):
+        """Let the current thread's reads go to a read replica until the block ends.
+
+        The first read checks out a connection to the least busy healthy replica and
+        the block's later reads reuse it. Writes and transactions still use the
+        primary, and so does every read after the thread's first write in the request,
+        or after read_from_primary(). Without replicas this changes nothing.
+        """
+        if not self.replicas or getattr(self._local, 'replica_reads', False):
+            yield
+            return
+        self._local.replica_reads = True
+        self._local.primary_only = False
+        self._local.replica = None
+        try:
+            yield
+        finally:
+            self._local.replica_reads = False
+            pinned, self._local.replica = self._local.replica, None
+            if pinned is not None:
+                self.release(pinned[1], broken=self._local.replica_broken, server=pinned[0])
+
+    def read_from_primary(self):
+        """Send the rest of this replica_reads() block's reads to the primary.
+
+        For reads that fill caches shared with other requests, which must not keep
+        data a lagging replica has not caught up on.
+        """
+        self._local.primary_only = True
+
+    def _replica_connection(self):
+        """The thread's replica connection for a read, or None if the read must use the primary"""
+        local = self._local
+        if (not getattr(local, 'replica_reads', False) or local.primary_only
+                or getattr(local, 'conn', None) is not None or getattr(local, 'wrote', False)):
+            return None
+        if local.replica is not None:
+            # After a connection error the rest of the block reads from the primary
+            return None if local.replica_broken else local.replica[1]
+        for server in self._replica_candidates():
+            try:
+                conn = self.acquire(server)
+            except PoolError:
+                continue
+            except Error as e:
+                self._set_health(server, False, e)
+                continue
+            local.replica = (server, conn)
+            local.replica_broken = False
+            return conn
+        return None
+
+    def _replica_candidates(self):
+        """Healthy replicas with a free connection, least busy first, rotating among equals"""
+        servers = [server for server in self.replicas if server.healthy and server.in_use < server.size]
+        if not servers:
+            return []
+        start = next(self._rotation) % len(servers)
+        return sorted(servers[start:] + servers[:start], key=lambda server: server.in_use)
+
+    def _set_health(self, server, healthy, error=None):
+        with server.lock:
+            changed = server.healthy != healthy
+            server.healthy = healthy
+            server.error = None if healthy else str(error)
+        if changed:
+            print(f"Read {server.label} {'back in rotation' if healthy else f'out of rotation: {error}'}")
+            if not healthy:
+                # Its idle connections are likely dead too; reopen them once it recovers
+                self._drain(server)
+
+    def _check_replicas(self):
+        """Probe every replica's reachability and replication lag"""
+        for server in self.replicas:
+            try:
+                if server.probe is None:
+                    server.probe = self._open(server)
+                lag = self._replica_lag(server.probe)
+            except Error as e:
+                if server.probe is not None:
+                    try:
+                        server.probe.close()
+                    except Error:
+                        pass
+                    server.probe = None
+                server.lag = None
+                self._set_health(server, False, e)
+                continue
+            server.lag = lag
+            if lag is None:
+                self._set_health(server, False, 'replication stopped')
+            elif lag > self.replica_max_lag:
+                self._set_health(server, False, f'{lag:g}s behind the primary')
             else:
-                result = cursor.rowcount
-            
-            cursor.close()
-            return result
+                self._set_health(server, True)
+
+    def _watch_replicas(self):
+        while not self._replica_check_stop.wait(self.replica_check_interval):
+            try:
+                self._check_replicas()
+            except Exception as e:
+                print(f"Error checking read replicas: {e}")
+
+    def replica_status(self):
+        """Health, lag and load of each read replica"""
+        return [server.status() for server in self.replicas]
+
+    def _mark_broken(self, e, conn):
+        """Flag a connection for replacement after a connection-level error"""
+        if not self._connection_failed(e):
+            return
+        replica = getattr(self._local, 'replica', None)
+        if replica is not None and replica[1] is conn:
+            self._local.replica_broken = True
+            self._set_health(replica[0], False, e)
+        else:
+            self._local.broken = True
+
+    def _close_failed(self, conn):
+        """Flag a connection whose cursor could not be closed (it has unread rows)"""
+        replica = getattr(self._local, 'replica', None)
+        if replica is not None and replica[1] is conn:
+            self._local.replica_broken = True
+        else:
+            self._local.broken = True
+
+    def _record(self, key, seconds, rows):
+        """Add a statement to the global stats and to the current thread's request totals"""
+        self.stats.record(key, seconds, rows)
+        self._local.request_queries = getattr(self._local, 'request_queries', 0) + 1
+        self._local.request_seconds = getattr(self._local, 'request_seconds', 0.0) + seconds
+
+    def reset_request_stats(self):
+        """Start counting statements, and tracking whether it writes, for a new request on this thread"""
+        self._local.request_queries = 0
+        self._local.request_seconds = 0.0
+        self._local.wrote = False
+
+    def request_wrote(self):
+        """Whether this thread has written or opened a transaction since reset_request_stats"""
+        return getattr(self._local, 'wrote', False)
+
+    def request_stats(self):
+        """(statement count, seconds in the database) since reset_request_stats on this thread"""
+        return getattr(self._local, 'request_queries', 0), getattr(self._local, 'request_seconds', 0.0)
+
+    def _close_statements(self, conn):
+        for statement in self._statements.pop(conn, {}).values():
+            statement.close()
+
+    def _prepare(self, conn, query):
+        """Return the connection's prepared statement for a query, preparing it on first use"""
+        statements = self._statements.setdefault(conn, OrderedDict())
+        statement = statements.get(query)
+        if statement is not None:
+            statements.move_to_end(query)
+            return statement
+        statement = statements[query] = self._new_statement(conn, query)
+        if len(statements) > self.statement_cache_size:
+            _, evicted = statements.popitem(last=False)
+            evicted.close()
+        return statement
+
+    def _run(self, query, params, prepared, fetch, read=False):
+        """Execute one statement on the request's connection and record its timing.
+
+        `fetch` receives the executed cursor and returns (result, row count). Reads may
+        run on a replica (see replica_reads()); if it fails they are retried on the primary.
+        """
+        params = tuple(params or ())
+        if read:
+            conn = self._replica_connection()
+            if conn is not None:
+                try:
+                    result = self._execute(conn, query, params, prepared, fetch)
+                    self._local.replica[0].reads += 1
+                    return result
+                except Error as e:
+                    if not self._connection_failed(e):
+                        raise
+        with self.checkout() as conn:
+            if not read:
+                self._local.wrote = True
+            return self._execute(conn, query, params, prepared, fetch)
+
+    def _execute(self, conn, query, params, prepared, fetch):
+        """Run one statement on a given connection"""
+        start = time.perf_counter()
+        cursor = None if prepared else self._cursor(conn)
+        try:
+            if prepared:
+                statement = self._prepare(conn, query)
+                key, cursor = statement.key, statement.cursor
+                cursor.execute(statement.sql, params)
+            else:
+                key = normalize_sql(query)
+                cursor.execute(query, params)
+            result, rows = fetch(cursor)
         except Error as e:
-            print(f"Error executing query: {e}")
-            return None
-    
-    def execute_insert(self, query, params=None):
-        """Execute insert query and return last insert ID"""
+            self._mark_broken(e, conn)
+            # The statement may be stale (e.g. after a schema change); prepare it afresh next time
+            if prepared:
+                evicted = self._statements.get(conn, {}).pop(query, None)
+                if evicted is not None:
+                    evicted.close()
+            raise
+        finally:
+            if not prepared:
+                cursor.close()
+        self._record(key, time.perf_counter() - start, rows)
+        return result
+
+    @staticmethod
+    def _fetch_rows(cursor):
+        columns = cursor.column_names
+        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        return rows, len(rows)
+
+    def fetch_all(self, query, params=None, prepared=True):
+        """Run a read and return every row as a dict.
+
+        Fixed SQL runs as a server-side prepared statement cached on the connection;
+        pass prepared=False for SQL that is built per call (IN lists, dynamic columns).
+        """
+        return self._run(query, params, prepared, self._fetch_rows, read=True)
+
+    def fetch_one(self, query, params=None, prepared=True):
+        """Run a read and return its first row as a dict, or None"""
+        rows = self.fetch_all(query, params, prepared)
+        return rows[0] if rows else None
+
+    def execute(self, query, params=None, prepared=True):
+        """Run a write and return the number of affected rows"""
+        return self._run(query, params, prepared, lambda cursor: (cursor.rowcount, cursor.rowcount))
+
+    def insert(self, query, params=None, prepared=True):
+        """Run an INSERT and return the new row's id"""
+        return self._run(query, params, prepared, lambda cursor: (cursor.lastrowid, cursor.rowcount))
+
+    def _run_many(self, query, seq_params, fetch):
+        """Execute a statement once per parameter set in a single batch and record its timing"""
+        with self.checkout() as conn:
+            self._local.wrote = True
+            start = time.perf_counter()
+            cursor = self._cursor(conn)
+            try:
+                cursor.executemany(query, seq_params)
+                result = fetch(cursor)
+                rowcount = cursor.rowcount
+            except Error as e:
+                self._mark_broken(e, conn)
+                raise
+            finally:
+                cursor.close()
+            self._record(normalize_sql(query), time.perf_counter() - start, rowcount)
+            return result
+
+    def execute_many(self, query, seq_params):
+        """Execute a statement once per parameter set in a single batch and return the row count"""
+        return self._run_many(query, seq_params, lambda cursor: cursor.rowcount)
+
+    def insert_many(self, query, seq_params):
+        """Run a batched INSERT and return the new rows' ids, in parameter order"""
+        seq_params = list(seq_params)
+        return self._run_many(query, seq_params, lambda cursor: self._batch_ids(cursor, len(seq_params)))
+
+    def _batch_ids(self, cursor, count):
+        # mysql-connector sends the batch as one multi-row INSERT, whose rows InnoDB numbers
+        # consecutively from lastrowid (the first id) for inserts of a known row count
+        first = cursor.lastrowid
+        return list(range(first, first + count))
+
+    def stream_query(self, query, params=None, batch_size=500):
+        """Yield the rows of a SELECT in batches without buffering the whole result set"""
+        conn = self._replica_connection()
+        if conn is not None:
+            self._local.replica[0].reads += 1
+            yield from self._stream(conn, query, params, batch_size)
+            return
+        with self.checkout() as conn:
+            yield from self._stream(conn, query, params, batch_size)
+
+    def _stream(self, conn, query, params, batch_size):
+        cursor = self._cursor(conn, dictionary=True)
+        elapsed = 0.0
+        count = 0
         try:
-            cursor = self.connection.cursor()
+            start = time.perf_counter()
             cursor.execute(query, params or ())
-            last_id = cursor.lastrowid
-            cursor.close()
-            return last_id
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                elapsed += time.perf_counter() - start
+                if not rows:
+                    break
+                count += len(rows)
+                yield rows
+                start = time.perf_counter()
         except Error as e:
-            print(f"Error executing insert: {e}")
-            return None
+            self._mark_broken(e, conn)
+            print(f"Error streaming query: {e}")
+            raise
+        finally:
+            self._record(normalize_sql(query), elapsed, count)
+            try:
+                cursor.close()
+            except Error:
+                # Closing with unread rows leaves the connection unusable
+                self._close_failed(conn)
+
+    @contextmanager
+    def transaction(self):
+        """Run the enclosed statements in one transaction on the request's connection.
+
+        Inside another transaction the block runs under a savepoint instead, so if it
+        fails only its own statements are rolled back.
+        """
+        with self.checkout() as conn:
+            self._local.wrote = True
+            depth = getattr(self._local, 'transaction_depth', 0)
+            self._local.transaction_depth = depth + 1
+            try:
+                if depth:
+                    with self._savepoint(f"sp{depth}"):
+                        yield conn
+                    return
+                self._begin(conn)
+                try:
+                    yield conn
+                except BaseException:
+                    try:
+                        self._rollback(conn)
+                    except Error:
+                        self._local.broken = True
+                    raise
+                else:
+                    self._commit(conn)
+            finally:
+                self._local.transaction_depth = depth
+
+    @contextmanager
+    def _savepoint(self, name):
+        self.execute(f"SAVEPOINT {name}", prepared=False)
+        try:
+            yield
+        except BaseException:
+            try:
+                self.execute(f"ROLLBACK TO SAVEPOINT {name}", prepared=False)
+            except Error:
+                self._local.broken = True
+            raise
+        else:
+            self.execute(f"RELEASE SAVEPOINT {name}", prepared=False)
+
+def create_database():
+    """Build the database layer for the DB_BACKEND environment variable (mysql or sqlite)"""
+    backend = os.getenv('DB_BACKEND', 'mysql').lower()
+    if backend == 'sqlite':
+        from database.sqlite import SQLiteDatabase
+        return SQLiteDatabase()
+    if backend != 'mysql':
+        raise ValueError(f"Unknown DB_BACKEND {backend!r}; expected mysql or sqlite")
+    return DatabaseConnection()
 
 # Global database instance
-db = DatabaseConnection()
\ No newline at end of file
+db = create_database()
@@ -0,0 +1,35 @@
+"""Database exceptions shared by every storage backend.
+
+These are mysql-connector's own classes when it is installed, so MySQL errors pass
+through unchanged; the SQLite backend raises the same classes. SQLite-only
+deployments can run without mysql-connector, in which case equivalents are defined
+here.
+"""
+try:
+    from mysql.connector.errors import (Error, IntegrityError, InterfaceError, OperationalError,
+                                        PoolError, ProgrammingError)
+except ImportError:
+    class Error(Exception):
+        def __init__(self, msg=None, errno=None, values=None, sqlstate=None):
+            super().__init__(msg)
+            self.msg = msg
+            self.errno = errno
+            self.sqlstate = sqlstate
+
+    class InterfaceError(Error):
+        pass
+
+    class DatabaseError(Error):
+        pass
+
+    class OperationalError(DatabaseError):
+        pass
+
+    class IntegrityError(DatabaseError):
+        pass
+
+    class ProgrammingError(DatabaseError):
+        pass
+
+    class PoolError(Error):
+        pass
@@ -0,0 +1,275 @@
+import functools
+import os
+import re
+import sqlite3
+import urllib.parse
+from contextlib import contextmanager
+from datetime import date, datetime
+from decimal import Decimal
+from database.connection import DatabaseConnection, PreparedStatement, normalize_sql
+from database.errors import Error, IntegrityError, OperationalError, ProgrammingError
+
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sqlite_schema.sql')
+
+# Steps that bring a file created from an older sqlite_schema.sql up to date, applied in
+# order from its user_version; a new file gets the whole schema and skips them. Each
+# step is idempotent, so a file upgraded before its version was recorded is left alone.
+# Add a step here with each migration.
+SCHEMA_UPGRADES = [
+    # 20250704090000_message_archive_indexes.sql
+    (2, [
+        "CREATE INDEX IF NOT EXISTS idx_messages_created ON messages (created_at, id)",
+        "CREATE INDEX IF NOT EXISTS idx_messages_chat_created ON messages (chat_id, created_at, id)",
+    ]),
+    # 20250705090000_request_matches.sql
+    (3, [
+        """CREATE TABLE IF NOT EXISTS request_matches (
+               store_id INTEGER NOT NULL REFERENCES stores(id) ON DELETE CASCADE,
+               request_id INTEGER NOT NULL REFERENCES requests(id) ON DELETE CASCADE,
+               created_at TIMESTAMP NOT NULL,
+               PRIMARY KEY (store_id, request_id)
+           )""",
+        "CREATE INDEX IF NOT EXISTS idx_request_matches_store_created "
+        "ON request_matches (store_id, created_at, request_id)",
+        "CREATE INDEX IF NOT EXISTS idx_request_matches_request ON request_matches (request_id)",
+    ]),
+]
+SCHEMA_VERSION = SCHEMA_UPGRADES[-1][0]
+
+# MySQL spellings used by the handlers and their SQLite equivalents
+SQL_REWRITES = [
+    (re.compile(r'%s'), '?'),
+    # MySQL's NOW() is in the server's time zone, as are Python's naive datetimes
+    (re.compile(r'\bNOW\(\)', re.IGNORECASE), "datetime('now', 'localtime')"),
+    # BEGIN IMMEDIATE already holds the write lock, so row locks are redundant
+    (re.compile(r'\s+FOR UPDATE\b', re.IGNORECASE), ''),
+    # Upserts: SQLite 3.35+ accepts ON CONFLICT DO UPDATE without naming the unique key
+    (re.compile(r'\bON DUPLICATE KEY UPDATE\b', re.IGNORECASE), 'ON CONFLICT DO UPDATE SET'),
+    (re.compile(r'\bVALUES\((\w+)\)', re.IGNORECASE), r'excluded.\1'),
+]
+
+def _parse_timestamp(value):
+    return datetime.fromisoformat(value.decode('utf-8'))
+
+def _parse_decimal(value):
+    return Decimal(value.decode('utf-8')).quantize(Decimal('0.01'))
+
+# Return TIMESTAMP and DECIMAL columns as datetime and Decimal, as mysql-connector does
+sqlite3.register_converter('TIMESTAMP', _parse_timestamp)
+sqlite3.register_converter('DECIMAL', _parse_decimal)
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(' '))
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_adapter(Decimal, str)
+
+@functools.lru_cache(maxsize=1024)
+def translate(query):
+    """Rewrite a MySQL-dialect statement for SQLite"""
+    for pattern, replacement in SQL_REWRITES:
+        query = pattern.sub(replacement, query)
+    return query
+
+# Result codes that mean the database is unavailable rather than the statement being wrong
+UNAVAILABLE_CODES = ('SQLITE_BUSY', 'SQLITE_LOCKED', 'SQLITE_IOERR', 'SQLITE_CANTOPEN', 'SQLITE_FULL',
+                     'SQLITE_READONLY', 'SQLITE_PROTOCOL')
+
+@contextmanager
+def translate_errors():
+    """Re-raise sqlite3 exceptions as the shared database exception classes"""
+    try:
+        yield
+    except sqlite3.IntegrityError as e:
+        raise IntegrityError(msg=str(e)) from e
+    except sqlite3.OperationalError as e:
+        # sqlite3 reports syntax errors and unknown columns as OperationalError too;
+        # only a locked or unreadable database should surface as a 503
+        code = getattr(e, 'sqlite_errorname', 'SQLITE_BUSY')
+        if code.startswith(UNAVAILABLE_CODES):
+            raise OperationalError(msg=str(e)) from e
+        raise ProgrammingError(msg=str(e)) from e
+    except (sqlite3.ProgrammingError, sqlite3.InterfaceError) as e:
+        raise ProgrammingError(msg=str(e)) from e
+    except sqlite3.Error as e:
+        raise Error(msg=str(e)) from e
+
+class SQLiteCursor:
+    """The slice of the mysql-connector cursor API the query layer uses, over a sqlite3 cursor"""
+
+    def __init__(self, conn, dictionary=False):
+        self._cursor = conn.cursor()
+        self.dictionary = dictionary
+
+    def execute(self, query, params=()):
+        with translate_errors():
+            self._cursor.execute(translate(query), params)
+
+    def executemany(self, query, seq_params):
+        with translate_errors():
+            self._cursor.executemany(translate(query), seq_params)
+
+    @property
+    def column_names(self):
+        return tuple(column[0] for column in self._cursor.description or ())
+
+    def _rows(self, rows):
+        if not self.dictionary:
+            return rows
+        columns = self.column_names
+        return [dict(zip(columns, row)) for row in rows]
+
+    def fetchall(self):
+        with translate_errors():
+            return self._rows(self._cursor.fetchall())
+
+    def fetchmany(self, size):
+        with translate_errors():
+            return self._rows(self._cursor.fetchmany(size))
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    def last_insert_rowid(self):
+        # Unlike lastrowid, also set by executemany()
+        with translate_errors():
+            return self._cursor.connection.execute('SELECT last_insert_rowid()').fetchone()[0]
+
+    def close(self):
+        self._cursor.close()
+
+class SQLiteDatabase(DatabaseConnection):
+    """Embedded SQLite storage in WAL mode, behind the same pooled query layer as MySQL.
+
+    WAL lets readers proceed while one connection writes, so the pool still serves
+    concurrent requests; writers queue on the database lock for up to the busy timeout.
+    sqlite3 keeps its own per-connection cache of compiled statements, which stands in
+    for MySQL server-side prepared statements.
+
+    DB_REPLICAS takes database file paths here, opened read-only. SQLite replicates
+    nothing, so they stand in for MySQL replicas when trying out read routing on one
+    machine: the primary's own file, or a copy of it (e.g. from the sqlite3 CLI's
+    .backup) to see what reads from a stale replica look like.
+    """
+
+    name = 'SQLite'
+
+    def __init__(self):
+        super().__init__()
+        self.path = os.getenv('SQLITE_PATH', 'localkirana.sqlite3')
+        self.busy_timeout = float(os.getenv('SQLITE_BUSY_TIMEOUT', 5))
+        self.cache_size_kb = int(os.getenv('SQLITE_CACHE_SIZE_KB', 64 * 1024))
+        self.mmap_size = int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+        self.primary.address = self.path
+
+    def _replica_address(self, entry):
+        return entry
+
+    def _replica_lag(self, conn):
+        with translate_errors():
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+        if version < SCHEMA_VERSION:
+            raise OperationalError(msg=f"replica file has schema version {version}, not {SCHEMA_VERSION}")
+        return 0.0
+
+    def _open(self, server):
+        read_only = server is not self.primary
+        target = server.address
+        if read_only:
+            target = f"file:{urllib.parse.quote(os.path.abspath(target))}?mode=ro"
+        with translate_errors():
+            conn = sqlite3.connect(
+                target,
+                uri=read_only,
+                timeout=self.busy_timeout,
+                detect_types=sqlite3.PARSE_DECLTYPES,
+                # Autocommit, like the MySQL connections; transactions are begun explicitly
+                isolation_level=None,
+                # The pool hands a connection to one thread at a time
+                check_same_thread=False,
+                cached_statements=self.statement_cache_size
+            )
+            conn.execute(f'PRAGMA cache_size = -{self.cache_size_kb}')
+            conn.execute(f'PRAGMA mmap_size = {self.mmap_size}')
+            conn.execute('PRAGMA temp_store = MEMORY')
+            if read_only:
+                return conn
+            conn.execute('PRAGMA journal_mode = WAL')
+            # NORMAL is durable across application crashes in WAL mode; only an OS crash
+            # or power loss can drop the most recent commits
+            conn.execute('PRAGMA synchronous = NORMAL')
+            conn.execute('PRAGMA foreign_keys = ON')
+            self._ensure_schema(conn)
+            return conn
+
+    def _ensure_schema(self, conn):
+        """Create the schema and sample data in a new database file, or upgrade an older one"""
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            if version == 0:
+                for statement in self._schema_statements():
+                    conn.execute(statement)
+                conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+                print(f"Created SQLite schema in {self.path}")
+            elif version < SCHEMA_VERSION:
+                for step, statements in SCHEMA_UPGRADES:
+                    if step > version:
+                        for statement in statements:
+                            conn.execute(statement)
+                        conn.execute(f'PRAGMA user_version = {step}')
+                print(f"Upgraded SQLite schema in {self.path} from version {version} to {SCHEMA_VERSION}")
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+    @staticmethod
+    def _schema_statements():
+        # executescript() would commit mid-script, so split it into statements ourselves
+        with open(SCHEMA_FILE, encoding='utf-8') as f:
+            statement = ''
+            for line in f:
+                if not statement and (not line.strip() or line.startswith('--')):
+                    continue
+                statement += line
+                if sqlite3.complete_statement(statement):
+                    yield statement
+                    statement = ''
+
+    def _ping(self, conn):
+        # An embedded database has no network connection to go stale
+        pass
+
+    def _connection_failed(self, e):
+        # Errors such as "database is locked" leave the connection perfectly usable
+        return False
+
+    def _cursor(self, conn, dictionary=False):
+        return SQLiteCursor(conn, dictionary=dictionary)
+
+    def _new_statement(self, conn, query):
+        key = normalize_sql(query)
+        return PreparedStatement(key, translate(key), SQLiteCursor(conn))
+
+    def _batch_ids(self, cursor, count):
+        # executemany() inserts row by row under the write lock, so the ids run consecutively
+        # up to the last one
+        last = cursor.last_insert_rowid()
+        return list(range(last - count + 1, last + 1))
+
+    def _begin(self, conn):
+        # Take the write lock up front so a transaction that reads first cannot deadlock
+        # against another writer when it later upgrades
+        with translate_errors():
+            conn.execute('BEGIN IMMEDIATE')
+
+    def _commit(self, conn):
+        with translate_errors():
+            conn.commit()
+
+    def _rollback(self, conn):
+        with translate_errors():
+            conn.rollback()
@@ -0,0 +1,186 @@
+-- LocalKirana schema for the embedded SQLite backend (DB_BACKEND=sqlite).
+-- Schema version 3 (PRAGMA user_version; see SCHEMA_UPGRADES in database/sqlite.py).
+-- A translation of supabase/migrations up to 20250705090000_request_matches.sql:
+-- ENUMs become CHECK constraints, ON UPDATE CURRENT_TIMESTAMP becomes triggers,
+-- timestamps default to local time as MySQL's do, and TIMESTAMP / DECIMAL columns
+-- are declared so the driver converts them back to datetime and Decimal.
+-- Keep it in step with new migrations: add each one here and as an upgrade step, and
+-- update the version and last migration above.
+
+-- Customers table
+CREATE TABLE customers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name VARCHAR(255) NOT NULL,
+    phone VARCHAR(20) UNIQUE NOT NULL,
+    email VARCHAR(255) UNIQUE NOT NULL,
+    location TEXT,
+    password_hash VARCHAR(255) NOT NULL,
+    status TEXT DEFAULT 'active' CHECK (status IN ('active', 'inactive')),
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    updated_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+
+-- Stores table
+CREATE TABLE stores (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    shop_name VARCHAR(255) NOT NULL,
+    owner_name VARCHAR(255) NOT NULL,
+    phone VARCHAR(20) UNIQUE NOT NULL,
+    email VARCHAR(255) UNIQUE NOT NULL,
+    address TEXT NOT NULL,
+    pincode VARCHAR(10) NOT NULL,
+    category TEXT NOT NULL CHECK (category IN ('grocery', 'medical', 'stationery', 'electronics', 'general')),
+    password_hash VARCHAR(255) NOT NULL,
+    status TEXT DEFAULT 'active' CHECK (status IN ('active', 'inactive')),
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    updated_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+
+-- Products table
+CREATE TABLE products (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    store_id INTEGER NOT NULL REFERENCES stores(id) ON DELETE CASCADE,
+    name VARCHAR(255) NOT NULL,
+    price VARCHAR(50) NOT NULL,
+    price_value DECIMAL(12, 2) NULL,
+    description TEXT,
+    available BOOLEAN DEFAULT 1,
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    updated_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+
+-- Bookings table
+CREATE TABLE bookings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    customer_id INTEGER NOT NULL REFERENCES customers(id) ON DELETE CASCADE,
+    store_id INTEGER NOT NULL REFERENCES stores(id) ON DELETE CASCADE,
+    product_id INTEGER NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    customer_name VARCHAR(255) NOT NULL,
+    customer_phone VARCHAR(20) NOT NULL,
+    store_name VARCHAR(255) NOT NULL,
+    store_phone VARCHAR(20) NOT NULL,
+    item_name VARCHAR(255) NOT NULL,
+    status TEXT DEFAULT 'pending' CHECK (status IN ('pending', 'accepted', 'rejected', 'completed')),
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    updated_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+
+-- Requests table
+CREATE TABLE requests (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    customer_id INTEGER NOT NULL REFERENCES customers(id) ON DELETE CASCADE,
+    customer_name VARCHAR(255) NOT NULL,
+    customer_phone VARCHAR(20) NOT NULL,
+    customer_location TEXT,
+    item_name VARCHAR(255) NOT NULL,
+    quantity VARCHAR(100) NOT NULL,
+    description TEXT,
+    target_store VARCHAR(255),
+    status TEXT DEFAULT 'pending' CHECK (status IN ('pending', 'accepted', 'rejected', 'completed')),
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    updated_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+
+-- Request inbox (20250705090000_request_matches.sql)
+CREATE TABLE request_matches (
+    store_id INTEGER NOT NULL REFERENCES stores(id) ON DELETE CASCADE,
+    request_id INTEGER NOT NULL REFERENCES requests(id) ON DELETE CASCADE,
+    created_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (store_id, request_id)
+);
+
+-- Chats table
+CREATE TABLE chats (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat_id VARCHAR(255) UNIQUE NOT NULL,
+    participant1_id INTEGER NOT NULL,
+    participant1_type TEXT NOT NULL CHECK (participant1_type IN ('customer', 'shopkeeper')),
+    participant2_id INTEGER NOT NULL,
+    participant2_type TEXT NOT NULL CHECK (participant2_type IN ('customer', 'shopkeeper')),
+    last_message TEXT,
+    last_message_time TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    updated_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+
+-- Messages table
+CREATE TABLE messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat_id VARCHAR(255) NOT NULL REFERENCES chats(chat_id) ON DELETE CASCADE,
+    sender_id INTEGER NOT NULL,
+    sender_type TEXT NOT NULL CHECK (sender_type IN ('customer', 'shopkeeper')),
+    message TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+
+-- ON UPDATE CURRENT_TIMESTAMP (in local time, like MySQL), unless the update set updated_at itself
+-- (recursive_triggers is off, so the trigger's own UPDATE doesn't re-fire it)
+CREATE TRIGGER customers_updated_at AFTER UPDATE ON customers FOR EACH ROW
+WHEN NEW.updated_at IS OLD.updated_at
+BEGIN UPDATE customers SET updated_at = datetime('now', 'localtime') WHERE id = NEW.id; END;
+CREATE TRIGGER stores_updated_at AFTER UPDATE ON stores FOR EACH ROW
+WHEN NEW.updated_at IS OLD.updated_at
+BEGIN UPDATE stores SET updated_at = datetime('now', 'localtime') WHERE id = NEW.id; END;
+CREATE TRIGGER products_updated_at AFTER UPDATE ON products FOR EACH ROW
+WHEN NEW.updated_at IS OLD.updated_at
+BEGIN UPDATE products SET updated_at = datetime('now', 'localtime') WHERE id = NEW.id; END;
+CREATE TRIGGER bookings_updated_at AFTER UPDATE ON bookings FOR EACH ROW
+WHEN NEW.updated_at IS OLD.updated_at
+BEGIN UPDATE bookings SET updated_at = datetime('now', 'localtime') WHERE id = NEW.id; END;
+CREATE TRIGGER requests_updated_at AFTER UPDATE ON requests FOR EACH ROW
+WHEN NEW.updated_at IS OLD.updated_at
+BEGIN UPDATE requests SET updated_at = datetime('now', 'localtime') WHERE id = NEW.id; END;
+CREATE TRIGGER chats_updated_at AFTER UPDATE ON chats FOR EACH ROW
+WHEN NEW.updated_at IS OLD.updated_at
+BEGIN UPDATE chats SET updated_at = datetime('now', 'localtime') WHERE id = NEW.id; END;
+
+-- Feed indexes (20250701090000_feed_indexes.sql)
+CREATE INDEX idx_bookings_created ON bookings (created_at, id);
+CREATE INDEX idx_bookings_customer_created ON bookings (customer_id, created_at, id);
+CREATE INDEX idx_bookings_store_created ON bookings (store_id, created_at, id);
+CREATE INDEX idx_bookings_status_created ON bookings (status, created_at, id);
+
+CREATE INDEX idx_requests_created ON requests (created_at, id);
+CREATE INDEX idx_requests_customer_created ON requests (customer_id, created_at, id);
+CREATE INDEX idx_requests_target_store_created ON requests (target_store, created_at, id);
+CREATE INDEX idx_requests_status_created ON requests (status, created_at, id);
+
+-- Chat sync indexes (20250702090000_chat_sync_indexes.sql)
+CREATE INDEX idx_chats_participant1 ON chats (participant1_type, participant1_id);
+CREATE INDEX idx_chats_participant2 ON chats (participant2_type, participant2_id);
+CREATE INDEX idx_messages_chat_id ON messages (chat_id, id);
+
+-- Archive indexes (20250704090000_message_archive_indexes.sql)
+CREATE INDEX idx_messages_created ON messages (created_at, id);
+CREATE INDEX idx_messages_chat_created ON messages (chat_id, created_at, id);
+
+-- Price index (20250703090000_product_price_value.sql); MySQL creates these implicitly for foreign keys
+CREATE INDEX idx_products_price_value ON products (price_value);
+CREATE INDEX idx_products_store ON products (store_id, id);
+
+-- Request inbox indexes (20250705090000_request_matches.sql)
+CREATE INDEX idx_request_matches_store_created ON request_matches (store_id, created_at, request_id);
+CREATE INDEX idx_request_matches_request ON request_matches (request_id);
+
+-- Insert sample data
+INSERT INTO customers (name, phone, email, location, password_hash) VALUES
+('John Doe', '+91 9876543213', 'john@example.com', 'Sector 15, Delhi', '$2b$12$LQv3c1yqBWVHxkd0LHAkCOYz6TtxMQJqhN8/LewdBPj/VJunKx9bO');
+
+INSERT INTO stores (shop_name, owner_name, phone, email, address, pincode, category, password_hash) VALUES
+('Sharma General Store', 'Raj Sharma', '+91 9876543210', 'raj@sharma.com', '123 Main Street, Sector 15', '110001', 'grocery', '$2b$12$LQv3c1yqBWVHxkd0LHAkCOYz6TtxMQJqhN8/LewdBPj/VJunKx9bO'),
+('City Medical Store', 'Dr. Priya Patel', '+91 9876543211', 'priya@citymedical.com', '456 Health Plaza, Medical District', '110002', 'medical', '$2b$12$LQv3c1yqBWVHxkd0LHAkCOYz6TtxMQJqhN8/LewdBPj/VJunKx9bO'),
+('Tech Electronics Hub', 'Amit Kumar', '+91 9876543212', 'amit@techhub.com', '789 Electronics Market, Tech City', '110003', 'electronics', '$2b$12$LQv3c1yqBWVHxkd0LHAkCOYz6TtxMQJqhN8/LewdBPj/VJunKx9bO');
+
+INSERT INTO products (store_id, name, price, price_value, available) VALUES
+(1, 'Rice (1kg)', '₹80', 80, 1),
+(1, 'Dal (1kg)', '₹120', 120, 1),
+(1, 'Oil (1L)', '₹150', 150, 1),
+(1, 'Sugar (1kg)', '₹45', 45, 0),
+(2, 'Paracetamol', '₹25', 25, 1),
+(2, 'Cough Syrup', '₹85', 85, 1),
+(2, 'Bandages', '₹30', 30, 1),
+(2, 'Thermometer', '₹200', 200, 1),
+(3, 'Mobile Charger', '₹299', 299, 1),
+(3, 'Earphones', '₹599', 599, 1),
+(3, 'Power Bank', '₹1299', 1299, 0),
+(3, 'Phone Case', '₹199', 199, 1);
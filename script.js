@@ -1,9 +1,21 @@
 // Global variables
 let currentUser = null;
 let currentUserType = null;
+let sessionToken = null;
 let currentStore = null;
 let currentChat = null;
-let chatPollingInterval = null;
+let chatSyncActive = false;
+let chatSyncGeneration = 0;
+let chatCursor = 0;
+let syncedChats = [];
+let chatMessagesById = {};
+let loadedStores = [];
+let storesPage = 1;
+const STORES_PAGE_SIZE = 50;
+const FEED_PAGE_SIZE = 50;
+const FEED_MAX_PAGE_SIZE = 200;
+// Cursor-paginated feeds (bookings, requests) by container id: rows loaded so far and the next page's cursor
+let feeds = {};
 
 // Initialize the application
 document.addEventListener('DOMContentLoaded', function() {
@@ -107,17 +119,59 @@ function setupNavigation() {
     });
 }
 
-function checkExistingSession() {
+async function checkExistingSession() {
     const savedUser = localStorage.getItem('currentUser');
     const savedUserType = localStorage.getItem('currentUserType');
+    const savedToken = localStorage.getItem('sessionToken');
     
-    if (savedUser && savedUserType) {
+    if (savedUser && savedUserType && savedToken) {
         currentUser = JSON.parse(savedUser);
         currentUserType = savedUserType;
+        sessionToken = savedToken;
         updateNavigation();
+        
+        // Confirm the server still knows this session
+        try {
+            const response = await fetch('/api/session', {
+                headers: { 'Authorization': `Bearer ${sessionToken}` }
+            });
+            if (response.status === 401) {
+                clearSession();
+                updateNavigation();
+            }
+        } catch (error) {
+            console.error('Error checking session:', error);
+        }
     }
 }
 
+function saveSession(user, userType, token) {
+    currentUser = user;
+    currentUserType = userType;
+    sessionToken = token;
+    
+    // Save to localStorage
+    localStorage.setItem('currentUser', JSON.stringify(currentUser));
+    localStorage.setItem('currentUserType', currentUserType);
+    localStorage.setItem('sessionToken', sessionToken);
+}
+
+// Headers for a request made as the logged-in user; the server checks the token, not the ids sent
+function authHeaders(headers = {}) {
+    return sessionToken ? { ...headers, 'Authorization': `Bearer ${sessionToken}` } : headers;
+}
+
+function clearSession() {
+    currentUser = null;
+    currentUserType = null;
+    sessionToken = null;
+    
+    // Clear localStorage
+    localStorage.removeItem('currentUser');
+    localStorage.removeItem('currentUserType');
+    localStorage.removeItem('sessionToken');
+}
+
 // Authentication functions
 async function handleCustomerRegister(e) {
     e.preventDefault();
@@ -182,12 +236,7 @@ async function handleCustomerLogin(e) {
         const result = await response.json();
         
         if (result.success) {
-            currentUser = result.user;
-            currentUserType = 'customer';
-            
-            // Save to localStorage
-            localStorage.setItem('currentUser', JSON.stringify(currentUser));
-            localStorage.setItem('currentUserType', currentUserType);
+            saveSession(result.user, 'customer', result.token);
             
             showMessage('Login successful!', 'success');
             hideModal('customerAuthModal');
@@ -268,12 +317,7 @@ async function handleShopkeeperLogin(e) {
         const result = await response.json();
         
         if (result.success) {
-            currentUser = result.user;
-            currentUserType = 'shopkeeper';
-            
-            // Save to localStorage
-            localStorage.setItem('currentUser', JSON.stringify(currentUser));
-            localStorage.setItem('currentUserType', currentUserType);
+            saveSession(result.user, 'shopkeeper', result.token);
             
             showMessage('Login successful!', 'success');
             hideModal('shopkeeperAuthModal');
@@ -289,18 +333,24 @@ async function handleShopkeeperLogin(e) {
 }
 
 function logout() {
-    currentUser = null;
-    currentUserType = null;
+    if (sessionToken) {
+        fetch('/api/logout', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Authorization': `Bearer ${sessionToken}`
+            },
+            body: '{}'
+        }).catch(error => console.error('Logout error:', error));
+    }
     
-    // Clear localStorage
-    localStorage.removeItem('currentUser');
-    localStorage.removeItem('currentUserType');
+    clearSession();
     
-    // Stop chat polling
-    if (chatPollingInterval) {
-        clearInterval(chatPollingInterval);
-        chatPollingInterval = null;
-    }
+    // Stop chat sync and drop cached conversations
+    stopChatSync();
+    chatCursor = 0;
+    syncedChats = [];
+    chatMessagesById = {};
     
     updateNavigation();
     showMessage('Logged out successfully', 'success');
@@ -336,13 +386,19 @@ function updateNavigation() {
 }
 
 // Store functions
-async function loadStores() {
+async function loadStores(page = 1) {
     try {
-        const response = await fetch('/api/stores');
+        const response = await fetch(`/api/stores?page=${page}&limit=${STORES_PAGE_SIZE}`);
         const result = await response.json();
         
         if (result.success) {
-            displayStores(result.stores);
+            storesPage = page;
+            loadedStores = page === 1 ? result.stores : loadedStores.concat(result.stores);
+            displayStores(loadedStores);
+            
+            const loadMore = document.getElementById('storesLoadMore');
+            if (loadMore) loadMore.style.display = result.hasMore ? 'block' : 'none';
+            
             updateStats();
         } else {
             console.error('Failed to load stores:', result.message);
@@ -352,6 +408,45 @@ async function loadStores() {
     }
 }
 
+function loadMoreStores() {
+    loadStores(storesPage + 1);
+}
+
+// Feed helpers
+function feedUrl(path, cursor, limit = FEED_PAGE_SIZE) {
+    const separator = path.includes('?') ? '&' : '?';
+    return `${path}${separator}limit=${limit}` + (cursor ? `&cursor=${encodeURIComponent(cursor)}` : '');
+}
+
+function feedCursor(name, more) {
+    return more && feeds[name] ? feeds[name].nextCursor : null;
+}
+
+// Record a page of a feed; "load more" appends it, any other load starts the feed over
+function storeFeedPage(name, rows, nextCursor, more) {
+    const loaded = more && feeds[name] ? feeds[name].rows.concat(rows) : rows;
+    feeds[name] = { rows: loaded, nextCursor: nextCursor || null };
+    return loaded;
+}
+
+// Page size that re-reads everything already shown, so a refresh doesn't drop loaded pages
+function feedReloadLimit(name) {
+    const loaded = feeds[name] ? feeds[name].rows.length : 0;
+    return Math.min(Math.max(loaded, FEED_PAGE_SIZE), FEED_MAX_PAGE_SIZE);
+}
+
+function feedLoadMoreButton(name, loader) {
+    if (!feeds[name] || !feeds[name].nextCursor) return '';
+    return `
+        <div class="load-more">
+            <button onclick="${loader}(true)" class="btn-outline">
+                <i class="fas fa-chevron-down"></i>
+                Load More
+            </button>
+        </div>
+    `;
+}
+
 function displayStores(stores) {
     const storesGrid = document.getElementById('storesGrid');
     if (!storesGrid) return;
@@ -420,16 +515,13 @@ function getCategoryName(category) {
 
 async function viewStore(storeId) {
     try {
-        const response = await fetch('/api/stores');
+        const response = await fetch(`/api/stores/${storeId}`);
         const result = await response.json();
         
         if (result.success) {
-            const store = result.stores.find(s => s.id === storeId);
-            if (store) {
-                currentStore = store;
-                displayStoreModal(store);
-                showModal('storeModal');
-            }
+            currentStore = result.store;
+            displayStoreModal(result.store);
+            showModal('storeModal');
         }
     } catch (error) {
         console.error('Error loading store details:', error);
@@ -594,7 +686,8 @@ async function handleItemRequest(e) {
         itemName: document.getElementById('requestItem').value,
         quantity: document.getElementById('requestQuantity').value,
         description: document.getElementById('requestDescription').value,
-        targetStore: currentStore ? currentStore.shop_name : 'All Stores'
+        targetStore: currentStore ? currentStore.shop_name : 'All Stores',
+        targetStoreId: currentStore ? currentStore.id : null
     };
     
     try {
@@ -736,16 +829,14 @@ function switchDashboardTab(tabName) {
     }
 }
 
-async function loadCustomerBookings() {
+async function loadCustomerBookings(more = false) {
     try {
-        const response = await fetch('/api/bookings');
+        const cursor = feedCursor('customerBookings', more);
+        const response = await fetch(feedUrl(`/api/bookings?customerId=${currentUser.id}`, cursor));
         const result = await response.json();
         
         if (result.success) {
-            const customerBookings = result.bookings.filter(booking => 
-                booking.customer_phone === currentUser.phone
-            );
-            displayCustomerBookings(customerBookings);
+            displayCustomerBookings(storeFeedPage('customerBookings', result.bookings, result.nextCursor, more));
         }
     } catch (error) {
         console.error('Error loading bookings:', error);
@@ -778,19 +869,18 @@ function displayCustomerBookings(bookings) {
                 </div>
             `).join('')}
         </div>
+        ${feedLoadMoreButton('customerBookings', 'loadCustomerBookings')}
     `;
 }
 
-async function loadCustomerRequests() {
+async function loadCustomerRequests(more = false) {
     try {
-        const response = await fetch('/api/requests');
+        const cursor = feedCursor('customerRequests', more);
+        const response = await fetch(feedUrl(`/api/requests?customerId=${currentUser.id}`, cursor));
         const result = await response.json();
         
         if (result.success) {
-            const customerRequests = result.requests.filter(request => 
-                request.customer_phone === currentUser.phone
-            );
-            displayCustomerRequests(customerRequests);
+            displayCustomerRequests(storeFeedPage('customerRequests', result.requests, result.nextCursor, more));
         }
     } catch (error) {
         console.error('Error loading requests:', error);
@@ -824,6 +914,7 @@ function displayCustomerRequests(requests) {
                 </div>
             `).join('')}
         </div>
+        ${feedLoadMoreButton('customerRequests', 'loadCustomerRequests')}
     `;
 }
 
@@ -850,16 +941,14 @@ function loadCustomerProfile() {
     `;
 }
 
-async function loadShopkeeperBookings() {
+async function loadShopkeeperBookings(more = false) {
     try {
-        const response = await fetch('/api/bookings');
+        const cursor = feedCursor('shopkeeperBookings', more);
+        const response = await fetch(feedUrl(`/api/bookings?storeId=${currentUser.id}`, cursor));
         const result = await response.json();
         
         if (result.success) {
-            const shopkeeperBookings = result.bookings.filter(booking => 
-                booking.store_phone === currentUser.phone
-            );
-            displayShopkeeperBookings(shopkeeperBookings);
+            displayShopkeeperBookings(storeFeedPage('shopkeeperBookings', result.bookings, result.nextCursor, more));
         }
     } catch (error) {
         console.error('Error loading bookings:', error);
@@ -914,16 +1003,19 @@ function displayShopkeeperBookings(bookings) {
                 </div>
             `).join('')}
         </div>
+        ${feedLoadMoreButton('shopkeeperBookings', 'loadShopkeeperBookings')}
     `;
 }
 
-async function loadShopkeeperRequests() {
+async function loadShopkeeperRequests(more = false) {
     try {
-        const response = await fetch('/api/requests');
+        // Only the requests routed to this store, not the whole requests table
+        const cursor = feedCursor('shopkeeperRequests', more);
+        const response = await fetch(feedUrl(`/api/stores/${currentUser.id}/requests`, cursor));
         const result = await response.json();
         
         if (result.success) {
-            displayShopkeeperRequests(result.requests);
+            displayShopkeeperRequests(storeFeedPage('shopkeeperRequests', result.requests, result.nextCursor, more));
         }
     } catch (error) {
         console.error('Error loading requests:', error);
@@ -969,6 +1061,7 @@ function displayShopkeeperRequests(requests) {
                 </div>
             `).join('')}
         </div>
+        ${feedLoadMoreButton('shopkeeperRequests', 'loadShopkeeperRequests')}
     `;
 }
 
@@ -1073,10 +1166,11 @@ async function handleAddProduct(e) {
             e.target.reset();
             
             // Refresh products list
+            const added = { ...product, id: result.product_id };
             if (currentUser.products) {
-                currentUser.products.push(product);
+                currentUser.products.push(added);
             } else {
-                currentUser.products = [product];
+                currentUser.products = [added];
             }
             loadShopkeeperProducts();
         } else {
@@ -1108,6 +1202,7 @@ async function handleEditProduct(e) {
     e.preventDefault();
     
     const index = parseInt(e.target.dataset.productIndex);
+    const productId = currentUser.products[index].id;
     const product = {
         name: document.getElementById('editProductName').value,
         price: document.getElementById('editProductPrice').value,
@@ -1116,16 +1211,12 @@ async function handleEditProduct(e) {
     };
     
     try {
-        const response = await fetch('/api/update-product', {
+        const response = await fetch(`/api/stores/${currentUser.id}/products/${productId}`, {
             method: 'POST',
-            headers: {
+            headers: authHeaders({
                 'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({
-                storeId: currentUser.id,
-                productIndex: index,
-                product: product
-            })
+            }),
+            body: JSON.stringify(product)
         });
         
         const result = await response.json();
@@ -1135,7 +1226,7 @@ async function handleEditProduct(e) {
             hideModal('editProductModal');
             
             // Update local data
-            currentUser.products[index] = product;
+            currentUser.products[index] = result.product;
             loadShopkeeperProducts();
         } else {
             showMessage(result.message || 'Failed to update product', 'error');
@@ -1152,15 +1243,10 @@ async function deleteProduct(index) {
     }
     
     try {
-        const response = await fetch('/api/delete-product', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({
-                storeId: currentUser.id,
-                productIndex: index
-            })
+        const productId = currentUser.products[index].id;
+        const response = await fetch(`/api/stores/${currentUser.id}/products/${productId}`, {
+            method: 'DELETE',
+            headers: authHeaders()
         });
         
         const result = await response.json();
@@ -1180,25 +1266,35 @@ async function deleteProduct(index) {
     }
 }
 
+// Run several API requests in one round trip; resolves to their {status, body} in order
+async function apiBatch(requests) {
+    const response = await fetch('/api/batch', {
+        method: 'POST',
+        headers: authHeaders({ 'Content-Type': 'application/json' }),
+        body: JSON.stringify({ requests })
+    });
+    const result = await response.json();
+    if (!result.success) {
+        throw new Error(result.message || 'Batch request failed');
+    }
+    return result.responses;
+}
+
 // Booking management functions
 async function updateBookingStatus(bookingId, status) {
     try {
-        const response = await fetch('/api/update-booking-status', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({
-                bookingId: bookingId,
-                status: status
-            })
-        });
-        
-        const result = await response.json();
+        // Update and re-read the list in one round trip, covering the pages already loaded
+        const [update, bookings] = await apiBatch([
+            { method: 'POST', path: '/api/update-booking-status', body: { bookingId: bookingId, status: status } },
+            { method: 'GET', path: feedUrl(`/api/bookings?storeId=${currentUser.id}`, null, feedReloadLimit('shopkeeperBookings')) }
+        ]);
+        const result = update.body;
         
         if (result.success) {
             showMessage(`Booking ${status} successfully!`, 'success');
-            loadShopkeeperBookings(); // Refresh the bookings list
+            if (bookings.body.success) {
+                displayShopkeeperBookings(storeFeedPage('shopkeeperBookings', bookings.body.bookings, bookings.body.nextCursor, false));
+            }
         } else {
             showMessage(result.message || 'Failed to update booking', 'error');
         }
@@ -1286,9 +1382,9 @@ async function handleProfileUpdate(e) {
         const endpoint = userType === 'customer' ? '/api/update-customer' : '/api/update-store';
         const response = await fetch(endpoint, {
             method: 'POST',
-            headers: {
+            headers: authHeaders({
                 'Content-Type': 'application/json',
-            },
+            }),
             body: JSON.stringify(updateData)
         });
         
@@ -1318,18 +1414,42 @@ async function handleProfileUpdate(e) {
 }
 
 // Chat functions
-async function loadChats() {
+function loadChats() {
     if (!currentUser) return;
     
-    try {
-        const response = await fetch('/api/chats');
-        const result = await response.json();
-        
-        if (result.success) {
-            displayChats(result.chats);
+    displayChats(syncedChats);
+    startChatSync();
+}
+
+// Fetch this user's chats and any messages newer than chatCursor.
+// With wait > 0 the server holds the request open until a new message arrives.
+async function syncChats(wait = 0) {
+    const params = new URLSearchParams({
+        participantType: currentUserType,
+        participantId: currentUser.id,
+        after: chatCursor,
+        wait: wait
+    });
+    const response = await fetch(`/api/chats/sync?${params}`, { headers: authHeaders() });
+    const result = await response.json();
+    
+    if (!result.success) {
+        throw new Error(result.message);
+    }
+    
+    // Skip messages an overlapping sync already merged
+    result.messages.filter(message => message.id > chatCursor).forEach(message => {
+        if (!chatMessagesById[message.chat_id]) {
+            chatMessagesById[message.chat_id] = [];
         }
-    } catch (error) {
-        console.error('Error loading chats:', error);
+        chatMessagesById[message.chat_id].push(message);
+    });
+    chatCursor = Math.max(chatCursor, result.cursor);
+    syncedChats = result.chats;
+    
+    displayChats(syncedChats);
+    if (currentChat) {
+        loadChatMessages(currentChat);
     }
 }
 
@@ -1423,22 +1543,8 @@ function updateChatHeader(chatId) {
     }
 }
 
-async function loadChatMessages(chatId) {
-    try {
-        const response = await fetch('/api/chats');
-        const result = await response.json();
-        
-        if (result.success) {
-            const chat = result.chats.find(c => c.chat_id === chatId);
-            if (chat && chat.messages) {
-                displayChatMessages(chat.messages);
-            } else {
-                displayChatMessages([]);
-            }
-        }
-    } catch (error) {
-        console.error('Error loading messages:', error);
-    }
+function loadChatMessages(chatId) {
+    displayChatMessages(chatMessagesById[chatId] || []);
 }
 
 function displayChatMessages(messages) {
@@ -1497,8 +1603,7 @@ async function handleChatMessage(e) {
         const result = await response.json();
         
         if (result.success) {
-            messageInput.value = '';
-            loadChatMessages(currentChat); // Refresh messages
+            messageInput.value = ''; // The sync loop picks up the new message
         } else {
             showMessage('Failed to send message', 'error');
         }
@@ -1539,6 +1644,12 @@ function startChat(participantId, participantType) {
 // Search and filter functions
 function searchStores() {
     const searchTerm = document.getElementById('locationSearch').value.toLowerCase();
+    
+    // A 6-digit pincode asks the server for the nearest stores
+    if (/^\d{6}$/.test(searchTerm.trim())) {
+        loadNearbyStores(searchTerm.trim());
+        return;
+    }
     const storeCards = document.querySelectorAll('.store-card');
     
     storeCards.forEach(card => {
@@ -1551,34 +1662,41 @@ function searchStores() {
     });
 }
 
+async function loadNearbyStores(pincode) {
+    try {
+        const response = await fetch(`/api/stores/nearby?pincode=${encodeURIComponent(pincode)}&k=20`);
+        const result = await response.json();
+        
+        if (result.success) {
+            displayStores(result.stores);
+            const loadMore = document.getElementById('storesLoadMore');
+            if (loadMore) loadMore.style.display = 'none';
+        } else {
+            showMessage(result.message || 'No stores found near this pincode', 'error');
+        }
+    } catch (error) {
+        console.error('Error loading nearby stores:', error);
+    }
+}
+
 // Statistics functions
 async function updateStats() {
     try {
-        const [storesResponse, customersResponse, bookingsResponse] = await Promise.all([
-            fetch('/api/stores'),
-            fetch('/api/customers'),
-            fetch('/api/bookings')
-        ]);
-        
-        const [storesResult, customersResult, bookingsResult] = await Promise.all([
-            storesResponse.json(),
-            customersResponse.json(),
-            bookingsResponse.json()
-        ]);
+        // Counts are kept on the server, so this stays cheap however many rows there are
+        const response = await fetch('/api/stats');
+        const result = await response.json();
         
-        if (storesResult.success) {
+        if (result.success) {
+            const { stores, customers, bookings } = result.stats;
+            
             const storeCount = document.getElementById('storeCount');
-            if (storeCount) storeCount.textContent = `${storesResult.stores.length}+`;
-        }
-        
-        if (customersResult.success) {
+            if (storeCount) storeCount.textContent = `${stores.active}+`;
+            
             const customerCount = document.getElementById('customerCount');
-            if (customerCount) customerCount.textContent = `${customersResult.customers.length}+`;
-        }
-        
-        if (bookingsResult.success) {
+            if (customerCount) customerCount.textContent = `${customers.active}+`;
+            
             const bookingCount = document.getElementById('bookingCount');
-            if (bookingCount) bookingCount.textContent = `${bookingsResult.bookings.length}+`;
+            if (bookingCount) bookingCount.textContent = `${bookings.total}+`;
         }
     } catch (error) {
         console.error('Error updating stats:', error);
@@ -1609,10 +1727,9 @@ function hideModal(modalId) {
         modal.style.display = 'none';
         document.body.style.overflow = 'auto';
         
-        // Stop chat polling if closing chat modal
-        if (modalId === 'chatModal' && chatPollingInterval) {
-            clearInterval(chatPollingInterval);
-            chatPollingInterval = null;
+        // Stop chat sync if closing chat modal
+        if (modalId === 'chatModal') {
+            stopChatSync();
         }
     }
 }
@@ -1705,17 +1822,30 @@ document.addEventListener('keydown', function(e) {
 });
 
 // Initialize chat polling when chat modal is opened
-function startChatPolling() {
-    if (chatPollingInterval) {
-        clearInterval(chatPollingInterval);
-    }
-    
-    chatPollingInterval = setInterval(() => {
-        if (currentChat) {
-            loadChatMessages(currentChat);
+async function startChatSync() {
+    if (chatSyncActive) return;
+    chatSyncActive = true;
+    const generation = ++chatSyncGeneration;
+    
+    // First call returns the current state at once; later calls long-poll
+    let wait = 0;
+    while (generation === chatSyncGeneration && currentUser) {
+        try {
+            await syncChats(wait);
+            wait = 25;
+        } catch (error) {
+            console.error('Error syncing chats:', error);
+            await new Promise(resolve => setTimeout(resolve, 3000)); // Back off before retrying
         }
-        loadChats();
-    }, 3000); // Poll every 3 seconds
+    }
+    if (generation === chatSyncGeneration) {
+        chatSyncActive = false;
+    }
+}
+
+function stopChatSync() {
+    chatSyncActive = false;
+    chatSyncGeneration++;
 }
 
 // Auto-refresh functionality
@@ -1,50 +1,368 @@
 #!/usr/bin/env python3
+import base64
+import heapq
+import http.client
+import http.cookies
+import io
+import itertools
 import json
+import math
 import os
-from http.server import HTTPServer, SimpleHTTPRequestHandler
+from http.server import HTTPServer, ThreadingHTTPServer, SimpleHTTPRequestHandler
+import re
+import select
+import signal
+import socket
+import threading
+import time
 import urllib.parse
-from datetime import datetime
-import bcrypt
+from datetime import date, datetime, timedelta
 from dotenv import load_dotenv
 from database.connection import db
+from database.errors import Error, InterfaceError, OperationalError, PoolError
+from services.archive import archive
+from services.auth import password_hasher, sessions
+from services.catalogue_cache import catalogue_cache
+from services.bulk_catalogue import (BATCH_SIZE, BulkImportError, batched, export_csv, export_jsonl,
+                                     iter_csv_products, iter_jsonl_products, open_body)
+from services.chat_events import chat_notifier
+from services.chat_writer import PendingMessage, chat_writer
+from services.dashboard_stats import dashboard_stats
+from services.identity_cache import identity_cache
+from services.json_stream import accepts_gzip, encode_json, encode_json_stream, gzip_chunks
+from services.metrics import request_metrics
+from services.product_search import parse_price, product_index
+from services.proximity import store_proximity
+from services.static_assets import etag_matches, static_assets
+from services.supervisor import supervisor
+from services.worker_events import worker_events
 
 # Load environment variables
 load_dotenv()
 
+STORES_PAGE_SIZE = int(os.getenv('STORES_PAGE_SIZE', 50))
+STORES_MAX_PAGE_SIZE = 200
+
+FEED_PAGE_SIZE = int(os.getenv('FEED_PAGE_SIZE', 50))
+FEED_MAX_PAGE_SIZE = 200
+
+CHAT_SYNC_MAX_WAIT = 30
+CHAT_SYNC_MAX_MESSAGES = 500
+# Routes that check out a connection per query instead of holding one for the whole request:
+# the long-poll mostly sits idle, save-chat may wait on the chat writer's connection, stats
+# is served from memory and logins and registrations wait on the bcrypt pool
+UNPINNED_ROUTES = ('/api/chats/sync', '/api/save-chat', '/api/stats', '/api/customer-login',
+                   '/api/shopkeeper-login', '/api/customer-register', '/api/register-shop')
+
+# Set on responses to writes when read replicas are configured: until the time it holds,
+# the client's reads go to the primary, so it sees its own writes despite replica lag
+PRIMARY_COOKIE = 'lk_primary_until'
+WRITE_METHODS = ('POST', 'DELETE')
+
+# Persistent connections are closed after this many idle seconds
+KEEPALIVE_TIMEOUT = float(os.getenv('HTTP_KEEPALIVE_TIMEOUT', 15))
+BATCH_MAX_REQUESTS = 20
+BATCH_METHODS = ('GET', 'POST', 'DELETE')
+# Long-polls would hold the batch's transaction open; nested batches are pointless
+BATCH_EXCLUDED_ROUTES = ('/api/batch', '/api/chats/sync')
+CHAT_MESSAGE_COLUMNS = ('message_id', 'sender_id', 'sender_type', 'message', 'message_created_at')
+
+# Fixed API paths, as metrics labels; any other path that no pattern below matches is 'unmatched'
+API_ROUTES = frozenset((
+    '/api/stores', '/api/stores/nearby', '/api/bookings', '/api/requests', '/api/customers',
+    '/api/chats', '/api/chats/sync', '/api/chats/history', '/api/session', '/api/search',
+    '/api/stats', '/api/register-shop', '/api/customer-register', '/api/customer-login',
+    '/api/shopkeeper-login', '/api/batch', '/api/logout', '/api/book-item', '/api/request-item',
+    '/api/update-store', '/api/update-customer', '/api/add-product', '/api/update-product',
+    '/api/delete-product', '/api/update-booking-status', '/api/save-chat',
+))
+
+# Matches /api/stores/<id>, /api/stores/<id>/requests and /api/stores/<id>/products[/import|/export]
+STORE_ROUTE = re.compile(r'^/api/stores/(\d+)(?:/(requests|products|products/import|products/export))?/?$')
+# Matches /api/stores/<id>/products/<product id> and /api/stores/<id>/products/batch
+PRODUCT_ROUTE = re.compile(r'^/api/stores/(\d+)/products/(\d+|batch)/?$')
+
+# One statement creates the chat or moves its last message, so concurrent first messages can't race
+CHAT_UPSERT = """INSERT INTO chats (chat_id, participant1_id, participant1_type, participant2_id, participant2_type,
+                                   last_message, last_message_time)
+                 VALUES (%s, %s, %s, %s, %s, %s, NOW())
+                 ON DUPLICATE KEY UPDATE last_message = VALUES(last_message),
+                                         last_message_time = VALUES(last_message_time)"""
+CHAT_TOUCH = "UPDATE chats SET last_message = %s, last_message_time = NOW() WHERE chat_id = %s"
+MESSAGE_INSERT = "INSERT INTO messages (chat_id, sender_id, sender_type, message) VALUES (%s, %s, %s, %s)"
+
+# Rows the archiver moves out of the hot tables once created before the cutoff
+ARCHIVE_RULES = {
+    'bookings': "status IN ('completed', 'rejected') AND created_at < %s",
+    'requests': "created_at < %s",
+    'messages': "created_at < %s",
+}
+
+PRODUCT_INSERT = """INSERT INTO products (store_id, name, price, description, available, price_value)
+                    VALUES (%s, %s, %s, %s, %s, %s)"""
+PRODUCT_INDEX_COLUMNS = "id, store_id, name, price, price_value, description, available"
+PRODUCT_EDITABLE_FIELDS = ('name', 'price', 'description', 'available')
+PRODUCT_BATCH_MAX = 1000
+
+# A 6-digit Indian pincode inside a free-text location
+PINCODE_PATTERN = re.compile(r'\b\d{6}\b')
+
+SEARCH_MAX_RESULTS = 100
+NEARBY_MAX_RESULTS = 50
+
+# Clients allowed to scrape /metrics unless METRICS_ALLOW_REMOTE is set
+LOCAL_ADDRESSES = ('127.0.0.1', '::1', '::ffff:127.0.0.1')
+# Seconds a scrape waits for the other workers' metrics before answering without them
+METRICS_GATHER_TIMEOUT = 1.0
+
+# Store columns that are safe to send to clients (everything except password_hash)
+STORE_PUBLIC_COLUMNS = ("id, shop_name, owner_name, phone, email, address, pincode, category, "
+                        "status, created_at, updated_at")
+
+def route_label(path):
+    """Metrics label for an API path, with ids replaced so each route is one series.
+    
+    Unknown paths all share the 'unmatched' label, so clients can't add series at will.
+    """
+    store_route = STORE_ROUTE.match(path)
+    if store_route:
+        return '/api/stores/{id}' + (f'/{store_route.group(2)}' if store_route.group(2) else '')
+    product_route = PRODUCT_ROUTE.match(path)
+    if product_route:
+        return '/api/stores/{id}/products/' + ('batch' if product_route.group(2) == 'batch' else '{productId}')
+    path = path.rstrip('/')
+    return path if path in API_ROUTES else 'unmatched'
+
+def encode_cursor(created_at, row_id):
+    """Encode a (created_at, id) position as an opaque pagination cursor"""
+    raw = f"{created_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    """Decode a pagination cursor back to (created_at, id); raises ValueError if malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        created_at, row_id = raw.split('|')
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
 class LocalKiranaHandler(SimpleHTTPRequestHandler):
-    def __init__(self, *args, **kwargs):
-        # Connect to database
-        if not db.connection or not db.connection.is_connected():
-            db.connect()
-        super().__init__(*args, **kwargs)
+    # Keep connections open between requests; every response is framed by
+    # Content-Length or chunked encoding
+    protocol_version = 'HTTP/1.1'
+    timeout = KEEPALIVE_TIMEOUT
+    # Headers and body go out in separate writes; without this the body waits on
+    # the client's delayed ACK of the headers
+    disable_nagle_algorithm = True
+    # Set on the sub-requests of /api/batch
+    batched = False
     
     def do_GET(self):
         if self.path.startswith('/api/'):
-            self.handle_api_get()
+            self.dispatch_api(self.handle_api_get)
+        elif urllib.parse.urlparse(self.path).path == '/metrics':
+            self.send_metrics()
         else:
-            super().do_GET()
+            self.send_static()
+    
+    def do_DELETE(self):
+        if self.path.startswith('/api/'):
+            self.dispatch_api(self.handle_api_delete)
+        else:
+            self.send_error(404)
+    
+    def do_HEAD(self):
+        self.send_static(head_only=True)
     
     def do_POST(self):
         if self.path.startswith('/api/'):
-            self.handle_api_post()
+            self.dispatch_api(self.handle_api_post)
         else:
             self.send_error(404)
     
+    def send_response(self, code, message=None):
+        self.response_status = code
+        super().send_response(code, message)
+    
+    def end_headers(self):
+        # A worker that is shutting down sends clients elsewhere for their next request
+        if getattr(self.server, 'stopping', False):
+            self.send_header('Connection', 'close')
+        # Writes may also happen on other threads (the chat writer), so any write request counts
+        if db.replicas and self.command in WRITE_METHODS and self.path.startswith('/api/'):
+            window = db.primary_sticky_seconds
+            self.send_header('Set-Cookie', f"{PRIMARY_COOKIE}={time.time() + window:.3f}; "
+                                           f"Max-Age={math.ceil(window)}; Path=/api; HttpOnly; SameSite=Lax")
+        super().end_headers()
+    
+    def reads_from_primary(self):
+        """Whether the client wrote recently enough that its reads must see the primary"""
+        cookies = http.cookies.SimpleCookie()
+        try:
+            cookies.load(self.headers.get('Cookie', ''))
+            return float(cookies[PRIMARY_COOKIE].value) > time.time()
+        except (KeyError, ValueError, http.cookies.CookieError):
+            return False
+    
+    def dispatch_api(self, handler):
+        """Run an API handler with one pooled connection checked out for the whole request"""
+        path = urllib.parse.urlparse(self.path).path
+        # Labelled before the body is read, so even a malformed request to an unknown path
+        # is counted as 'unmatched'; handlers also relabel a known path with the wrong method
+        self.route = route_label(path)
+        self.response_status = None
+        db.reset_request_stats()
+        request_metrics.start()
+        started = time.perf_counter()
+        try:
+            self.run_api_handler(handler, path)
+        finally:
+            query_count, db_seconds = db.request_stats()
+            request_metrics.finish(self.route, self.command, self.response_status or 500,
+                                   time.perf_counter() - started, query_count, db_seconds)
+    
+    def run_api_handler(self, handler, path):
+        try:
+            if path in UNPINNED_ROUTES:
+                handler()
+            elif self.command == 'GET' and db.replicas and not self.reads_from_primary():
+                with db.replica_reads():
+                    handler()
+            else:
+                with db.checkout():
+                    handler()
+        except (OperationalError, InterfaceError, PoolError) as e:
+            print(f"Database unavailable: {e}")
+            self.send_json_response({'success': False, 'message': 'Database unavailable'}, 503)
+        except Error as e:
+            print(f"Database error: {e}")
+            self.send_json_response({'success': False, 'message': 'Database error'}, 500)
+    
+    def run_batch(self, data):
+        """Answer several API requests in one round trip, on this request's connection.
+        
+        Body: {"requests": [{"method": "GET", "path": "/api/stores"},
+                            {"method": "POST", "path": "/api/book-item", "body": {...}}]}.
+        Each entry gets back {"status": ..., "body": ...}, in order, and one failing
+        doesn't stop the rest. If any entry writes, they all run in one transaction,
+        each under its own savepoint so a failed entry leaves nothing half-written.
+        """
+        entries = data.get('requests') if isinstance(data, dict) else None
+        if not isinstance(entries, list) or not 0 < len(entries) <= BATCH_MAX_REQUESTS:
+            self.send_json_response({'success': False,
+                                     'message': f'requests must list 1 to {BATCH_MAX_REQUESTS} requests'}, 400)
+            return
+        for index, entry in enumerate(entries):
+            if not (isinstance(entry, dict) and entry.get('method') in BATCH_METHODS
+                    and isinstance(entry.get('path'), str) and entry['path'].startswith('/api/')
+                    and urllib.parse.urlparse(entry['path']).path not in BATCH_EXCLUDED_ROUTES):
+                self.send_json_response({'success': False, 'message': 'Invalid batch request', 'index': index}, 400)
+                return
+        
+        writes = any(entry['method'] != 'GET' for entry in entries)
+        committed = False
+        with worker_events.deferred() as events:
+            try:
+                if writes:
+                    with db.transaction():
+                        responses = [self.run_batch_entry(entry, savepoint=True) for entry in entries]
+                else:
+                    responses = [self.run_batch_entry(entry) for entry in entries]
+                committed = True
+            finally:
+                # Entries updated this worker's caches, indexes and counters before the
+                # batch committed or rolled back; redo that from the database as it now is
+                for event in events:
+                    if event['kind'] in ('store', 'customer'):
+                        apply_worker_event(event)
+                if not committed and any(event['kind'] == 'stats' for event in events):
+                    dashboard_stats.reconcile(load_dashboard_counts)
+        self.send_json_response({'success': True, 'responses': responses})
+    
+    def run_batch_entry(self, entry, savepoint=False):
+        """Run one /api/batch entry and return its status and decoded body"""
+        subrequest = BatchSubrequest(self, entry['method'], entry['path'], entry.get('body'))
+        try:
+            if savepoint:
+                with db.transaction():
+                    subrequest.handle_entry()
+            else:
+                subrequest.handle_entry()
+        except (OperationalError, InterfaceError, PoolError):
+            # The connection is gone, and the batch's transaction with it
+            raise
+        except Exception as e:
+            print(f"Error in batch request {entry['method']} {entry['path']}: {e!r}")
+            subrequest.send_json_response({'success': False, 'message': 'Request failed'}, 500)
+        return subrequest.result()
+    
     def handle_api_get(self):
-        if self.path == '/api/stores':
-            self.get_stores()
-        elif self.path == '/api/bookings':
-            self.get_bookings()
-        elif self.path == '/api/requests':
-            self.get_requests()
-        elif self.path == '/api/customers':
+        parsed = urllib.parse.urlparse(self.path)
+        path = parsed.path
+        params = urllib.parse.parse_qs(parsed.query)
+        
+        store_route = STORE_ROUTE.match(path)
+        
+        if path == '/api/stores':
+            self.get_stores(params)
+        elif path == '/api/stores/nearby':
+            self.get_nearby_stores(params)
+        elif store_route and store_route.group(2) == 'products':
+            self.get_store_products(int(store_route.group(1)))
+        elif store_route and store_route.group(2) == 'requests':
+            self.get_store_requests(int(store_route.group(1)), params)
+        elif store_route and store_route.group(2) == 'products/export':
+            self.export_products(int(store_route.group(1)), params)
+        elif store_route and not store_route.group(2):
+            self.get_store(int(store_route.group(1)))
+        elif path == '/api/bookings':
+            self.get_bookings(params)
+        elif path == '/api/requests':
+            self.get_requests(params)
+        elif path == '/api/customers':
             self.get_customers()
-        elif self.path == '/api/chats':
+        elif path == '/api/chats':
             self.get_chats()
+        elif path == '/api/chats/sync':
+            self.sync_chats(params)
+        elif path == '/api/chats/history':
+            self.get_chat_history(params)
+        elif path == '/api/session':
+            self.check_session()
+        elif path == '/api/search':
+            self.search_products(params)
+        elif path == '/api/stats':
+            self.get_stats()
         else:
+            self.route = 'unmatched'
             self.send_error(404)
     
+    def get_param(self, params, name, default=None):
+        """Return the first value of a query string parameter"""
+        values = params.get(name)
+        return values[0] if values else default
+    
+    def get_int_param(self, params, name, default, minimum=None, maximum=None):
+        """Return a query string parameter as an int, clamped to the given bounds"""
+        try:
+            value = int(self.get_param(params, name, default))
+        except (TypeError, ValueError):
+            value = default
+        if minimum is not None:
+            value = max(value, minimum)
+        if maximum is not None:
+            value = min(value, maximum)
+        return value
+    
     def handle_api_post(self):
+        # Bulk imports stream their body instead of loading it as one JSON document
+        parsed = urllib.parse.urlparse(self.path)
+        store_route = STORE_ROUTE.match(parsed.path)
+        if store_route and store_route.group(2) == 'products/import':
+            self.import_products(int(store_route.group(1)), urllib.parse.parse_qs(parsed.query))
+            return
+        
         content_length = int(self.headers['Content-Length'])
         post_data = self.rfile.read(content_length)
         
@@ -54,7 +372,12 @@ class LocalKiranaHandler(SimpleHTTPRequestHandler):
             self.send_json_response({'success': False, 'message': 'Invalid JSON'}, 400)
             return
         
-        if self.path == '/api/register-shop':
+        product_route = PRODUCT_ROUTE.match(parsed.path)
+        if product_route and product_route.group(2) == 'batch':
+            self.batch_update_products(int(product_route.group(1)), data)
+        elif product_route:
+            self.patch_product(int(product_route.group(1)), int(product_route.group(2)), data)
+        elif self.path == '/api/register-shop':
             self.register_shop(data)
         elif self.path == '/api/customer-register':
             self.register_customer(data)
@@ -62,6 +385,10 @@ class LocalKiranaHandler(SimpleHTTPRequestHandler):
             self.login_customer(data)
         elif self.path == '/api/shopkeeper-login':
             self.login_shopkeeper(data)
+        elif self.path == '/api/batch':
+            self.run_batch(data)
+        elif self.path == '/api/logout':
+            self.logout(data)
         elif self.path == '/api/book-item':
             self.book_item(data)
         elif self.path == '/api/request-item':
@@ -81,19 +408,73 @@ class LocalKiranaHandler(SimpleHTTPRequestHandler):
         elif self.path == '/api/save-chat':
             self.save_chat(data)
         else:
+            self.route = 'unmatched'
+            self.send_error(404)
+    
+    def handle_api_delete(self):
+        product_route = PRODUCT_ROUTE.match(urllib.parse.urlparse(self.path).path)
+        if product_route and product_route.group(2) != 'batch':
+            self.remove_product(int(product_route.group(1)), int(product_route.group(2)))
+        else:
+            self.route = 'unmatched'
             self.send_error(404)
     
     def hash_password(self, password):
         """Hash password using bcrypt"""
-        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        return password_hasher.hash_password(password)
     
     def verify_password(self, password, hashed):
         """Verify password against hash"""
-        return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+        return password_hasher.verify_password(password, hashed)
+    
+    def get_session_token(self):
+        """Return the bearer token from the Authorization header, if any"""
+        auth = self.headers.get('Authorization', '')
+        if auth.startswith('Bearer '):
+            return auth[len('Bearer '):].strip()
+        return None
+    
+    def get_session(self):
+        """Return (user_type, user_id) for the request's session token, or None"""
+        token = self.get_session_token()
+        return sessions.get(token) if token else None
+    
+    def authorize(self, user_type, user_id):
+        """True if the request's session token belongs to the given user; otherwise send 401 or 403.
+        
+        The ids in a request's body or query string are only the client's claim to be that user.
+        """
+        session = self.get_session()
+        if not session:
+            self.send_json_response({'success': False, 'message': 'Not logged in'}, 401)
+            return False
+        try:
+            allowed = session == (user_type, int(user_id))
+        except (TypeError, ValueError):
+            allowed = False
+        if not allowed:
+            self.send_json_response({'success': False, 'message': 'Not allowed for this account'}, 403)
+        return allowed
+    
+    def check_session(self):
+        session = self.get_session()
+        if not session:
+            self.send_json_response({'success': False, 'message': 'Not logged in'}, 401)
+            return
+        
+        user_type, user_id = session
+        self.send_json_response({'success': True, 'userType': user_type, 'userId': user_id})
+    
+    def logout(self, data):
+        token = self.get_session_token()
+        if token:
+            sessions.revoke(token)
+            worker_events.publish('logout', token=token)
+        self.send_json_response({'success': True, 'message': 'Logged out successfully'})
     
     def register_customer(self, data):
         # Check if customer already exists
-        existing_phone = db.execute_query(
+        existing_phone = db.fetch_one(
             "SELECT id FROM customers WHERE phone = %s", 
             (data['phone'],)
         )
@@ -101,7 +482,7 @@ class LocalKiranaHandler(SimpleHTTPRequestHandler):
             self.send_json_response({'success': False, 'message': 'Phone number already registered'})
             return
         
-        existing_email = db.execute_query(
+        existing_email = db.fetch_one(
             "SELECT id FROM customers WHERE email = %s", 
             (data['email'],)
         )
@@ -112,78 +493,189 @@ class LocalKiranaHandler(SimpleHTTPRequestHandler):
         # Hash password and insert customer
         password_hash = self.hash_password(data['password'])
         
-        customer_id = db.execute_insert(
+        db.insert(
             """INSERT INTO customers (name, phone, email, location, password_hash) 
                VALUES (%s, %s, %s, %s, %s)""",
             (data['name'], data['phone'], data['email'], data['location'], password_hash)
         )
-        
-        if customer_id:
-            self.send_json_response({'success': True, 'message': 'Customer registered successfully'})
-        else:
-            self.send_json_response({'success': False, 'message': 'Failed to register customer'}, 500)
+        identity_cache.invalidate_key(('customer', data['phone']))
+        record_stats('add_customer')
+        self.send_json_response({'success': True, 'message': 'Customer registered successfully'})
     
     def login_customer(self, data):
-        customer = db.execute_query(
+        customer_data = db.fetch_one(
             "SELECT * FROM customers WHERE phone = %s", 
             (data.get('phone'),)
         )
         
-        if customer and len(customer) > 0:
-            customer_data = customer[0]
+        if customer_data:
             if self.verify_password(data.get('password', ''), customer_data['password_hash']):
                 # Remove password from response
                 del customer_data['password_hash']
-                self.send_json_response({'success': True, 'user': customer_data})
+                token = sessions.create('customer', customer_data['id'])
+                self.send_json_response({'success': True, 'user': customer_data, 'token': token})
                 return
         
         self.send_json_response({'success': False, 'message': 'Invalid phone number or password'})
     
     def login_shopkeeper(self, data):
-        store = db.execute_query(
+        store_data = db.fetch_one(
             "SELECT * FROM stores WHERE phone = %s", 
             (data.get('phone'),)
         )
         
-        if store and len(store) > 0:
-            store_data = store[0]
+        if store_data:
             if self.verify_password(data.get('password', ''), store_data['password_hash']):
                 # Remove password from response
                 del store_data['password_hash']
                 # Get products for this store
-                products = db.execute_query(
+                store_data['products'] = db.fetch_all(
                     "SELECT * FROM products WHERE store_id = %s", 
                     (store_data['id'],)
                 )
-                store_data['products'] = products or []
-                self.send_json_response({'success': True, 'user': store_data})
+                token = sessions.create('shopkeeper', store_data['id'])
+                self.send_json_response({'success': True, 'user': store_data, 'token': token})
                 return
         
         self.send_json_response({'success': False, 'message': 'Invalid phone number or password'})
     
-    def get_stores(self):
-        stores = db.execute_query("SELECT * FROM stores WHERE status = 'active'")
-        if stores:
-            # Get products for each store
-            for store in stores:
-                products = db.execute_query(
-                    "SELECT * FROM products WHERE store_id = %s", 
-                    (store['id'],)
-                )
-                store['products'] = products or []
-                # Remove password hash
-                if 'password_hash' in store:
-                    del store['password_hash']
+    def get_stores(self, params):
+        page = self.get_int_param(params, 'page', 1, minimum=1)
+        limit = self.get_int_param(params, 'limit', STORES_PAGE_SIZE, minimum=1, maximum=STORES_MAX_PAGE_SIZE)
+        
+        # Build filters; status defaults to active stores only
+        filters = {'status': self.get_param(params, 'status', 'active')}
+        for field in ('category', 'pincode'):
+            value = self.get_param(params, field)
+            if value:
+                filters[field] = value
+        
+        cache_key = ('stores', page, limit, tuple(sorted(filters.items())))
+        if self.send_cached_response(cache_key):
+            return
+        generation = catalogue_cache.generation
+        # Filled from the primary: a lagging replica's rows would stay cached after they change
+        db.read_from_primary()
+        
+        # Fetch one extra row to know whether another page exists
+        conditions = [f"{field} = %s" for field in filters]
+        values = list(filters.values()) + [limit + 1, (page - 1) * limit]
+        stores = db.fetch_all(
+            f"""SELECT {STORE_PUBLIC_COLUMNS} FROM stores
+               WHERE {' AND '.join(conditions)}
+               ORDER BY id LIMIT %s OFFSET %s""",
+            values
+        )
+        
+        has_more = len(stores) > limit
+        stores = stores[:limit]
+        self.attach_products(stores)
+        
+        response = {
+            'success': True,
+            'stores': stores,
+            'page': page,
+            'limit': limit,
+            'hasMore': has_more
+        }
+        self.send_cacheable_response(cache_key, response, [store['id'] for store in stores],
+                                     generation, is_list=True)
+    
+    def get_nearby_stores(self, params):
+        """Return the k nearest active stores to a pincode (or lat/lon), nearest first"""
+        k = self.get_int_param(params, 'k', 10, minimum=1, maximum=NEARBY_MAX_RESULTS)
+        try:
+            if params.get('lat') and params.get('lon'):
+                location = (float(params['lat'][0]), float(params['lon'][0]))
+            else:
+                location = store_proximity.directory.locate(self.get_param(params, 'pincode'))
+        except ValueError:
+            location = None
+        if location is None:
+            self.send_json_response({'success': False, 'message': 'Unknown pincode or location'}, 400)
+            return
+        
+        nearest = store_proximity.nearest(location[0], location[1], k, self.get_param(params, 'category'))
+        stores = []
+        if nearest:
+            placeholders = ', '.join(['%s'] * len(nearest))
+            rows = db.fetch_all(
+                f"SELECT {STORE_PUBLIC_COLUMNS} FROM stores WHERE id IN ({placeholders})",
+                tuple(store_id for _, store_id in nearest),
+                prepared=False
+            )
+            by_id = {row['id']: row for row in rows}
+            for distance, store_id in nearest:
+                if store_id in by_id:
+                    stores.append(dict(by_id[store_id], distance_km=round(distance, 2)))
         
-        self.send_json_response({'success': True, 'stores': stores or []})
+        self.send_json_response({'success': True, 'stores': stores})
+    
+    def get_store(self, store_id):
+        cache_key = ('store', store_id)
+        if self.send_cached_response(cache_key):
+            return
+        generation = catalogue_cache.generation
+        db.read_from_primary()
+        
+        store = db.fetch_one(
+            f"SELECT {STORE_PUBLIC_COLUMNS} FROM stores WHERE id = %s",
+            (store_id,)
+        )
+        if not store:
+            self.send_json_response({'success': False, 'message': 'Store not found'}, 404)
+            return
+        
+        self.attach_products([store])
+        self.send_cacheable_response(cache_key, {'success': True, 'store': store}, [store_id], generation)
+    
+    def get_store_products(self, store_id):
+        cache_key = ('products', store_id)
+        if self.send_cached_response(cache_key):
+            return
+        generation = catalogue_cache.generation
+        db.read_from_primary()
+        
+        if not db.fetch_one("SELECT id FROM stores WHERE id = %s", (store_id,)):
+            self.send_json_response({'success': False, 'message': 'Store not found'}, 404)
+            return
+        
+        products = db.fetch_all(
+            "SELECT * FROM products WHERE store_id = %s ORDER BY id",
+            (store_id,)
+        )
+        self.send_cacheable_response(cache_key, {'success': True, 'products': products}, [store_id], generation)
+    
+    def attach_products(self, stores):
+        """Load the catalogues of all given stores in one query and group them per store"""
+        for store in stores:
+            store['products'] = []
+        if not stores:
+            return
+        
+        by_id = {store['id']: store for store in stores}
+        placeholders = ', '.join(['%s'] * len(by_id))
+        products = db.fetch_all(
+            f"SELECT * FROM products WHERE store_id IN ({placeholders}) ORDER BY store_id, id",
+            tuple(by_id),
+            prepared=False
+        )
+        for product in products:
+            by_id[product['store_id']]['products'].append(product)
+    
+    def get_stats(self):
+        """Dashboard counts from the in-memory counters, loading them on first use"""
+        if not dashboard_stats.loaded:
+            dashboard_stats.reconcile(load_dashboard_counts)
+        self.send_json_response({'success': True, 'stats': dashboard_stats.snapshot()})
     
     def get_customers(self):
-        customers = db.execute_query("SELECT id, name, phone, email, location, status, created_at FROM customers")
-        self.send_json_response({'success': True, 'customers': customers or []})
+        customers = db.fetch_all("SELECT id, name, phone, email, location, status, created_at FROM customers")
+        self.send_json_response({'success': True, 'customers': customers})
     
     def register_shop(self, data):
         # Check if shop already exists
-        existing_phone = db.execute_query(
+        existing_phone = db.fetch_one(
             "SELECT id FROM stores WHERE phone = %s", 
             (data['phone'],)
         )
@@ -191,7 +683,7 @@ class LocalKiranaHandler(SimpleHTTPRequestHandler):
             self.send_json_response({'success': False, 'message': 'Phone number already registered'})
             return
         
-        existing_email = db.execute_query(
+        existing_email = db.fetch_one(
             "SELECT id FROM stores WHERE email = %s", 
             (data['email'],)
         )
@@ -202,81 +694,126 @@ class LocalKiranaHandler(SimpleHTTPRequestHandler):
         # Hash password and insert store
         password_hash = self.hash_password(data['password'])
         
-        store_id = db.execute_insert(
-            """INSERT INTO stores (shop_name, owner_name, phone, email, address, pincode, category, password_hash) 
-               VALUES (%s, %s, %s, %s, %s, %s, %s, %s)""",
-            (data['shopName'], data['ownerName'], data['phone'], data['email'], 
-             data['address'], data['pincode'], data['category'], password_hash)
-        )
+        # The store and its default products are saved together or not at all
+        default_products = self.get_default_products(data['category'])
+        with db.transaction():
+            store_id = db.insert(
+                """INSERT INTO stores (shop_name, owner_name, phone, email, address, pincode, category, password_hash) 
+                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s)""",
+                (data['shopName'], data['ownerName'], data['phone'], data['email'], 
+                 data['address'], data['pincode'], data['category'], password_hash)
+            )
+            db.execute_many(
+                PRODUCT_INSERT,
+                [(store_id, product['name'], product['price'], '', product['available'], parse_price(product['price']))
+                 for product in default_products]
+            )
+        index_store(store_id)
+        catalogue_cache.invalidate_lists()
+        identity_cache.invalidate_key(('store', data['phone']))
+        worker_events.publish('store', store_id=store_id)
+        record_stats('add_store', data['category'])
         
-        if store_id:
-            # Add default products
-            default_products = self.get_default_products(data['category'])
-            for product in default_products:
-                db.execute_insert(
-                    "INSERT INTO products (store_id, name, price, available) VALUES (%s, %s, %s, %s)",
-                    (store_id, product['name'], product['price'], product['available'])
-                )
-            
-            self.send_json_response({'success': True, 'message': 'Shop registered successfully', 'shop_id': store_id})
-        else:
-            self.send_json_response({'success': False, 'message': 'Failed to save shop data'}, 500)
+        self.send_json_response({'success': True, 'message': 'Shop registered successfully', 'shop_id': store_id})
+    
+    def resolve_id(self, key, query, params):
+        """Resolve a phone number or product name to a row id through the identity cache, or None"""
+        row_id = identity_cache.get(key)
+        if row_id is None:
+            generation = identity_cache.generation
+            row = db.fetch_one(query, params)
+            if row is None:
+                return None
+            row_id = row['id']
+            identity_cache.put(key, row_id, generation)
+        return row_id
+    
+    def resolve_customer_id(self, phone):
+        return self.resolve_id(('customer', phone), "SELECT id FROM customers WHERE phone = %s", (phone,))
     
     def book_item(self, data):
-        # Get customer and store IDs
-        customer = db.execute_query("SELECT id FROM customers WHERE phone = %s", (data['customerPhone'],))
-        store = db.execute_query("SELECT id FROM stores WHERE phone = %s", (data['storePhone'],))
+        # Get customer and store IDs; usually cached, leaving the INSERT as the only query
+        customer_id = self.resolve_customer_id(data['customerPhone'])
+        store_id = self.resolve_id(('store', data['storePhone']), "SELECT id FROM stores WHERE phone = %s",
+                                   (data['storePhone'],))
         
-        if not customer or not store:
+        if not customer_id or not store_id:
             self.send_json_response({'success': False, 'message': 'Invalid booking data'}, 400)
             return
         
         # Get product ID
-        product = db.execute_query("SELECT id FROM products WHERE name = %s AND store_id = %s", 
-                                 (data['itemName'], store[0]['id']))
+        product_id = self.resolve_id(('product', store_id, data['itemName']),
+                                     "SELECT id FROM products WHERE name = %s AND store_id = %s",
+                                     (data['itemName'], store_id))
         
-        product_id = product[0]['id'] if product else None
-        
-        booking_id = db.execute_insert(
+        booking_id = db.insert(
             """INSERT INTO bookings (customer_id, store_id, product_id, customer_name, customer_phone, 
                                    store_name, store_phone, item_name, status) 
                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)""",
-            (customer[0]['id'], store[0]['id'], product_id, data['customerName'], 
+            (customer_id, store_id, product_id, data['customerName'], 
              data['customerPhone'], data['storeName'], data['storePhone'], data['itemName'], 'pending')
         )
-        
-        if booking_id:
-            self.send_json_response({'success': True, 'message': 'Item booked successfully', 'booking_id': booking_id})
-        else:
-            self.send_json_response({'success': False, 'message': 'Failed to save booking'}, 500)
+        record_stats('add_booking', 'pending', date.today())
+        self.send_json_response({'success': True, 'message': 'Item booked successfully', 'booking_id': booking_id})
     
     def request_item(self, data):
         # Get customer ID
-        customer = db.execute_query("SELECT id FROM customers WHERE phone = %s", (data['customerPhone'],))
+        customer_id = self.resolve_customer_id(data['customerPhone'])
         
-        if not customer:
+        if not customer_id:
             self.send_json_response({'success': False, 'message': 'Customer not found'}, 400)
             return
         
-        request_id = db.execute_insert(
-            """INSERT INTO requests (customer_id, customer_name, customer_phone, customer_location, 
-                                   item_name, quantity, description, target_store, status) 
-               VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)""",
-            (customer[0]['id'], data['customerName'], data['customerPhone'], data['customerLocation'],
-             data['itemName'], data['quantity'], data.get('description', ''), 
-             data.get('targetStore', 'All Stores'), 'pending')
-        )
+        store_ids = self.match_request(data)
+        with db.transaction():
+            request_id = db.insert(
+                """INSERT INTO requests (customer_id, customer_name, customer_phone, customer_location, 
+                                       item_name, quantity, description, target_store, status) 
+                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)""",
+                (customer_id, data['customerName'], data['customerPhone'], data['customerLocation'],
+                 data['itemName'], data['quantity'], data.get('description', ''), 
+                 data.get('targetStore', 'All Stores'), 'pending')
+            )
+            matched = 0
+            for chunk in batched(sorted(store_ids)):
+                placeholders = ', '.join(['%s'] * len(chunk))
+                # Stores deleted since they were indexed simply drop out of the join
+                matched += db.execute(
+                    f"""INSERT INTO request_matches (store_id, request_id, created_at)
+                        SELECT s.id, r.id, r.created_at FROM requests r
+                        JOIN stores s ON s.id IN ({placeholders}) WHERE r.id = %s""",
+                    list(chunk) + [request_id],
+                    prepared=False
+                )
+        self.send_json_response({'success': True, 'message': 'Item request sent successfully',
+                                 'request_id': request_id, 'matched_stores': matched})
+    
+    def match_request(self, data):
+        """Ids of the stores a new request is routed to.
         
-        if request_id:
-            self.send_json_response({'success': True, 'message': 'Item request sent successfully', 'request_id': request_id})
-        else:
-            self.send_json_response({'success': False, 'message': 'Failed to save request'}, 500)
+        A request aimed at one store (targetStoreId) goes to that store only; otherwise
+        to every active store with a product matching the item name, narrowed by the
+        optional category and the pincode (given, or found in the customer's location).
+        """
+        target = data.get('targetStoreId')
+        if target:
+            try:
+                return {int(target)}
+            except (TypeError, ValueError):
+                return set()
+        pincode = data.get('pincode')
+        if not pincode:
+            found = PINCODE_PATTERN.search(data.get('customerLocation') or '')
+            pincode = found.group() if found else None
+        return product_index.match_stores(data['itemName'], category=data.get('category'), pincode=pincode)
     
     def update_store(self, data):
         store_id = data.get('id')
         if not store_id:
             self.send_json_response({'success': False, 'message': 'Store ID required'}, 400)
             return
+        if not self.authorize('shopkeeper', store_id):
+            return
         
         # Remove password from update data
         if 'password_hash' in data:
@@ -297,17 +834,38 @@ class LocalKiranaHandler(SimpleHTTPRequestHandler):
         values.append(store_id)
         query = f"UPDATE stores SET {', '.join(update_fields)} WHERE id = %s"
         
-        result = db.execute_query(query, values)
-        if result is not None:
-            self.send_json_response({'success': True, 'message': 'Store updated successfully'})
-        else:
-            self.send_json_response({'success': False, 'message': 'Failed to update store'}, 500)
+        # Listing fields feed the proximity index and dashboard counts, which need the row
+        # before and after the change
+        listing_change = any(field in data for field in ('pincode', 'status', 'category'))
+        with db.transaction():
+            if listing_change:
+                before = db.fetch_one(
+                    "SELECT id, category, pincode, status FROM stores WHERE id = %s FOR UPDATE",
+                    (store_id,)
+                )
+            db.execute(query, values, prepared=False)
+            if listing_change:
+                store = db.fetch_one(
+                    "SELECT id, category, pincode, status FROM stores WHERE id = %s",
+                    (store_id,)
+                )
+        catalogue_cache.invalidate_store(int(store_id))
+        catalogue_cache.invalidate_lists()
+        identity_cache.invalidate_store(store_id)
+        product_index.update_store(int(store_id), data)
+        worker_events.publish('store', store_id=int(store_id))
+        if listing_change and store:
+            store_proximity.set_store(store)
+            record_stats('move_store', before, store)
+        self.send_json_response({'success': True, 'message': 'Store updated successfully'})
     
     def update_customer(self, data):
         customer_id = data.get('id')
         if not customer_id:
             self.send_json_response({'success': False, 'message': 'Customer ID required'}, 400)
             return
+        if not self.authorize('customer', customer_id):
+            return
         
         # Remove password from update data
         if 'password_hash' in data:
@@ -328,11 +886,16 @@ class LocalKiranaHandler(SimpleHTTPRequestHandler):
         values.append(customer_id)
         query = f"UPDATE customers SET {', '.join(update_fields)} WHERE id = %s"
         
-        result = db.execute_query(query, values)
-        if result is not None:
-            self.send_json_response({'success': True, 'message': 'Customer updated successfully'})
-        else:
-            self.send_json_response({'success': False, 'message': 'Failed to update customer'}, 500)
+        with db.transaction():
+            before = None
+            if 'status' in data:
+                before = db.fetch_one("SELECT status FROM customers WHERE id = %s FOR UPDATE", (customer_id,))
+            db.execute(query, values, prepared=False)
+        identity_cache.invalidate_customer(customer_id)
+        worker_events.publish('customer', customer_id=int(customer_id))
+        if before:
+            record_stats('move_customer', before['status'], data['status'])
+        self.send_json_response({'success': True, 'message': 'Customer updated successfully'})
     
     def add_product(self, data):
         store_id = data.get('storeId')
@@ -342,67 +905,307 @@ class LocalKiranaHandler(SimpleHTTPRequestHandler):
             self.send_json_response({'success': False, 'message': 'Store ID and product data required'}, 400)
             return
         
-        product_id = db.execute_insert(
-            "INSERT INTO products (store_id, name, price, description, available) VALUES (%s, %s, %s, %s, %s)",
-            (store_id, product['name'], product['price'], product.get('description', ''), product['available'])
+        product_id = db.insert(
+            PRODUCT_INSERT,
+            (store_id, product['name'], product['price'], product.get('description', ''), product['available'],
+             parse_price(product['price']))
         )
         
-        if product_id:
-            self.send_json_response({'success': True, 'message': 'Product added successfully'})
+        catalogue_cache.invalidate_store(int(store_id))
+        identity_cache.invalidate_store(store_id)
+        self.index_product(product_id, store_id, product)
+        worker_events.publish('store', store_id=int(store_id), product_ids=[product_id])
+        self.send_json_response({'success': True, 'message': 'Product added successfully', 'product_id': product_id})
+    
+    def index_product(self, product_id, store_id, product):
+        """Add or refresh one product in the search index after a write"""
+        product_index.upsert(dict(product, id=product_id, store_id=int(store_id)))
+    
+    def search_products(self, params):
+        query = self.get_param(params, 'q', '')
+        available = self.get_param(params, 'available')
+        try:
+            min_price = float(params['minPrice'][0]) if params.get('minPrice') else None
+            max_price = float(params['maxPrice'][0]) if params.get('maxPrice') else None
+        except ValueError:
+            self.send_json_response({'success': False, 'message': 'Invalid price range'}, 400)
+            return
+        if not query.strip() and not any(self.get_param(params, key) for key in ('category', 'pincode', 'available')) \
+                and min_price is None and max_price is None:
+            self.send_json_response({'success': False, 'message': 'q or a filter is required'}, 400)
+            return
+        
+        results = product_index.search(
+            query,
+            category=self.get_param(params, 'category'),
+            pincode=self.get_param(params, 'pincode'),
+            available=None if available is None else available.lower() in ('1', 'true', 'yes'),
+            min_price=min_price,
+            max_price=max_price,
+            limit=self.get_int_param(params, 'limit', 20, minimum=1, maximum=SEARCH_MAX_RESULTS)
+        )
+        self.send_json_response({'success': True, 'products': results})
+    
+    def get_bulk_format(self, params):
+        """Pick csv or jsonl from the `format` param, falling back to the Content-Type"""
+        requested = self.get_param(params, 'format')
+        if requested in ('csv', 'jsonl'):
+            return requested
+        content_type = self.headers.get('Content-Type', '')
+        if 'ndjson' in content_type or 'jsonl' in content_type:
+            return 'jsonl'
+        return 'csv'
+    
+    def import_products(self, store_id, params):
+        """Stream a CSV or JSON-lines upload into products in batches, all in one transaction"""
+        content_length = int(self.headers.get('Content-Length', 0))
+        if not db.fetch_one("SELECT id FROM stores WHERE id = %s", (store_id,)):
+            self.rfile.read(content_length)
+            self.send_json_response({'success': False, 'message': 'Store not found'}, 404)
+            return
+        
+        stream = open_body(self.rfile, content_length)
+        products = iter_jsonl_products(stream) if self.get_bulk_format(params) == 'jsonl' else iter_csv_products(stream)
+        
+        imported = 0
+        try:
+            with db.transaction():
+                for batch in batched(products, BATCH_SIZE):
+                    try:
+                        db.execute_many(
+                            PRODUCT_INSERT,
+                            [(store_id,) + product + (parse_price(product[1]),) for product in batch]
+                        )
+                    except Error as e:
+                        raise BulkImportError(f"Failed to save products after row {imported}: {e.msg}")
+                    imported += len(batch)
+        except (BulkImportError, UnicodeDecodeError) as e:
+            # Drain the rest of the upload so the client sees the response
+            while stream.buffer.read(64 * 1024):
+                pass
+            self.send_json_response({'success': False, 'message': f'Import failed, nothing saved: {e}'}, 400)
+            return
+        
+        catalogue_cache.invalidate_store(store_id)
+        identity_cache.invalidate_store(store_id)
+        index_store(store_id)
+        worker_events.publish('store', store_id=store_id)
+        self.send_json_response({'success': True, 'message': 'Products imported successfully', 'imported': imported})
+    
+    def export_products(self, store_id, params):
+        """Stream a store's catalogue as CSV or JSON lines, one batch of rows at a time"""
+        if not db.fetch_one("SELECT id FROM stores WHERE id = %s", (store_id,)):
+            self.send_json_response({'success': False, 'message': 'Store not found'}, 404)
+            return
+        
+        export_format = self.get_bulk_format(params)
+        rows = db.stream_query(
+            "SELECT id, name, price, description, available FROM products WHERE store_id = %s ORDER BY id",
+            (store_id,),
+            batch_size=BATCH_SIZE
+        )
+        
+        self.send_response(200)
+        if export_format == 'jsonl':
+            self.send_header('Content-type', 'application/x-ndjson')
+            chunks = export_jsonl(rows)
         else:
-            self.send_json_response({'success': False, 'message': 'Failed to add product'}, 500)
+            self.send_header('Content-type', 'text/csv; charset=utf-8')
+            chunks = export_csv(rows)
+        self.send_header('Content-Disposition', f'attachment; filename="store-{store_id}-products.{export_format}"')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        
+        try:
+            for chunk in chunks:
+                self.wfile.write(chunk)
+        except Error:
+            # Headers are already sent; closing the connection signals the truncated body
+            self.close_connection = True
+        finally:
+            # Release the streaming cursor even if the client went away mid-export
+            chunks.close()
+            rows.close()
+    
+    def find_product_id(self, store_id, data):
+        """The product addressed by productId, or by its position in the store's catalogue.
+
+        Positions are what older clients send; resolving one reads every product id of
+        the store and can pick the wrong row while the catalogue is being edited.
+        """
+        if data.get('productId') is not None:
+            return int(data['productId'])
+        products = db.fetch_all("SELECT id FROM products WHERE store_id = %s ORDER BY id", (store_id,))
+        product_index = data['productIndex']
+        return products[product_index]['id'] if product_index < len(products) else None
     
     def update_product(self, data):
         store_id = data.get('storeId')
-        product_index = data.get('productIndex')
         product = data.get('product')
         
-        if store_id is None or product_index is None or not product:
-            self.send_json_response({'success': False, 'message': 'Store ID, product index, and product data required'}, 400)
+        if store_id is None or (data.get('productId') is None and data.get('productIndex') is None) or not product:
+            self.send_json_response({'success': False, 'message': 'Store ID, product ID or index, and product data required'}, 400)
             return
         
-        # Get the product ID based on store and index
-        products = db.execute_query("SELECT id FROM products WHERE store_id = %s ORDER BY id", (store_id,))
-        
-        if not products or product_index >= len(products):
+        product_id = self.find_product_id(store_id, data)
+        if product_id is None:
             self.send_json_response({'success': False, 'message': 'Product not found'}, 404)
             return
         
-        product_id = products[product_index]['id']
+        self.patch_product(int(store_id), product_id, dict(product, description=product.get('description', '')))
+    
+    def patch_product(self, store_id, product_id, product):
+        """Change the given fields of one product, addressed by id"""
+        if not self.authorize('shopkeeper', store_id):
+            return
+        update_fields = []
+        values = []
+        for field in PRODUCT_EDITABLE_FIELDS:
+            if field in product:
+                update_fields.append(f"{field} = %s")
+                values.append(product[field])
+        if 'price' in product:
+            update_fields.append("price_value = %s")
+            values.append(parse_price(product['price']))
         
-        result = db.execute_query(
-            "UPDATE products SET name = %s, price = %s, description = %s, available = %s WHERE id = %s",
-            (product['name'], product['price'], product.get('description', ''), product['available'], product_id)
-        )
+        if not update_fields:
+            self.send_json_response({'success': False, 'message': 'No fields to update'}, 400)
+            return
         
-        if result is not None:
-            self.send_json_response({'success': True, 'message': 'Product updated successfully'})
-        else:
-            self.send_json_response({'success': False, 'message': 'Failed to update product'}, 500)
+        with db.transaction():
+            db.execute(
+                f"UPDATE products SET {', '.join(update_fields)} WHERE id = %s AND store_id = %s",
+                values + [product_id, store_id],
+                prepared=False
+            )
+            updated = db.fetch_one(
+                f"SELECT {PRODUCT_INDEX_COLUMNS} FROM products WHERE id = %s AND store_id = %s",
+                (product_id, store_id)
+            )
+        
+        if not updated:
+            self.send_json_response({'success': False, 'message': 'Product not found'}, 404)
+            return
+        
+        catalogue_cache.invalidate_store(store_id)
+        identity_cache.invalidate_store(store_id)
+        product_index.upsert(updated)
+        worker_events.publish('store', store_id=store_id, product_ids=[product_id])
+        self.send_json_response({'success': True, 'message': 'Product updated successfully', 'product': updated})
     
     def delete_product(self, data):
         store_id = data.get('storeId')
-        product_index = data.get('productIndex')
         
-        if store_id is None or product_index is None:
-            self.send_json_response({'success': False, 'message': 'Store ID and product index required'}, 400)
+        if store_id is None or (data.get('productId') is None and data.get('productIndex') is None):
+            self.send_json_response({'success': False, 'message': 'Store ID and product ID or index required'}, 400)
             return
         
-        # Get the product ID based on store and index
-        products = db.execute_query("SELECT id FROM products WHERE store_id = %s ORDER BY id", (store_id,))
+        product_id = self.find_product_id(store_id, data)
+        if product_id is None:
+            self.send_json_response({'success': False, 'message': 'Product not found'}, 404)
+            return
         
-        if not products or product_index >= len(products):
+        self.remove_product(int(store_id), product_id)
+    
+    def remove_product(self, store_id, product_id):
+        """Delete one product, addressed by id"""
+        if not self.authorize('shopkeeper', store_id):
+            return
+        if not db.execute("DELETE FROM products WHERE id = %s AND store_id = %s", (product_id, store_id)):
             self.send_json_response({'success': False, 'message': 'Product not found'}, 404)
             return
         
-        product_id = products[product_index]['id']
+        catalogue_cache.invalidate_store(store_id)
+        identity_cache.invalidate_store(store_id)
+        product_index.remove(product_id)
+        worker_events.publish('store', store_id=store_id, product_ids=[product_id])
+        self.send_json_response({'success': True, 'message': 'Product deleted successfully'})
+    
+    def batch_update_products(self, store_id, data):
+        """Set availability, change prices and delete many of a store's products in one transaction.
+
+        Body: {"updates": [{"id": 1, "available": false}, {"id": 2, "price": "₹90"}], "delete": [3, 4]}.
+        Nothing is changed unless every product belongs to the store.
+        """
+        if not self.authorize('shopkeeper', store_id):
+            return
+        updates = data.get('updates') or []
+        deletes = data.get('delete') or []
         
-        result = db.execute_query("DELETE FROM products WHERE id = %s", (product_id,))
+        if not isinstance(updates, list) or not isinstance(deletes, list) or not (updates or deletes):
+            self.send_json_response({'success': False, 'message': 'Product updates or deletions required'}, 400)
+            return
+        if len(updates) + len(deletes) > PRODUCT_BATCH_MAX:
+            self.send_json_response(
+                {'success': False, 'message': f'At most {PRODUCT_BATCH_MAX} products per batch'}, 400)
+            return
+        if not all(isinstance(update, dict) and isinstance(update.get('id'), int)
+                   and ('available' in update or 'price' in update) for update in updates):
+            self.send_json_response(
+                {'success': False, 'message': 'Each update needs a product id and available or price'}, 400)
+            return
+        if not all(isinstance(product_id, int) for product_id in deletes):
+            self.send_json_response({'success': False, 'message': 'Deletions must be product ids'}, 400)
+            return
         
-        if result is not None:
-            self.send_json_response({'success': True, 'message': 'Product deleted successfully'})
-        else:
-            self.send_json_response({'success': False, 'message': 'Failed to delete product'}, 500)
+        updated_ids = {update['id'] for update in updates}
+        deleted_ids = set(deletes)
+        if updated_ids & deleted_ids:
+            self.send_json_response({'success': False, 'message': 'A product cannot be updated and deleted'}, 400)
+            return
+        
+        availability = {}
+        for update in updates:
+            if 'available' in update:
+                availability.setdefault(bool(update['available']), []).append(update['id'])
+        prices = [(update['price'], parse_price(update['price']), update['id'])
+                  for update in updates if 'price' in update]
+        
+        ids = sorted(updated_ids | deleted_ids)
+        with db.transaction():
+            # Lock the rows and check they are all the store's before changing any of them
+            found = {row['id'] for row in db.fetch_all(
+                f"SELECT id FROM products WHERE store_id = %s AND id IN ({', '.join(['%s'] * len(ids))}) FOR UPDATE",
+                [store_id] + ids,
+                prepared=False
+            )}
+            missing = [product_id for product_id in ids if product_id not in found]
+            if not missing:
+                for available, product_ids in availability.items():
+                    db.execute(
+                        f"UPDATE products SET available = %s WHERE id IN ({', '.join(['%s'] * len(product_ids))})",
+                        [available] + product_ids,
+                        prepared=False
+                    )
+                if prices:
+                    db.execute_many("UPDATE products SET price = %s, price_value = %s WHERE id = %s", prices)
+                if deleted_ids:
+                    db.execute(
+                        f"DELETE FROM products WHERE id IN ({', '.join(['%s'] * len(deleted_ids))})",
+                        list(deleted_ids),
+                        prepared=False
+                    )
+                updated = db.fetch_all(
+                    f"SELECT {PRODUCT_INDEX_COLUMNS} FROM products WHERE id IN ({', '.join(['%s'] * len(updated_ids))})",
+                    list(updated_ids),
+                    prepared=False
+                ) if updated_ids else []
+        
+        if missing:
+            self.send_json_response({'success': False, 'message': 'Products not found in this store',
+                                     'missing': missing}, 404)
+            return
+        
+        catalogue_cache.invalidate_store(store_id)
+        identity_cache.invalidate_store(store_id)
+        for product in updated:
+            product_index.upsert(product)
+        for product_id in deleted_ids:
+            product_index.remove(product_id)
+        worker_events.publish('store', store_id=store_id, product_ids=sorted(updated_ids | deleted_ids))
+        self.send_json_response({'success': True, 'message': 'Products updated successfully',
+                                 'updated': len(updated_ids), 'deleted': len(deleted_ids)})
     
     def update_booking_status(self, data):
         booking_id = data.get('bookingId')
@@ -412,35 +1215,193 @@ class LocalKiranaHandler(SimpleHTTPRequestHandler):
             self.send_json_response({'success': False, 'message': 'Booking ID and status required'}, 400)
             return
         
-        result = db.execute_query(
-            "UPDATE bookings SET status = %s WHERE id = %s",
-            (status, booking_id)
-        )
-        
-        if result is not None:
-            self.send_json_response({'success': True, 'message': 'Booking status updated successfully'})
-        else:
-            self.send_json_response({'success': False, 'message': 'Failed to update booking status'}, 500)
+        with db.transaction():
+            booking = db.fetch_one("SELECT status FROM bookings WHERE id = %s FOR UPDATE", (booking_id,))
+            db.execute(
+                "UPDATE bookings SET status = %s WHERE id = %s",
+                (status, booking_id)
+            )
+        if booking:
+            record_stats('move_booking', booking['status'], status)
+        self.send_json_response({'success': True, 'message': 'Booking status updated successfully'})
+    
+    def get_bookings(self, params):
+        self.get_feed('bookings', params, {
+            'customerId': 'customer_id',
+            'storeId': 'store_id',
+            'status': 'status'
+        })
+    
+    def get_requests(self, params):
+        self.get_feed('requests', params, {
+            'customerId': 'customer_id',
+            'targetStore': 'target_store',
+            'status': 'status'
+        })
+    
+    def get_store_requests(self, store_id, params):
+        """A store's inbox: the requests routed to it, newest first"""
+        self.get_feed('requests', params, {'status': 'status'}, history=False,
+                      source=("request_matches m JOIN requests ON requests.id = m.request_id",
+                              "m.store_id = %s", [store_id]),
+                      key=('m.created_at', 'm.request_id'))
     
-    def get_bookings(self):
-        bookings = db.execute_query("SELECT * FROM bookings ORDER BY created_at DESC")
-        self.send_json_response({'success': True, 'bookings': bookings or []})
+    def get_chat_history(self, params):
+        """One chat's messages newest first, archived ones included"""
+        if not self.get_param(params, 'chatId'):
+            self.send_json_response({'success': False, 'message': 'chatId required'}, 400)
+            return
+        self.get_feed('messages', params, {'chatId': 'chat_id'}, history=True)
     
-    def get_requests(self):
-        requests = db.execute_query("SELECT * FROM requests ORDER BY created_at DESC")
-        self.send_json_response({'success': True, 'requests': requests or []})
+    def get_feed(self, table, params, filters, history=None, source=None, key=('created_at', 'id')):
+        """List a table newest first, filtered by the given params and paginated by (created_at, id) cursor.
+        
+        With history=1 archived rows are merged in behind the same cursor. A source of
+        (FROM clause, condition, values) selects the table's rows through a join instead,
+        paginated by the join's key columns, which must equal the rows' (created_at, id).
+        """
+        limit = self.get_int_param(params, 'limit', FEED_PAGE_SIZE, minimum=1, maximum=FEED_MAX_PAGE_SIZE)
+        if history is None:
+            history = self.get_param(params, 'history', '').lower() in ('1', 'true', 'yes')
+        
+        conditions = []
+        values = []
+        if source is not None:
+            from_clause, condition, condition_values = source
+            conditions.append(condition)
+            values.extend(condition_values)
+        else:
+            from_clause = table
+        created_column, id_column = key
+        archive_filters = {}
+        for param, column in filters.items():
+            value = self.get_param(params, param)
+            if value:
+                conditions.append(f"{table}.{column} = %s")
+                values.append(value)
+                archive_filters[column] = value
+        
+        cursor = self.get_param(params, 'cursor')
+        before = None
+        if cursor:
+            try:
+                created_at, row_id = decode_cursor(cursor)
+            except ValueError:
+                self.send_json_response({'success': False, 'message': 'Invalid cursor'}, 400)
+                return
+            conditions.append(f"({created_column} < %s OR ({created_column} = %s AND {id_column} < %s))")
+            values.extend([created_at, created_at, row_id])
+            before = (created_at, row_id)
+        
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        values.append(limit + 1)
+        batches = db.stream_query(
+            f"SELECT {table}.* FROM {from_clause} {where} "
+            f"ORDER BY {created_column} DESC, {id_column} DESC LIMIT %s",
+            values
+        )
+        page = {'nextCursor': None}
+        rows = itertools.chain.from_iterable(batches)
+        if history:
+            # Rows that stay hot (e.g. pending bookings) can be older than archived ones,
+            # so interleave the two newest-first streams rather than appending one
+            rows = heapq.merge(rows, archive.iter_rows(table, archive_filters, before=before),
+                               key=lambda row: (row['created_at'], row['id']), reverse=True)
+        
+        def page_rows():
+            sent = 0
+            last = None
+            for row in rows:
+                # The extra row only signals another page; reading stops there, so the
+                # archive's older segments stay unopened
+                if sent == limit:
+                    page['nextCursor'] = encode_cursor(last['created_at'], last['id'])
+                    break
+                sent += 1
+                last = row
+                yield row
+        
+        try:
+            self.send_json_stream(encode_json_stream({'success': True}, table, page_rows(),
+                                                     lambda: {'nextCursor': page['nextCursor']}))
+        finally:
+            batches.close()
     
     def get_chats(self):
-        chats = db.execute_query("SELECT * FROM chats ORDER BY last_message_time DESC")
-        if chats:
-            for chat in chats:
-                messages = db.execute_query(
-                    "SELECT * FROM messages WHERE chat_id = %s ORDER BY created_at ASC",
-                    (chat['chat_id'],)
-                )
-                chat['messages'] = messages or []
+        # One ordered join, regrouped into chats as it streams so only one chat is in memory at a time
+        batches = db.stream_query(
+            """SELECT c.*, m.id AS message_id, m.sender_id, m.sender_type, m.message,
+                      m.created_at AS message_created_at
+               FROM chats c LEFT JOIN messages m ON m.chat_id = c.chat_id
+               ORDER BY c.last_message_time DESC, c.id, m.id"""
+        )
+        
+        def chats():
+            chat = None
+            for row in itertools.chain.from_iterable(batches):
+                if chat is None or chat['id'] != row['id']:
+                    if chat is not None:
+                        yield chat
+                    chat = {key: value for key, value in row.items() if key not in CHAT_MESSAGE_COLUMNS}
+                    chat['messages'] = []
+                if row['message_id'] is not None:
+                    chat['messages'].append({
+                        'id': row['message_id'],
+                        'chat_id': row['chat_id'],
+                        'sender_id': row['sender_id'],
+                        'sender_type': row['sender_type'],
+                        'message': row['message'],
+                        'created_at': row['message_created_at']
+                    })
+            if chat is not None:
+                yield chat
         
-        self.send_json_response({'success': True, 'chats': chats or []})
+        try:
+            self.send_json_stream(encode_json_stream({'success': True}, 'chats', chats()))
+        finally:
+            batches.close()
+    
+    def sync_chats(self, params):
+        """Return a participant's chats and their messages newer than the `after` message id.
+
+        With `wait` set and nothing new, the request is held open (long-poll) until
+        save_chat publishes a message for this participant or the wait runs out.
+        """
+        participant_type = self.get_param(params, 'participantType')
+        participant_id = self.get_int_param(params, 'participantId', 0)
+        after = self.get_int_param(params, 'after', 0, minimum=0)
+        wait = self.get_int_param(params, 'wait', 0, minimum=0, maximum=CHAT_SYNC_MAX_WAIT)
+        
+        if participant_type not in ('customer', 'shopkeeper') or not participant_id:
+            self.send_json_response({'success': False, 'message': 'Participant type and ID required'}, 400)
+            return
+        if not self.authorize(participant_type, participant_id):
+            return
+        
+        participant_filter = """((c.participant1_type = %s AND c.participant1_id = %s)
+                                 OR (c.participant2_type = %s AND c.participant2_id = %s))"""
+        participant_values = (participant_type, participant_id, participant_type, participant_id)
+        
+        messages = self.fetch_new_messages(participant_filter, participant_values, after)
+        if not messages and wait:
+            if chat_notifier.wait((participant_type, participant_id), after, wait):
+                messages = self.fetch_new_messages(participant_filter, participant_values, after)
+        
+        chats = db.fetch_all(
+            f"SELECT c.* FROM chats c WHERE {participant_filter} ORDER BY c.last_message_time DESC",
+            participant_values
+        )
+        cursor = messages[-1]['id'] if messages else after
+        self.send_json_response({'success': True, 'chats': chats, 'messages': messages, 'cursor': cursor})
+    
+    def fetch_new_messages(self, participant_filter, participant_values, after):
+        """Fetch up to CHAT_SYNC_MAX_MESSAGES messages after the given id across a participant's chats"""
+        return db.fetch_all(
+            f"""SELECT m.* FROM messages m JOIN chats c ON c.chat_id = m.chat_id
+               WHERE m.id > %s AND {participant_filter}
+               ORDER BY m.id LIMIT %s""",
+            (after,) + participant_values + (CHAT_SYNC_MAX_MESSAGES,)
+        )
     
     def save_chat(self, data):
         chat_id = data.get('id')
@@ -452,37 +1413,19 @@ class LocalKiranaHandler(SimpleHTTPRequestHandler):
             self.send_json_response({'success': False, 'message': 'Missing required chat data'}, 400)
             return
         
-        # Check if chat exists, if not create it
-        existing_chat = db.execute_query("SELECT id FROM chats WHERE chat_id = %s", (chat_id,))
+        # Parse chat_id to get participants
+        parts = chat_id.split('_')
+        participants = []
+        if len(parts) == 4:
+            participants = [(parts[0], int(parts[1])), (parts[2], int(parts[3]))]
         
-        if not existing_chat:
-            # Parse chat_id to get participants
-            parts = chat_id.split('_')
-            if len(parts) == 4:
-                participant1_type, participant1_id, participant2_type, participant2_id = parts
-                
-                db.execute_insert(
-                    """INSERT INTO chats (chat_id, participant1_id, participant1_type, participant2_id, participant2_type) 
-                       VALUES (%s, %s, %s, %s, %s)""",
-                    (chat_id, int(participant1_id), participant1_type, int(participant2_id), participant2_type)
-                )
-        
-        # Insert message
-        message_id = db.execute_insert(
-            "INSERT INTO messages (chat_id, sender_id, sender_type, message) VALUES (%s, %s, %s, %s)",
-            (chat_id, sender_id, sender_type, message)
-        )
-        
-        # Update chat last message
-        db.execute_query(
-            "UPDATE chats SET last_message = %s, last_message_time = NOW() WHERE chat_id = %s",
-            (message, chat_id)
-        )
-        
-        if message_id:
-            self.send_json_response({'success': True, 'message': 'Chat saved successfully'})
+        pending = PendingMessage(chat_id, participants, sender_id, sender_type, message)
+        # A batch holds its transaction open, so the writer thread couldn't commit behind it
+        if chat_writer.running and not self.batched:
+            chat_writer.submit(pending)
         else:
-            self.send_json_response({'success': False, 'message': 'Failed to save chat'}, 500)
+            save_chat_messages([pending])
+        self.send_json_response({'success': True, 'message': 'Chat saved successfully'})
     
     def get_default_products(self, category):
         default_products = {
@@ -521,37 +1464,472 @@ class LocalKiranaHandler(SimpleHTTPRequestHandler):
         return default_products.get(category, default_products['general'])
     
     def send_json_response(self, data, status_code=200):
+        response = encode_json(data)
+        self.send_json_body(response.encode('utf-8'), status_code)
+    
+    def send_json_body(self, body, status_code=200, etag=None):
+        """Send an already serialized JSON body, answering 304 if the client has this ETag"""
+        if etag and etag_matches(self.headers.get('If-None-Match'), etag):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.end_headers()
+            return
+        
         self.send_response(status_code)
         self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+        if etag:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        
+        self.wfile.write(body)
+    
+    def send_json_stream(self, chunks):
+        """Send a JSON body produced incrementally.
+
+        The body is gzip-compressed when the client accepts it and sent with chunked
+        transfer encoding on HTTP/1.1 connections (otherwise delimited by closing the
+        connection), so it never has to be assembled in memory.
+        """
+        chunks = iter(chunks)
+        try:
+            # Produce the first chunk before committing to a 200, so query errors still get a 500
+            first = next(chunks, b'')
+        except Error as e:
+            print(f"Error streaming response: {e}")
+            self.send_json_response({'success': False, 'message': 'Failed to load data'}, 500)
+            return
+        
+        body = itertools.chain([first], chunks)
+        compress = accepts_gzip(self.headers.get('Accept-Encoding'))
+        if compress:
+            body = gzip_chunks(body)
+        chunked = self.request_version == 'HTTP/1.1' and self.protocol_version == 'HTTP/1.1'
+        
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+        if compress:
+            self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Vary', 'Accept-Encoding')
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            self.send_header('Connection', 'close')
+            self.close_connection = True
         self.end_headers()
         
-        response = json.dumps(data, ensure_ascii=False, default=str)
-        self.wfile.write(response.encode('utf-8'))
+        try:
+            for piece in body:
+                if not piece:
+                    continue
+                if chunked:
+                    self.wfile.write(b'%x\r\n%s\r\n' % (len(piece), piece))
+                else:
+                    self.wfile.write(piece)
+            if chunked:
+                self.wfile.write(b'0\r\n\r\n')
+        except Error as e:
+            # Headers are already sent; dropping the connection marks the body as truncated
+            print(f"Error streaming response: {e}")
+            self.close_connection = True
+    
+    def send_cached_response(self, cache_key):
+        """Serve a catalogue response from the cache; returns False on a miss"""
+        entry = catalogue_cache.get(cache_key)
+        if entry is None:
+            return False
+        self.send_json_body(entry.body, etag=entry.etag)
+        return True
+    
+    def send_cacheable_response(self, cache_key, data, store_ids, generation, is_list=False):
+        """Serialize a catalogue response, cache it and send it with its ETag"""
+        body = encode_json(data).encode('utf-8')
+        entry = catalogue_cache.put(cache_key, body, store_ids, generation, is_list=is_list)
+        self.send_json_body(entry.body, etag=entry.etag)
+    
+    def send_metrics(self):
+        """Expose request metrics in Prometheus text format to local scrapers"""
+        allow_remote = os.getenv('METRICS_ALLOW_REMOTE', 'false').lower() in ('1', 'true', 'yes')
+        if not allow_remote and self.client_address[0] not in LOCAL_ADDRESSES:
+            self.send_error(403)
+            return
+        # Add in the other workers' counts so the scrape covers the server, not just this process
+        others = worker_events.gather('metrics', METRICS_GATHER_TIMEOUT)
+        body = request_metrics.render(db.replica_status(), others, supervisor.workers or 1).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def send_static(self, head_only=False):
+        """Serve a front-end file from the in-memory asset cache"""
+        asset = static_assets.get(urllib.parse.urlparse(self.path).path)
+        if asset is None:
+            self.send_error(404)
+            return
+        
+        body, etag = asset.body, asset.etag
+        if asset.gzip_body is not None and accepts_gzip(self.headers.get('Accept-Encoding')):
+            body, etag = asset.gzip_body, asset.gzip_etag
+        
+        if etag_matches(self.headers.get('If-None-Match'), etag):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', static_assets.cache_control(asset))
+            self.end_headers()
+            return
+        
+        self.send_response(200)
+        self.send_header('Content-type', asset.content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', static_assets.cache_control(asset))
+        if asset.gzip_body is not None:
+            self.send_header('Vary', 'Accept-Encoding')
+        if body is asset.gzip_body:
+            self.send_header('Content-Encoding', 'gzip')
+        self.end_headers()
+        if not head_only:
+            self.wfile.write(body)
     
     def do_OPTIONS(self):
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+        self.send_header('Content-Length', '0')
         self.end_headers()
 
+def build_indexes():
+    """Load every store and product into the in-memory search and proximity indexes"""
+    for stores in db.stream_query("SELECT id, shop_name, category, pincode, status FROM stores"):
+        for store in stores:
+            product_index.set_store(store)
+            store_proximity.set_store(store)
+    for products in db.stream_query(f"SELECT {PRODUCT_INDEX_COLUMNS} FROM products"):
+        for product in products:
+            product_index.upsert(product)
+    print(f"Search index built: {len(product_index)} products")
+    print(f"Proximity index built: {len(store_proximity)} stores placed")
+
+def index_store(store_id):
+    """Reload a store and its whole catalogue into the search and proximity indexes"""
+    store = db.fetch_one(
+        "SELECT id, shop_name, category, pincode, status FROM stores WHERE id = %s",
+        (store_id,)
+    )
+    if not store:
+        return
+    products = db.fetch_all(
+        f"SELECT {PRODUCT_INDEX_COLUMNS} FROM products WHERE store_id = %s",
+        (store_id,)
+    )
+    store_proximity.set_store(store)
+    product_index.set_store(store)
+    product_index.remove_store_products(store_id)
+    for product in products:
+        product_index.upsert(product)
+
+def index_products(product_ids):
+    """Refresh some products in the search index, dropping those that no longer exist"""
+    products = db.fetch_all(
+        f"SELECT {PRODUCT_INDEX_COLUMNS} FROM products WHERE id IN ({', '.join(['%s'] * len(product_ids))})",
+        list(product_ids),
+        prepared=False
+    )
+    for product in products:
+        product_index.upsert(product)
+    for product_id in set(product_ids) - {product['id'] for product in products}:
+        product_index.remove(product_id)
+
+# DashboardStats methods other workers may be asked to apply
+STATS_EVENTS = ('add_store', 'move_store', 'add_customer', 'move_customer', 'add_booking', 'move_booking')
+
+def record_stats(method, *args):
+    """Apply a change to the dashboard counters in this and every other worker"""
+    getattr(dashboard_stats, method)(*args)
+    worker_events.publish('stats', method=method, args=args)
+
+def apply_worker_event(event):
+    """Bring this worker's caches and indexes up to date with a write another worker served,
+    or answer another worker's request for this one's metrics"""
+    kind = event['kind']
+    if kind == 'store':
+        store_id = event['store_id']
+        catalogue_cache.invalidate_store(store_id)
+        identity_cache.invalidate_store(store_id)
+        if event.get('product_ids'):
+            index_products(event['product_ids'])
+        else:
+            catalogue_cache.invalidate_lists()
+            index_store(store_id)
+    elif kind == 'customer':
+        identity_cache.invalidate_customer(event['customer_id'])
+    elif kind == 'chat':
+        for participants, message_id in event['messages']:
+            chat_notifier.publish([tuple(participant) for participant in participants], message_id)
+    elif kind == 'stats' and event['method'] in STATS_EVENTS:
+        getattr(dashboard_stats, event['method'])(*event['args'])
+    elif kind == 'logout':
+        sessions.revoke(event['token'])
+    elif kind == 'metrics':
+        return request_metrics.snapshot(db.replica_status())
+
+def load_dashboard_counts(first_day):
+    """Count stores, customers and bookings, archived bookings included, for the dashboard stats"""
+    with db.checkout():
+        counts = {
+            'stores': db.fetch_all("SELECT category, status, COUNT(*) AS count FROM stores GROUP BY category, status"),
+            'customers': db.fetch_all("SELECT status, COUNT(*) AS count FROM customers GROUP BY status"),
+            'bookings': db.fetch_all("SELECT status, COUNT(*) AS count FROM bookings GROUP BY status"),
+            'bookings_by_day': db.fetch_all(
+                """SELECT DATE(created_at) AS day, COUNT(*) AS count FROM bookings
+                   WHERE created_at >= %s GROUP BY DATE(created_at)""",
+                (first_day,)
+            ),
+        }
+    counts['bookings'] += [{'status': status, 'count': count}
+                           for status, count in archive.count_by('bookings', 'status').items()]
+    counts['bookings_by_day'] += [{'day': day, 'count': count}
+                                  for day, count in archive.count_by_day('bookings', first_day).items()]
+    return counts
+
+def archive_old_rows(stop):
+    """Move rows matching ARCHIVE_RULES into archive segments, a batch per transaction.
+    
+    Each batch is written to pending segments before its rows are deleted, and the
+    segments are only committed once the delete has; archive.recover() settles a crash
+    in between. Returns the number of rows moved per table.
+    """
+    cutoff = datetime.now() - timedelta(days=archive.after_days)
+    moved = {}
+    for table, rule in ARCHIVE_RULES.items():
+        moved[table] = 0
+        while not stop.is_set():
+            segments = []
+            try:
+                with db.transaction():
+                    rows = db.fetch_all(
+                        f"SELECT * FROM {table} WHERE {rule} ORDER BY created_at, id LIMIT %s FOR UPDATE",
+                        (cutoff, archive.batch_size)
+                    )
+                    if not rows:
+                        break
+                    segments = archive.write_pending(table, rows)
+                    ids = [row['id'] for row in rows]
+                    db.execute(f"DELETE FROM {table} WHERE id IN ({', '.join(['%s'] * len(ids))})", ids,
+                               prepared=False)
+            except BaseException:
+                for segment in segments:
+                    archive.discard(segment)
+                raise
+            for segment in segments:
+                archive.commit(segment)
+            moved[table] += len(rows)
+            if len(rows) < archive.batch_size:
+                break
+    return moved
+
+def archive_rows_present(table, ids):
+    """Whether any of the given rows are still in their table, for archive.recover()"""
+    placeholders = ', '.join(['%s'] * len(ids))
+    return db.fetch_one(f"SELECT 1 FROM {table} WHERE id IN ({placeholders}) LIMIT 1", ids,
+                        prepared=False) is not None
+
+def save_chat_messages(messages):
+    """Save chat messages in one transaction and wake their participants' pollers.
+
+    Each chat gets one upsert carrying its latest message, then all messages go in as
+    one batched insert: two statements however many messages the batch holds.
+    """
+    latest = {message.chat_id: message for message in messages}
+    upserts = [(chat_id, message.participants[0][1], message.participants[0][0], message.participants[1][1],
+                message.participants[1][0], message.message)
+               for chat_id, message in latest.items() if message.participants]
+    touches = [(message.message, chat_id) for chat_id, message in latest.items() if not message.participants]
+    rows = [(message.chat_id, message.sender_id, message.sender_type, message.message) for message in messages]
+    
+    with db.transaction():
+        if upserts:
+            db.execute_many(CHAT_UPSERT, upserts)
+        if touches:
+            db.execute_many(CHAT_TOUCH, touches)
+        message_ids = db.insert_many(MESSAGE_INSERT, rows)
+    
+    for message, message_id in zip(messages, message_ids):
+        message.message_id = message_id
+        chat_notifier.publish(message.participants, message_id)
+    worker_events.publish('chat', messages=[[message.participants, message.message_id] for message in messages])
+
+class BatchSubrequest(LocalKiranaHandler):
+    """One /api/batch entry, run through the API handlers with its response kept in memory"""
+    
+    batched = True
+    
+    def __init__(self, parent, method, path, body):
+        # Not a socket handler: set just what the API handlers read
+        self.server = parent.server
+        self.client_address = parent.client_address
+        self.command = method
+        self.path = path
+        self.route = route_label(urllib.parse.urlparse(path).path)
+        # Streamed responses are then written plainly rather than chunked
+        self.request_version = 'HTTP/1.0'
+        # A string body is passed on as is, e.g. CSV for a products import
+        if isinstance(body, str):
+            raw = body.encode('utf-8')
+        else:
+            raw = json.dumps(body).encode('utf-8') if body is not None else b''
+        self.headers = http.client.HTTPMessage()
+        if parent.headers.get('Authorization'):
+            self.headers['Authorization'] = parent.headers['Authorization']
+        self.headers['Content-Type'] = 'text/plain' if isinstance(body, str) else 'application/json'
+        self.headers['Content-Length'] = str(len(raw))
+        self.rfile = io.BytesIO(raw)
+        self.wfile = io.BytesIO()
+        self.response_status = None
+        self.response_headers = {}
+    
+    def handle_entry(self):
+        handlers = {'GET': self.handle_api_get, 'POST': self.handle_api_post, 'DELETE': self.handle_api_delete}
+        handlers[self.command]()
+    
+    def send_response(self, code, message=None):
+        self.response_status = code
+        self.response_headers = {}
+        self.wfile = io.BytesIO()
+    
+    def send_header(self, keyword, value):
+        self.response_headers[keyword.lower()] = value
+    
+    def end_headers(self):
+        pass
+    
+    def send_error(self, code, message=None, explain=None):
+        self.send_json_response({'success': False, 'message': message or http.HTTPStatus(code).phrase}, code)
+    
+    def result(self):
+        body = self.wfile.getvalue()
+        if self.response_headers.get('content-type', '').startswith('application/json'):
+            body = json.loads(body) if body else None
+        else:
+            body = body.decode('utf-8', errors='replace')
+        return {'status': self.response_status or 500, 'body': body}
+
+class WorkerHTTPServer(ThreadingHTTPServer):
+    """Threaded server for one of the supervisor's worker processes, which share the port"""
+    
+    # Request threads are joined on close, so a stopping worker finishes what it accepted
+    daemon_threads = False
+    # Set once the worker is told to stop, so responses close their connections
+    stopping = False
+    
+    def server_bind(self):
+        # Every worker binds the same port and the kernel spreads new connections among them
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+    
+    def drain(self):
+        """Accept the connections already queued for this worker, so closing doesn't reset them"""
+        self.timeout = 0
+        while select.select([self.socket], [], [], 0)[0]:
+            self.handle_request()
+
+def stop_services():
+    chat_writer.shutdown()
+    archive.shutdown()
+    dashboard_stats.shutdown()
+    db.disconnect()
+    password_hasher.shutdown()
+
+def print_banner(port):
+    print(f"LocalKirana MySQL server running on http://localhost:{port}")
+    print("Press Ctrl+C to stop the server")
+    print(f"\nDatabase: {db.name} (pool size {db.pool_size}{' per worker' if supervisor.enabled else ''})")
+    if db.replicas:
+        print(f"Read replicas: {len(db.replicas)} (clients read from the primary for "
+              f"{db.primary_sticky_seconds:g}s after a write)")
+
+def run_supervisor(port):
+    """Check the database and settle any crashed archiving run, then run the worker processes"""
+    if not db.connect():
+        print("Failed to connect to database. Please check your configuration.")
+        return
+    archive.recover(archive_rows_present)
+    print_banner(port)
+    db.disconnect()
+    print(f"Mode: {supervisor.workers} worker processes (SIGHUP reloads them)")
+    supervisor.run()
+
+def run_worker(port):
+    """Serve as one of the supervisor's workers until it sends SIGTERM"""
+    httpd = WorkerHTTPServer(('', port), LocalKiranaHandler)
+    
+    def stop(*args):
+        httpd.stopping = True
+        # shutdown() waits for serve_forever() to return, so it can't run on the serving thread
+        threading.Thread(target=httpd.shutdown, daemon=True).start()
+    
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, stop)
+    supervisor.watch_parent(stop)
+    worker_events.start(apply_worker_event)
+    print(f"Worker {supervisor.worker_id} (pid {os.getpid()}) serving on port {port}")
+    httpd.serve_forever()
+    httpd.drain()
+    httpd.server_close()
+    worker_events.shutdown()
+    stop_services()
+    print(f"Worker {supervisor.worker_id} (pid {os.getpid()}) stopped.")
+
 def run_server():
+    port = int(os.getenv('PORT', 8000))
+    if supervisor.enabled:
+        run_supervisor(port)
+        return
+    
     # Connect to database
     if not db.connect():
         print("Failed to connect to database. Please check your configuration.")
         return
     
-    # Start server
-    port = int(os.getenv('PORT', 8000))
+    if not supervisor.is_worker:
+        # Settle segments from an archiving run that crashed, before stats count them
+        archive.recover(archive_rows_present)
+    build_indexes()
+    dashboard_stats.start(load_dashboard_counts)
+    print(f"Static assets loaded: {static_assets.load()} files")
+    
+    # Start bcrypt workers before any request threads exist
+    password_hasher.start()
+    if chat_writer.start(save_chat_messages):
+        print(f"Chat write-behind enabled (batches of up to {chat_writer.batch_size})")
+    # One archiver per server, not per worker
+    if supervisor.runs_singletons and archive.start(archive_old_rows):
+        print(f"Archiving rows older than {archive.after_days} days to {archive.root}/")
+    
+    if supervisor.is_worker:
+        run_worker(port)
+        return
+    
+    # Start server; threaded by default so slow requests don't block other clients
     server_address = ('', port)
-    httpd = HTTPServer(server_address, LocalKiranaHandler)
+    threaded = os.getenv('SERVER_THREADED', 'true').lower() in ('1', 'true', 'yes')
+    server_class = ThreadingHTTPServer if threaded else HTTPServer
+    httpd = server_class(server_address, LocalKiranaHandler)
     
-    print(f"LocalKirana MySQL server running on http://localhost:{port}")
-    print("Press Ctrl+C to stop the server")
-    print("\nDatabase: MySQL")
+    print_banner(port)
+    print(f"Mode: {'threaded' if threaded else 'single-threaded'}")
     print("Environment: Production Ready")
     print("\nSample Login Credentials:")
     print("Shopkeeper - Phone: +91 9876543210, Password: password123")
@@ -561,8 +1939,8 @@ def run_server():
         httpd.serve_forever()
     except KeyboardInterrupt:
         print("\nServer stopped.")
-        db.disconnect()
+        stop_services()
         httpd.server_close()
 
 if __name__ == '__main__':
-    run_server()
\ No newline at end of file
+    run_server()
@@ -0,0 +1,285 @@
+import gzip
+import heapq
+import json
+import os
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+
+# Columns archived rows can be filtered on, per table; each segment records their values
+ARCHIVE_KEYS = {
+    'bookings': ('customer_id', 'store_id', 'status'),
+    'requests': ('customer_id', 'target_store', 'status'),
+    'messages': ('chat_id',),
+}
+TIMESTAMP_COLUMNS = ('created_at', 'updated_at')
+PENDING_SUFFIX = '.pending'
+
+class Segment:
+    """One gzip-compressed JSON-lines file of rows archived from a table on one day"""
+
+    def __init__(self, table, day, path, rows=0, min_id=None, max_id=None, keys=None,
+                 first_created=None, last_created=None):
+        self.table = table
+        self.day = day
+        self.path = path
+        self.rows = rows
+        self.min_id = min_id
+        self.max_id = max_id
+        # column -> {value: row count}, values as strings
+        self.keys = keys or {}
+        # Oldest and newest created_at, ISO strings; segments indexed before these were
+        # recorded are bounded by their day
+        self.first_created = first_created
+        self.last_created = last_created
+
+    @classmethod
+    def describe(cls, table, day, path, rows):
+        """A segment holding the given rows, with its id range and key column counts"""
+        ids = [row['id'] for row in rows]
+        keys = {column: dict(Counter(str(row[column]) for row in rows)) for column in ARCHIVE_KEYS[table]}
+        created = [row['created_at'] for row in rows]
+        return cls(table, day, path, len(rows), min(ids, default=None), max(ids, default=None), keys,
+                   min(created).isoformat() if created else None, max(created).isoformat() if created else None)
+
+    def to_json(self):
+        return {'day': self.day, 'path': self.path, 'rows': self.rows, 'min_id': self.min_id,
+                'max_id': self.max_id, 'keys': self.keys, 'first_created': self.first_created,
+                'last_created': self.last_created}
+
+    def newest_key(self):
+        """An upper bound on the (created_at, id) of the segment's rows"""
+        if self.last_created is not None:
+            return datetime.fromisoformat(self.last_created), self.max_id
+        return datetime.fromisoformat(self.day) + timedelta(days=1), self.max_id
+
+    def oldest_key(self):
+        """A lower bound on the (created_at, id) of the segment's rows"""
+        if self.first_created is not None:
+            return datetime.fromisoformat(self.first_created), self.min_id
+        return datetime.fromisoformat(self.day), self.min_id
+
+    def may_match(self, filters):
+        return all(value in self.keys.get(column, {}) for column, value in filters.items())
+
+def _row_key(row):
+    return row['created_at'], row['id']
+
+class _Newest:
+    """Heap entry ordering rows newest first"""
+
+    __slots__ = ('key', 'row')
+
+    def __init__(self, row):
+        self.key = _row_key(row)
+        self.row = row
+
+    def __lt__(self, other):
+        return self.key > other.key
+
+def _load_row(line):
+    row = json.loads(line)
+    for column in TIMESTAMP_COLUMNS:
+        if row.get(column) is not None:
+            row[column] = datetime.fromisoformat(row[column])
+    return row
+
+class SegmentArchive:
+    """Append-only store for rows moved out of the hot bookings, requests and messages tables.
+
+    Rows live in <ARCHIVE_DIR>/<table>/<YYYY-MM-DD>/<first id>-<last id>.jsonl.gz, by the
+    day they were created. <table>/index.jsonl gets one line per segment with its row
+    count and the values of the table's key columns, so reads skip segments that can't
+    match. Segments are written with a .pending suffix and only renamed and indexed
+    once the rows are deleted from the database; recover() settles any left behind.
+    """
+
+    def __init__(self):
+        self.root = os.getenv('ARCHIVE_DIR', 'archive')
+        # Rows older than this many days are archived; 0 turns archiving off
+        self.after_days = int(os.getenv('ARCHIVE_AFTER_DAYS', 0))
+        self.interval = float(os.getenv('ARCHIVE_INTERVAL', 3600))
+        self.batch_size = int(os.getenv('ARCHIVE_BATCH', 5000))
+        self._segments = {}
+        # Bytes of each table's index.jsonl read into _segments
+        self._index_sizes = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def enabled(self):
+        return self.after_days > 0
+
+    def _table_dir(self, table):
+        return os.path.join(self.root, table)
+
+    def segments(self, table):
+        """Committed segments of a table, reading any index lines another process appended"""
+        path = os.path.join(self._table_dir(table), 'index.jsonl')
+        with self._lock:
+            segments = self._segments.setdefault(table, [])
+            offset = self._index_sizes.get(table, 0)
+            try:
+                size = os.path.getsize(path)
+            except FileNotFoundError:
+                size = 0
+            if size > offset:
+                with open(path, 'rb') as f:
+                    f.seek(offset)
+                    data = f.read(size - offset)
+                # A line still being appended is picked up on a later call
+                data = data[:data.rfind(b'\n') + 1]
+                for line in data.decode('utf-8').splitlines():
+                    if line.strip():
+                        segments.append(Segment(table, **json.loads(line)))
+                self._index_sizes[table] = offset + len(data)
+            return list(segments)
+
+    def write_pending(self, table, rows):
+        """Write rows to one pending segment per creation day and return the segments"""
+        by_day = {}
+        for row in rows:
+            by_day.setdefault(row['created_at'].date().isoformat(), []).append(row)
+        segments = []
+        for day, day_rows in sorted(by_day.items()):
+            ids = [row['id'] for row in day_rows]
+            path = os.path.join(day, f'{min(ids)}-{max(ids)}.jsonl.gz')
+            segment = Segment.describe(table, day, path, day_rows)
+            full_path = os.path.join(self._table_dir(table), path) + PENDING_SUFFIX
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            with open(full_path, 'wb') as raw:
+                with gzip.GzipFile(fileobj=raw, mode='wb') as f:
+                    for row in day_rows:
+                        f.write((json.dumps(row, ensure_ascii=False, default=str) + '\n').encode('utf-8'))
+                raw.flush()
+                os.fsync(raw.fileno())
+            segments.append(segment)
+        return segments
+
+    def commit(self, segment):
+        """Publish a pending segment once its rows are gone from the database"""
+        table_dir = self._table_dir(segment.table)
+        full_path = os.path.join(table_dir, segment.path)
+        os.replace(full_path + PENDING_SUFFIX, full_path)
+        self._index(segment)
+
+    def _index(self, segment):
+        os.makedirs(self._table_dir(segment.table), exist_ok=True)
+        with self._lock:
+            with open(os.path.join(self._table_dir(segment.table), 'index.jsonl'), 'a', encoding='utf-8') as f:
+                f.write(json.dumps(segment.to_json()) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+        # Read back like any other process's append
+        self.segments(segment.table)
+
+    def discard(self, segment):
+        """Drop a pending segment whose rows stayed in the database"""
+        try:
+            os.remove(os.path.join(self._table_dir(segment.table), segment.path) + PENDING_SUFFIX)
+        except FileNotFoundError:
+            pass
+
+    def recover(self, rows_still_present):
+        """Settle segments a crash left between writing and indexing.
+
+        A pending segment is committed if rows_still_present(table, ids) says its rows
+        were deleted, and discarded if the delete was rolled back. A renamed segment
+        missing from the index had its rows deleted, so it is indexed.
+        """
+        for table in ARCHIVE_KEYS:
+            table_dir = self._table_dir(table)
+            if not os.path.isdir(table_dir):
+                continue
+            indexed = {segment.path for segment in self.segments(table)}
+            for day in sorted(os.listdir(table_dir)):
+                day_dir = os.path.join(table_dir, day)
+                if not os.path.isdir(day_dir):
+                    continue
+                for name in sorted(os.listdir(day_dir)):
+                    pending = name.endswith(PENDING_SUFFIX)
+                    path = os.path.join(day, name[:-len(PENDING_SUFFIX)] if pending else name)
+                    if path in indexed:
+                        continue
+                    rows = list(self._read(os.path.join(table_dir, day, name)))
+                    segment = Segment.describe(table, day, path, rows)
+                    if not pending:
+                        self._index(segment)
+                    elif rows and not rows_still_present(table, [row['id'] for row in rows]):
+                        self.commit(segment)
+                    else:
+                        self.discard(segment)
+
+    @staticmethod
+    def _read(full_path):
+        with gzip.open(full_path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                yield _load_row(line)
+
+    def iter_rows(self, table, filters, before=None):
+        """Yield archived rows newest first by (created_at, id).
+
+        filters maps columns to string values; before is an exclusive (created_at, id)
+        position, as in the feed cursors. Segments are opened lazily, newest first, and only once the next row could come
+        from them, so a reader that stops early leaves the older segments unread.
+        """
+        pending = [segment for segment in self.segments(table)
+                   if segment.may_match(filters) and (before is None or segment.oldest_key() < before)]
+        # Popped from the end: newest upper bound last
+        pending.sort(key=lambda segment: segment.newest_key())
+        heap = []
+        while pending or heap:
+            while pending and (not heap or pending[-1].newest_key() >= heap[0].key):
+                segment = pending.pop()
+                for row in self._read(os.path.join(self._table_dir(table), segment.path)):
+                    if all(str(row.get(column)) == value for column, value in filters.items()) \
+                            and (before is None or _row_key(row) < before):
+                        heapq.heappush(heap, _Newest(row))
+            if heap:
+                yield heapq.heappop(heap).row
+
+    def count_by(self, table, column):
+        """Archived row counts per value of one of the table's key columns"""
+        counts = Counter()
+        for segment in self.segments(table):
+            counts.update(segment.keys.get(column, {}))
+        return counts
+
+    def count_by_day(self, table, first_day):
+        """Archived row counts per creation day, from first_day on"""
+        counts = Counter()
+        for segment in self.segments(table):
+            if segment.day >= first_day.isoformat():
+                counts[segment.day] += segment.rows
+        return counts
+
+    def start(self, archive_rows):
+        """Run archive_rows() now and then every interval seconds, if archiving is enabled"""
+        if not self.enabled or self._thread is not None:
+            return False
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(archive_rows,), name='archiver', daemon=True)
+        self._thread.start()
+        return True
+
+    def shutdown(self):
+        """Stop the archiving thread after its current batch"""
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join()
+
+    def _run(self, archive_rows):
+        while True:
+            try:
+                moved = archive_rows(self._stop)
+                if any(moved.values()):
+                    print(f"Archived {', '.join(f'{count} {table}' for table, count in moved.items())}")
+            except Exception as e:
+                print(f"Error archiving old rows: {e}")
+            if self._stop.wait(self.interval):
+                return
+
+# Global archive instance
+archive = SegmentArchive()
@@ -0,0 +1,139 @@
+import base64
+import hashlib
+import hmac
+import multiprocessing
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import bcrypt
+
+def _hash_password(password):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+def _verify_password(password, hashed):
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+class PasswordHasher:
+    """Runs bcrypt in a process pool so hashing never occupies request threads' CPU time"""
+
+    def __init__(self):
+        self.workers = int(os.getenv('BCRYPT_WORKERS', os.cpu_count() or 1))
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the worker processes; call before serving so workers aren't forked from request threads"""
+        with self._lock:
+            if self._executor is None and self.workers > 0:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+        return self._executor
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+    def _run(self, func, *args):
+        executor = self._executor or self.start()
+        if executor is None:
+            return func(*args)
+        return executor.submit(func, *args).result()
+
+    def hash_password(self, password):
+        """Hash password using bcrypt"""
+        return self._run(_hash_password, password)
+
+    def verify_password(self, password, hashed):
+        """Verify password against hash"""
+        return self._run(_verify_password, password, hashed)
+
+class SessionStore:
+    """Bounded, expiring map of session token -> (user_type, user_id).
+
+    With SESSION_SECRET set, tokens instead carry the user and expiry signed with it,
+    so every process sharing the secret accepts them. Revoked signed tokens are
+    remembered until they expire, in this process only.
+    """
+
+    def __init__(self):
+        self.ttl = float(os.getenv('SESSION_TTL', 7 * 24 * 3600))
+        self.max_sessions = int(os.getenv('SESSION_MAX', 100000))
+        self.secret = os.getenv('SESSION_SECRET', '').encode('utf-8')
+        self._sessions = OrderedDict()
+        # Signed tokens ended by revoke(), with their expiry as a Unix timestamp
+        self._revoked = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _sign(self, payload):
+        digest = hmac.new(self.secret, payload.encode('utf-8'), hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest).decode('ascii').rstrip('=')
+
+    def _verify(self, token):
+        """Return (user_type, user_id, expires) from a correctly signed token, or None"""
+        payload, _, signature = token.rpartition('.')
+        if not hmac.compare_digest(signature, self._sign(payload)):
+            return None
+        try:
+            user_type, user_id, expires, _ = payload.split('.')
+            return user_type, int(user_id), int(expires)
+        except ValueError:
+            return None
+
+    def create(self, user_type, user_id):
+        """Issue a new token for the user, evicting the oldest session when full"""
+        if self.secret:
+            payload = f"{user_type}.{user_id}.{int(time.time() + self.ttl)}.{secrets.token_urlsafe(16)}"
+            return f"{payload}.{self._sign(payload)}"
+        token = secrets.token_urlsafe(32)
+        with self._lock:
+            self._sessions[token] = (user_type, user_id, time.monotonic() + self.ttl)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return token
+
+    def get(self, token):
+        """Return (user_type, user_id) for a live token, or None"""
+        if self.secret:
+            session = self._verify(token)
+            if session is None or time.time() > session[2]:
+                return None
+            with self._lock:
+                if token in self._revoked:
+                    return None
+            return session[:2]
+        with self._lock:
+            session = self._sessions.get(token)
+            if session is None:
+                return None
+            user_type, user_id, expires = session
+            if time.monotonic() > expires:
+                del self._sessions[token]
+                return None
+            return user_type, user_id
+
+    def revoke(self, token):
+        """End a session"""
+        if self.secret:
+            session = self._verify(token)
+            if session is not None:
+                with self._lock:
+                    now = time.time()
+                    self._revoked[token] = session[2]
+                    while self._revoked and (len(self._revoked) > self.max_sessions
+                                             or next(iter(self._revoked.values())) < now):
+                        self._revoked.popitem(last=False)
+            return
+        with self._lock:
+            self._sessions.pop(token, None)
+
+# Global instances
+password_hasher = PasswordHasher()
+sessions = SessionStore()
@@ -0,0 +1,97 @@
+import csv
+import io
+import json
+
+BATCH_SIZE = 500
+CSV_COLUMNS = ['id', 'name', 'price', 'description', 'available']
+
+class BulkImportError(Exception):
+    """Raised when an uploaded catalogue row is malformed or a batch fails to write"""
+
+class BodyReader(io.RawIOBase):
+    """Exposes exactly `length` bytes of a request body as a stream, read on demand"""
+
+    def __init__(self, rfile, length):
+        self.rfile = rfile
+        self.remaining = length
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.remaining <= 0:
+            return 0
+        data = self.rfile.read(min(len(buffer), self.remaining))
+        self.remaining -= len(data)
+        buffer[:len(data)] = data
+        return len(data)
+
+def open_body(rfile, length):
+    """Wrap a request body as a buffered text stream so it can be parsed line by line"""
+    return io.TextIOWrapper(io.BufferedReader(BodyReader(rfile, length)), encoding='utf-8', newline='')
+
+def parse_available(value):
+    if isinstance(value, bool):
+        return value
+    if value is None or value == '':
+        return True
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'y')
+
+def parse_product(record, line_no):
+    """Validate one uploaded record into (name, price, description, available)"""
+    if not isinstance(record, dict):
+        raise BulkImportError(f"Line {line_no}: expected an object")
+    name = (record.get('name') or '').strip()
+    price = str(record.get('price') or '').strip()
+    if not name or not price:
+        raise BulkImportError(f"Line {line_no}: name and price are required")
+    return name, price, record.get('description') or '', parse_available(record.get('available'))
+
+def iter_csv_products(stream):
+    """Yield validated products from a CSV stream with a header row"""
+    reader = csv.DictReader(stream)
+    for record in reader:
+        yield parse_product(record, reader.line_num)
+
+def iter_jsonl_products(stream):
+    """Yield validated products from a JSON-lines stream"""
+    for line_no, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise BulkImportError(f"Line {line_no}: invalid JSON ({e.msg})")
+        yield parse_product(record, line_no)
+
+def batched(items, size=BATCH_SIZE):
+    """Group an iterable into lists of at most `size` items"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def export_csv(row_batches):
+    """Encode batches of product rows as CSV, yielding one chunk per batch"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_COLUMNS, extrasaction='ignore')
+    writer.writeheader()
+    yield buffer.getvalue().encode('utf-8')
+    for rows in row_batches:
+        buffer.seek(0)
+        buffer.truncate()
+        for row in rows:
+            writer.writerow(dict(row, available=bool(row['available'])))
+        yield buffer.getvalue().encode('utf-8')
+
+def export_jsonl(row_batches):
+    """Encode batches of product rows as JSON lines, yielding one chunk per batch"""
+    for rows in row_batches:
+        lines = [json.dumps(dict({column: row[column] for column in CSV_COLUMNS},
+                                 available=bool(row['available'])),
+                            ensure_ascii=False, default=str) for row in rows]
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
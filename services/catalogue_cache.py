@@ -0,0 +1,81 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+class CacheEntry:
+    def __init__(self, body, store_ids, is_list):
+        self.body = body
+        self.etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        self.store_ids = store_ids
+        self.is_list = is_list
+        self.created = time.monotonic()
+
+class CatalogueCache:
+    """LRU cache of serialized store and product responses, bounded by total body size"""
+
+    def __init__(self):
+        self.max_bytes = int(os.getenv('CATALOGUE_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+        self.ttl = float(os.getenv('CATALOGUE_CACHE_TTL', 60))
+        self._entries = OrderedDict()
+        self._by_store = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        # Bumped on every invalidation so fills computed before a write are not stored
+        self.generation = 0
+
+    def get(self, key):
+        """Return a fresh entry for key, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry.created > self.ttl:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, body, store_ids, generation, is_list=False):
+        """Store a serialized response unless the catalogue changed since `generation` was read"""
+        entry = CacheEntry(body, frozenset(store_ids), is_list)
+        with self._lock:
+            if generation != self.generation or len(body) > self.max_bytes:
+                return entry
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._size += len(body)
+            for store_id in entry.store_ids:
+                self._by_store.setdefault(store_id, set()).add(key)
+            while self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+        return entry
+
+    def invalidate_store(self, store_id):
+        """Drop every cached response that includes the given store"""
+        with self._lock:
+            self.generation += 1
+            for key in list(self._by_store.get(store_id, ())):
+                self._remove(key)
+
+    def invalidate_lists(self):
+        """Drop all cached store lists, e.g. when a store is added or changes its listing fields"""
+        with self._lock:
+            self.generation += 1
+            for key in [key for key, entry in self._entries.items() if entry.is_list]:
+                self._remove(key)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._size -= len(entry.body)
+        for store_id in entry.store_ids:
+            keys = self._by_store.get(store_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_store[store_id]
+
+# Global cache instance
+catalogue_cache = CatalogueCache()
@@ -0,0 +1,32 @@
+import threading
+
+class ChatNotifier:
+    """Wakes long-polling chat clients when a new message is saved for one of their chats"""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        # Latest message id seen per (participant_type, participant_id)
+        self._latest = {}
+
+    def publish(self, participants, message_id):
+        """Record a new message for the given participants and wake their waiting requests"""
+        with self._condition:
+            for participant in participants:
+                if message_id > self._latest.get(participant, 0):
+                    self._latest[participant] = message_id
+            self._condition.notify_all()
+
+    def wait(self, participant, after_message_id, timeout):
+        """Block until the participant has a message newer than after_message_id, or timeout.
+
+        Returns True if new messages are known to be available. Messages written by
+        another process are not seen here, so callers re-query after a timeout anyway.
+        """
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: self._latest.get(participant, 0) > after_message_id,
+                timeout=timeout
+            )
+
+# Global notifier instance
+chat_notifier = ChatNotifier()
@@ -0,0 +1,115 @@
+import os
+import queue
+import threading
+import time
+
+# Tells the writer thread to flush what it has and exit
+_STOP = object()
+
+class PendingMessage:
+    """A chat message on its way to the database"""
+
+    def __init__(self, chat_id, participants, sender_id, sender_type, message):
+        self.chat_id = chat_id
+        self.participants = participants
+        self.sender_id = sender_id
+        self.sender_type = sender_type
+        self.message = message
+        self.message_id = None
+        self.error = None
+        self.done = threading.Event()
+
+class ChatWriter:
+    """Write-behind queue that group-commits chat messages in batches.
+
+    Request threads queue their message and one writer thread saves everything queued
+    in a single transaction, so a burst of messages costs one commit rather than one
+    each. Off unless CHAT_WRITE_BEHIND is set; save_chat then writes directly.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv('CHAT_WRITE_BEHIND', 'false').lower() in ('1', 'true', 'yes')
+        self.batch_size = int(os.getenv('CHAT_WRITE_BATCH', 200))
+        # How long the writer lingers for more messages before committing a partial batch
+        self.max_delay = float(os.getenv('CHAT_WRITE_DELAY_MS', 1)) / 1000
+        # With CHAT_WRITE_WAIT=false requests are answered once queued; anything still
+        # queued when the process dies is lost
+        self.wait_for_commit = os.getenv('CHAT_WRITE_WAIT', 'true').lower() in ('1', 'true', 'yes')
+        self._queue = queue.Queue(maxsize=int(os.getenv('CHAT_WRITE_QUEUE', 10000)))
+        self._thread = None
+        self._write = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self, write_batch):
+        """Start the writer thread if write-behind is enabled.
+
+        write_batch(messages) must save a list of PendingMessage in one transaction and
+        set their message_id.
+        """
+        with self._lock:
+            if self._thread is None and self.enabled:
+                self._write = write_batch
+                self._thread = threading.Thread(target=self._run, name='chat-writer', daemon=True)
+                self._thread.start()
+        return self.running
+
+    def shutdown(self):
+        """Commit everything already queued and stop the writer thread"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join()
+
+    def submit(self, message):
+        """Queue a message, blocking while the queue is full.
+
+        Unless CHAT_WRITE_WAIT is off, waits for the message's batch to commit and
+        re-raises the database error if it failed.
+        """
+        self._queue.put(message)
+        if self.wait_for_commit:
+            message.done.wait()
+            if message.error is not None:
+                raise message.error
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+            batch = [first]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.batch_size:
+                try:
+                    message = self._queue.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if message is _STOP:
+                    stopping = True
+                    break
+                batch.append(message)
+            self._flush(batch)
+
+    def _flush(self, batch):
+        try:
+            self._write(batch)
+        except Exception as e:
+            if len(batch) == 1:
+                print(f"Error saving chat message: {e}")
+                batch[0].error = e
+            else:
+                # One bad message rolls back the whole batch; retry one by one so only it fails
+                for message in batch:
+                    self._flush([message])
+        finally:
+            for message in batch:
+                message.done.set()
+
+# Global writer instance
+chat_writer = ChatWriter()
@@ -0,0 +1,144 @@
+import os
+import threading
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+class DashboardStats:
+    """Counters behind /api/stats, kept current by the write handlers.
+
+    Every STATS_RECONCILE_INTERVAL seconds the counters are replaced with fresh counts
+    from the database. That corrects drift from writes made by other processes or
+    directly in the database, and from a write that raced the previous reconciliation.
+    """
+
+    def __init__(self):
+        self.days = int(os.getenv('STATS_DAYS', 30))
+        self.reconcile_interval = float(os.getenv('STATS_RECONCILE_INTERVAL', 300))
+        self._stores = Counter()           # (category, status) -> stores
+        self._customers = Counter()        # status -> customers
+        self._bookings = Counter()         # status -> bookings
+        self._bookings_by_day = Counter()  # 'YYYY-MM-DD' -> bookings created that day
+        self._lock = threading.Lock()
+        self.reconciled_at = None
+        self._load = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def loaded(self):
+        return self.reconciled_at is not None
+
+    def first_day(self):
+        """Oldest day reported under bookings by day"""
+        return date.today() - timedelta(days=self.days - 1)
+
+    def reconcile(self, load):
+        """Replace the counters with counts from load(first_day).
+
+        load returns row lists: 'stores' (category, status, count), 'customers' and
+        'bookings' (status, count) and 'bookings_by_day' (day, count). Counts for a
+        repeated key are added together.
+        """
+        counts = load(self.first_day())
+        stores, customers, bookings, bookings_by_day = Counter(), Counter(), Counter(), Counter()
+        # A key can appear more than once, e.g. once for hot rows and once for archived ones
+        for row in counts['stores']:
+            stores[(row['category'], row['status'])] += row['count']
+        for row in counts['customers']:
+            customers[row['status']] += row['count']
+        for row in counts['bookings']:
+            bookings[row['status']] += row['count']
+        for row in counts['bookings_by_day']:
+            bookings_by_day[str(row['day'])] += row['count']
+        with self._lock:
+            self._stores, self._customers = stores, customers
+            self._bookings, self._bookings_by_day = bookings, bookings_by_day
+            self.reconciled_at = datetime.now()
+
+    def start(self, load):
+        """Reconcile now, then in a background thread every reconcile_interval seconds"""
+        self.reconcile(load)
+        if self._thread is None and self.reconcile_interval > 0:
+            self._load = load
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='stats-reconcile', daemon=True)
+            self._thread.start()
+
+    def shutdown(self):
+        """Stop the reconciliation thread"""
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.reconcile_interval):
+            try:
+                self.reconcile(self._load)
+            except Exception as e:
+                # Keep serving the incrementally maintained counts until the next attempt
+                print(f"Error reconciling dashboard stats: {e}")
+
+    def add_store(self, category, status='active'):
+        with self._lock:
+            self._stores[(category, status)] += 1
+
+    def move_store(self, before, after):
+        """Move a store between categories or statuses; both are rows with category and status"""
+        with self._lock:
+            self._shift(self._stores, (before['category'], before['status']), (after['category'], after['status']))
+
+    def add_customer(self, status='active'):
+        with self._lock:
+            self._customers[status] += 1
+
+    def move_customer(self, old_status, new_status):
+        with self._lock:
+            self._shift(self._customers, old_status, new_status)
+
+    def add_booking(self, status, day):
+        """Count a new booking; day is a date or its 'YYYY-MM-DD' string"""
+        with self._lock:
+            self._bookings[status] += 1
+            self._bookings_by_day[str(day)] += 1
+
+    def move_booking(self, old_status, new_status):
+        with self._lock:
+            self._shift(self._bookings, old_status, new_status)
+
+    @staticmethod
+    def _shift(counter, old_key, new_key):
+        # Keys that drop to zero stay in the counter; snapshot() leaves them out
+        if old_key != new_key:
+            counter[old_key] -= 1
+            counter[new_key] += 1
+
+    def snapshot(self):
+        """The dashboard figures as a JSON-ready dict"""
+        first_day = self.first_day().isoformat()
+        with self._lock:
+            by_category = Counter()
+            for (category, status), count in self._stores.items():
+                if status == 'active':
+                    by_category[category] += count
+            return {
+                'stores': {
+                    'total': sum(self._stores.values()),
+                    'active': sum(by_category.values()),
+                    'byCategory': dict(sorted((+by_category).items())),
+                },
+                'customers': {
+                    'total': sum(self._customers.values()),
+                    'active': self._customers['active'],
+                },
+                'bookings': {
+                    'total': sum(self._bookings.values()),
+                    'byStatus': dict(sorted((+self._bookings).items())),
+                    'byDay': {day: count for day, count in sorted(self._bookings_by_day.items())
+                              if day >= first_day},
+                },
+                'reconciledAt': self.reconciled_at,
+            }
+
+# Global stats instance
+dashboard_stats = DashboardStats()
@@ -0,0 +1,86 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+class IdentityCache:
+    """LRU cache of natural keys resolved to row ids, with a TTL.
+
+    Keys are ('customer', phone), ('store', phone) and ('product', store_id, name).
+    Only hits are cached; a phone or product that doesn't exist is looked up again.
+    """
+
+    def __init__(self):
+        self.max_entries = int(os.getenv('IDENTITY_CACHE_MAX', 100000))
+        self.ttl = float(os.getenv('IDENTITY_CACHE_TTL', 300))
+        self._entries = OrderedDict()
+        # ('customer', id) or ('store', id) -> keys resolving to or belonging to that row
+        self._by_owner = {}
+        self._lock = threading.Lock()
+        # Bumped on every invalidation so lookups that raced a write are not stored
+        self.generation = 0
+
+    @staticmethod
+    def _owner(key, row_id):
+        kind = key[0]
+        if kind == 'product':
+            return ('store', key[1])
+        return (kind, row_id)
+
+    def get(self, key):
+        """Return the cached id for key, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            row_id, expires = entry
+            if time.monotonic() > expires:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return row_id
+
+    def put(self, key, row_id, generation):
+        """Cache an id unless anything was invalidated since `generation` was read"""
+        with self._lock:
+            if generation != self.generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (row_id, time.monotonic() + self.ttl)
+            self._by_owner.setdefault(self._owner(key, row_id), set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_customer(self, customer_id):
+        """Drop the customer's phone, e.g. after the phone number changes"""
+        self._invalidate_owner(('customer', int(customer_id)))
+
+    def invalidate_store(self, store_id):
+        """Drop the store's phone and every product name resolved within the store"""
+        self._invalidate_owner(('store', int(store_id)))
+
+    def invalidate_key(self, key):
+        """Drop one key, e.g. a phone number that has just been registered"""
+        with self._lock:
+            self.generation += 1
+            if key in self._entries:
+                self._remove(key)
+
+    def _invalidate_owner(self, owner):
+        with self._lock:
+            self.generation += 1
+            for key in list(self._by_owner.get(owner, ())):
+                self._remove(key)
+
+    def _remove(self, key):
+        row_id, _ = self._entries.pop(key)
+        owner = self._owner(key, row_id)
+        keys = self._by_owner.get(owner)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_owner[owner]
+
+# Global cache instance
+identity_cache = IdentityCache()
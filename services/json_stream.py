@@ -0,0 +1,60 @@
+import json
+import zlib
+from decimal import Decimal
+
+# Coalesce encoded items into writes of roughly this size
+CHUNK_SIZE = 16 * 1024
+
+def _json_default(value):
+    # DECIMAL columns (prices) go out as numbers, as the search index returns them
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+def encode_json(value):
+    """Encode an API response body as JSON text"""
+    return json.dumps(value, ensure_ascii=False, default=_json_default)
+
+def encode_json_stream(head, list_key, items, tail=None):
+    """Yield the UTF-8 JSON for {**head, list_key: [...items], **tail()} a chunk at a time.
+
+    `items` is consumed lazily, so only one chunk of encoded rows is held at once.
+    `tail` is called after the items are exhausted, for fields such as a next-page
+    cursor that depend on what was streamed.
+    """
+    opening = encode_json(head)[:-1]
+    parts = [opening + (', ' if head else '') + encode_json(list_key) + ': [']
+    size = len(parts[0])
+    first = True
+    for item in items:
+        encoded = ('' if first else ', ') + encode_json(item)
+        first = False
+        parts.append(encoded)
+        size += len(encoded)
+        if size >= CHUNK_SIZE:
+            yield ''.join(parts).encode('utf-8')
+            parts = []
+            size = 0
+
+    closing = ']'
+    for key, value in (tail() if tail else {}).items():
+        closing += ', ' + encode_json(key) + ': ' + encode_json(value)
+    parts.append(closing + '}')
+    yield ''.join(parts).encode('utf-8')
+
+def gzip_chunks(chunks, level=6):
+    """Gzip-compress a stream of byte chunks incrementally"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+def accepts_gzip(accept_encoding):
+    """True if an Accept-Encoding header allows gzip"""
+    for coding in (accept_encoding or '').split(','):
+        name, _, params = coding.strip().partition(';')
+        if name.strip().lower() in ('gzip', '*'):
+            return params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
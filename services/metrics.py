@@ -0,0 +1,229 @@
+import operator
+import os
+import threading
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        # How merge() folds another process's value into this one's
+        self.combine = operator.add
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def set(self, value, *label_values):
+        """Replace a value, e.g. with a running total kept elsewhere"""
+        with self._lock:
+            self._values[label_values] = value
+
+    def snapshot(self):
+        """The values as JSON-ready [label values, value] pairs, for merge() in another process"""
+        with self._lock:
+            return [[list(label_values), value] for label_values, value in self._values.items()]
+
+    def merge(self, snapshot):
+        with self._lock:
+            for label_values, value in snapshot:
+                label_values = tuple(label_values)
+                current = self._values.get(label_values)
+                self._values[label_values] = value if current is None else self.combine(current, value)
+
+    def render(self, kind='counter'):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} {kind}']
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            lines.append(f'{self.name}{format_labels(self.labels, label_values)} {format_value(value)}')
+        return lines
+
+class Gauge(Counter):
+    def __init__(self, name, help_text, labels=(), combine=operator.add):
+        super().__init__(name, help_text, labels)
+        self.combine = combine
+
+    def dec(self, *label_values):
+        self.inc(*label_values, amount=-1)
+
+    def render(self, kind='gauge'):
+        return super().render(kind)
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [per-bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self):
+        """The series as JSON-ready [label values, bucket counts, sum, count] lists"""
+        with self._lock:
+            return [[list(label_values), list(counts), total, count]
+                    for label_values, (counts, total, count) in self._series.items()]
+
+    def merge(self, snapshot):
+        with self._lock:
+            for label_values, counts, total, count in snapshot:
+                series = self._series.setdefault(tuple(label_values), [[0] * len(self.buckets), 0.0, 0])
+                series[0] = [mine + theirs for mine, theirs in zip(series[0], counts)]
+                series[1] += total
+                series[2] += count
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._series.items())
+        for label_values, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = format_labels(self.labels + ('le',), label_values + (format_value(float(bound)),))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = format_labels(self.labels + ('le',), label_values + ('+Inf',))
+            lines.append(f'{self.name}_bucket{labels} {count}')
+            labels = format_labels(self.labels, label_values)
+            lines.append(f'{self.name}_sum{labels} {format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+class RequestMetrics:
+    """Per-route request, latency and database-usage metrics in Prometheus text format.
+
+    Requests issuing more than SLOW_REQUEST_QUERIES statements (typically an N+1 loop)
+    or taking longer than SLOW_REQUEST_MS are logged individually. Each worker process
+    keeps its own registry; a scrape adds in the other workers' snapshot()s.
+    """
+
+    def __init__(self):
+        self.slow_request_queries = int(os.getenv('SLOW_REQUEST_QUERIES', 20))
+        self.slow_request_seconds = float(os.getenv('SLOW_REQUEST_MS', 1000)) / 1000.0
+        self.requests = Counter('localkirana_http_requests_total',
+                                'HTTP API requests by route, method and status',
+                                ('route', 'method', 'status'))
+        self.latency = Histogram('localkirana_http_request_duration_seconds',
+                                 'HTTP API request latency', ('route', 'method'))
+        self.in_flight = Gauge('localkirana_http_requests_in_flight',
+                               'HTTP API requests currently being handled')
+        self.queries = Histogram('localkirana_db_queries_per_request',
+                                 'Database statements issued per request', ('route', 'method'),
+                                 buckets=QUERY_COUNT_BUCKETS)
+        self.db_time = Histogram('localkirana_db_time_per_request_seconds',
+                                 'Time spent in the database per request', ('route', 'method'))
+        self.slow_requests = Counter('localkirana_slow_requests_total',
+                                     'Requests over the query-count or latency threshold',
+                                     ('route', 'method', 'reason'))
+        # Every worker checks the replicas itself: one is in rotation only if it is on all of them
+        self.replica_healthy = Gauge('localkirana_db_replica_healthy',
+                                     'Whether a read replica is in rotation', ('replica',), combine=min)
+        self.replica_lag = Gauge('localkirana_db_replica_lag_seconds',
+                                 'Replication lag at the last health check', ('replica',), combine=max)
+        self.replica_reads = Counter('localkirana_db_replica_reads_total',
+                                     'Reads served by a read replica', ('replica',))
+        self.workers = Gauge('localkirana_workers', 'Worker processes the server runs')
+        self.workers_reporting = Gauge('localkirana_workers_reporting',
+                                       'Worker processes whose metrics this scrape includes')
+        self.in_flight.inc(amount=0)
+
+    def start(self):
+        self.in_flight.inc()
+
+    def finish(self, route, method, status, seconds, query_count, db_seconds):
+        """Record one finished request and log it if it crossed a slow-request threshold"""
+        self.in_flight.dec()
+        self.requests.inc(route, method, str(status))
+        self.latency.observe(seconds, route, method)
+        self.queries.observe(query_count, route, method)
+        self.db_time.observe(db_seconds, route, method)
+
+        reasons = []
+        if query_count > self.slow_request_queries:
+            reasons.append('queries')
+        if seconds > self.slow_request_seconds:
+            reasons.append('latency')
+        for reason in reasons:
+            self.slow_requests.inc(route, method, reason)
+        if reasons:
+            print(f"Slow request: {method} {route} -> {status} in {seconds * 1000:.0f} ms, "
+                  f"{query_count} queries, {db_seconds * 1000:.0f} ms in database")
+
+    def _merged(self):
+        return [self.requests, self.latency, self.in_flight, self.queries, self.db_time, self.slow_requests,
+                self.replica_healthy, self.replica_lag, self.replica_reads]
+
+    def _record_replicas(self, replicas):
+        for replica in replicas:
+            self.replica_healthy.set(int(replica['healthy']), replica['server'])
+            if replica['lag_seconds'] is not None:
+                self.replica_lag.set(float(replica['lag_seconds']), replica['server'])
+            self.replica_reads.set(replica['reads'], replica['server'])
+
+    def snapshot(self, replicas=()):
+        """This process's metrics, with its pool's replica status, as JSON-ready data by metric name"""
+        self._record_replicas(replicas)
+        return {metric.name: metric.snapshot() for metric in self._merged()}
+
+    def merge(self, snapshot):
+        for metric in self._merged():
+            metric.merge(snapshot.get(metric.name, ()))
+
+    def render(self, replicas=(), others=(), workers=1):
+        """All metrics in the Prometheus text exposition format, with the database's replica status.
+
+        others are the snapshot()s of the server's other workers, out of the given number
+        of workers; their counts are added to this process's so one scrape covers the server.
+        """
+        self._record_replicas(replicas)
+        totals = self
+        if others:
+            totals = RequestMetrics()
+            for snapshot in [self.snapshot()] + list(others):
+                totals.merge(snapshot)
+        metrics = totals._merged()
+        if not replicas:
+            metrics = metrics[:-3]
+        self.workers.set(workers)
+        self.workers_reporting.set(1 + len(others))
+        lines = []
+        for metric in metrics + [self.workers, self.workers_reporting]:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+# Global metrics registry
+request_metrics = RequestMetrics()
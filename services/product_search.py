@@ -0,0 +1,425 @@
+import bisect
+import heapq
+import math
+import re
+import threading
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+PRICE_PATTERN = re.compile(r'\d+(?:\.\d+)?')
+
+# Cap how many vocabulary terms one prefix may expand to, so short prefixes stay cheap
+MAX_PREFIX_EXPANSION = 64
+MIN_PREFIX_LENGTH = 2
+MIN_FUZZY_LENGTH = 4
+
+# Geometric price buckets (each 5% wider than the last) let the cheapest matches
+# be found by intersecting a few buckets instead of sorting every candidate
+PRICE_BUCKET_RATIO = math.log(1.05)
+NO_PRICE_BUCKET = float('inf')
+
+# When the most selective set is at most this large, intersect everything up front;
+# prefix terms whose postings add up to more are left unmerged (see PostingUnion)
+MATERIALIZE_LIMIT = 50000
+# Up-front matches beyond this many are ranked by walking their price buckets, not one by one
+SCAN_LIMIT = 2000
+
+STORE_FACETS = ('category', 'pincode')
+
+EXACT_SCORE = 3
+PREFIX_SCORE = 2
+FUZZY_SCORE = 1
+
+def tokenize(text):
+    """Lower-case alphanumeric tokens of a piece of text"""
+    return TOKEN_PATTERN.findall((text or '').lower())
+
+def normalize_token(token):
+    """Fold a token's plural onto its singular, so 'tomatoes' and 'tomato' meet"""
+    if len(token) > 4 and token.endswith('ies'):
+        return token[:-3] + 'y'
+    if (len(token) > 5 and token.endswith('oes')) or token.endswith(('sses', 'ches', 'shes', 'xes')):
+        return token[:-2]
+    if len(token) > 3 and token.endswith('s') and not token.endswith(('ss', 'us')):
+        return token[:-1]
+    return token
+
+def parse_price(price):
+    """Extract the numeric value from a display price such as '₹1,299' or 'Rs. 80.50'"""
+    if price is None:
+        return None
+    match = PRICE_PATTERN.search(str(price).replace(',', ''))
+    return float(match.group()) if match else None
+
+def price_bucket(price):
+    """Bucket id for a numeric price; products without a price sort last"""
+    if price is None:
+        return NO_PRICE_BUCKET
+    return int(math.log1p(max(price, 0)) / PRICE_BUCKET_RATIO)
+
+def deletes(token):
+    """All variants of a token with one character removed"""
+    return {token[:i] + token[i + 1:] for i in range(len(token))}
+
+class PostingUnion:
+    """The union of several posting sets, intersected with other sets without being merged.
+
+    A two-letter prefix can expand to many common terms whose postings together cover
+    much of the index. Intersecting a price bucket or facet with each term in turn costs
+    at most that set's size per term, instead of building the union first.
+    """
+
+    __slots__ = ('sets', 'size')
+
+    def __init__(self, sets):
+        self.sets = sets
+        self.size = sum(len(ids) for ids in sets)
+
+    def __len__(self):
+        # An upper bound (terms share products), which is all the selectivity ordering needs
+        return self.size
+
+    def __rand__(self, other):
+        return set().union(*(other & ids for ids in self.sets))
+
+class ProductIndex:
+    """In-memory inverted index over product names and descriptions.
+
+    Terms map to posting sets of product ids. A sorted vocabulary answers prefix
+    queries by bisection, and a one-deletion neighbourhood map answers fuzzy
+    (edit distance 1) queries without scanning the vocabulary. Category, pincode,
+    availability and price bucket are kept as sets of product ids, so a query walks
+    the price buckets cheapest first and filters each with set intersections,
+    stopping as soon as the top results are settled.
+
+    A second, exact index maps the normalized tokens of product names to products,
+    for routing customer requests to the stores that stock the item.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._products = {}      # product id -> product dict
+        self._terms = {}         # product id -> set of terms
+        self._postings = {}      # term -> set of product ids
+        self._vocabulary = []    # sorted terms
+        self._deletes = {}       # one-deletion variant -> set of terms
+        self._name_terms = {}    # product id -> set of normalized name tokens
+        self._name_postings = {}  # normalized name token -> set of product ids
+        self._stores = {}        # store id -> store dict (shop_name, category, pincode, status)
+        self._store_products = {}  # store id -> set of product ids
+        self._facets = {}        # (field, value) -> set of product ids
+        self._hidden = set()     # products of inactive or unknown stores
+        self._price_buckets = {}  # price bucket -> set of product ids
+        self._bucket_order = []  # sorted price bucket ids
+
+    def __len__(self):
+        return len(self._products)
+
+    def set_store(self, store):
+        """Add or update a store's searchable attributes"""
+        with self._lock:
+            if store['id'] in self._stores:
+                self.update_store(store['id'], store)
+                return
+            self._stores[store['id']] = {
+                'shop_name': store.get('shop_name'),
+                'category': store.get('category'),
+                'pincode': store.get('pincode'),
+                'status': store.get('status', 'active')
+            }
+            for product_id in self._store_products.get(store['id'], ()):
+                self._add_store_facets(product_id, store['id'])
+
+    def update_store(self, store_id, fields):
+        """Apply a partial store update to the indexed attributes"""
+        with self._lock:
+            store = self._stores.get(store_id)
+            if store is None:
+                return
+            product_ids = self._store_products.get(store_id, set())
+            for key in store:
+                if key not in fields or fields[key] == store[key]:
+                    continue
+                if key == 'status':
+                    if fields[key] == 'active':
+                        self._hidden.difference_update(product_ids)
+                    else:
+                        self._hidden.update(product_ids)
+                elif key in STORE_FACETS:
+                    old = self._facets.get((key, store[key]))
+                    if old is not None:
+                        old.difference_update(product_ids)
+                    self._facets.setdefault((key, fields[key]), set()).update(product_ids)
+                store[key] = fields[key]
+
+    def _add_store_facets(self, product_id, store_id):
+        store = self._stores.get(store_id)
+        if store is None or store['status'] != 'active':
+            self._hidden.add(product_id)
+        else:
+            self._hidden.discard(product_id)
+        if store is not None:
+            for key in STORE_FACETS:
+                self._facets.setdefault((key, store[key]), set()).add(product_id)
+
+    def _remove_facets(self, product):
+        store = self._stores.get(product['store_id'])
+        keys = [('available', product['available'])]
+        if store is not None:
+            keys += [(key, store[key]) for key in STORE_FACETS]
+        for key in keys:
+            facet = self._facets.get(key)
+            if facet is not None:
+                facet.discard(product['id'])
+        self._hidden.discard(product['id'])
+        self._price_buckets.get(price_bucket(product['price_value']), set()).discard(product['id'])
+
+    def upsert(self, product):
+        """Index a product, replacing any previous version of it"""
+        terms = set(tokenize(product.get('name'))) | set(tokenize(product.get('description')))
+        name_terms = {normalize_token(token) for token in tokenize(product.get('name'))}
+        entry = {
+            'id': product['id'],
+            'store_id': product['store_id'],
+            'name': product.get('name'),
+            'price': product.get('price'),
+            'price_value': product.get('price_value'),
+            'description': product.get('description'),
+            'available': bool(product.get('available'))
+        }
+        if entry['price_value'] is None:
+            entry['price_value'] = parse_price(entry['price'])
+        else:
+            entry['price_value'] = float(entry['price_value'])
+
+        with self._lock:
+            self.remove(product['id'])
+            self._products[product['id']] = entry
+            self._terms[product['id']] = terms
+            self._name_terms[product['id']] = name_terms
+            for term in name_terms:
+                self._name_postings.setdefault(term, set()).add(product['id'])
+            self._store_products.setdefault(product['store_id'], set()).add(product['id'])
+            self._facets.setdefault(('available', entry['available']), set()).add(product['id'])
+            bucket = price_bucket(entry['price_value'])
+            if bucket not in self._price_buckets:
+                self._price_buckets[bucket] = set()
+                bisect.insort(self._bucket_order, bucket)
+            self._price_buckets[bucket].add(product['id'])
+            self._add_store_facets(product['id'], product['store_id'])
+            for term in terms:
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = set()
+                    bisect.insort(self._vocabulary, term)
+                    for variant in deletes(term):
+                        self._deletes.setdefault(variant, set()).add(term)
+                postings.add(product['id'])
+
+    def remove(self, product_id):
+        """Drop a product from the index"""
+        with self._lock:
+            self._remove_terms(product_id)
+            for term in self._name_terms.pop(product_id, ()):
+                postings = self._name_postings.get(term)
+                if postings is not None:
+                    postings.discard(product_id)
+                    if not postings:
+                        del self._name_postings[term]
+            product = self._products.pop(product_id, None)
+            if product is not None:
+                self._remove_facets(product)
+                self._store_products.get(product['store_id'], set()).discard(product_id)
+
+    def remove_store_products(self, store_id):
+        """Drop every indexed product of a store, e.g. before reindexing it"""
+        with self._lock:
+            for product_id in list(self._store_products.get(store_id, ())):
+                self.remove(product_id)
+
+    def _remove_terms(self, product_id):
+        for term in self._terms.pop(product_id, ()):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.discard(product_id)
+            if not postings:
+                del self._postings[term]
+                index = bisect.bisect_left(self._vocabulary, term)
+                if index < len(self._vocabulary) and self._vocabulary[index] == term:
+                    del self._vocabulary[index]
+                for variant in deletes(term):
+                    terms = self._deletes.get(variant)
+                    if terms is not None:
+                        terms.discard(term)
+                        if not terms:
+                            del self._deletes[variant]
+
+    def _expand(self, token):
+        """Return {term: score} for the vocabulary terms a query token matches"""
+        matches = {}
+        if token in self._postings:
+            matches[token] = EXACT_SCORE
+
+        if len(token) >= MIN_PREFIX_LENGTH:
+            start = bisect.bisect_left(self._vocabulary, token)
+            for term in self._vocabulary[start:start + MAX_PREFIX_EXPANSION]:
+                if not term.startswith(token):
+                    break
+                matches.setdefault(term, PREFIX_SCORE)
+
+        if not matches and len(token) >= MIN_FUZZY_LENGTH:
+            # Edit distance 1: shared deletion variants cover insert, delete and substitute
+            candidates = set(self._deletes.get(token, ()))
+            for variant in deletes(token):
+                if variant in self._postings:
+                    candidates.add(variant)
+                candidates |= self._deletes.get(variant, set())
+            for term in candidates:
+                matches.setdefault(term, FUZZY_SCORE)
+        return matches
+
+    def _union(self, terms):
+        """Product ids matching any of the terms; a single posting set is returned as-is, not copied,
+        and a large union as a PostingUnion"""
+        if len(terms) == 1:
+            return self._postings[terms[0]]
+        sets = [self._postings[term] for term in terms]
+        union = PostingUnion(sets)
+        if len(union) > MATERIALIZE_LIMIT:
+            return union
+        return set().union(*sets)
+
+    def search(self, query, category=None, pincode=None, available=None,
+               min_price=None, max_price=None, limit=20):
+        """Return up to `limit` products matching every query token, best matches first.
+
+        Products that hit every token with its best possible score rank first, cheapest
+        first; only if they are too few are the remaining matches scored one by one.
+        Without query tokens, the products passing the filters are listed cheapest first.
+        """
+        tokens = tokenize(query)
+
+        with self._lock:
+            filters = []
+            for facet, value in (('category', category), ('pincode', pincode), ('available', available)):
+                if value is not None and value != '':
+                    filters.append(self._facets.get((facet, value), set()))
+            if not tokens:
+                return [self._result(product_id)
+                        for _, product_id in self._walk([], filters, limit, min_price, max_price)]
+
+            token_matches = []
+            all_sets = []
+            best_sets = []
+            for token in tokens:
+                matches = self._expand(token)
+                if not matches:
+                    return []
+                best_score = max(matches.values())
+                best_terms = [term for term, score in matches.items() if score == best_score]
+                all_sets.append(self._union(list(matches)))
+                best_sets.append(all_sets[-1] if len(best_terms) == len(matches) else self._union(best_terms))
+                token_matches.append(matches)
+
+            best = [(0, price, product_id)
+                    for price, product_id in self._walk(best_sets, filters, limit, min_price, max_price)]
+            if len(best) < limit:
+                seen = {product_id for _, _, product_id in best}
+                results = []
+                for price, product_id in self._walk(all_sets, filters, None, min_price, max_price):
+                    if product_id in seen:
+                        continue
+                    terms = self._terms[product_id]
+                    score = sum(max(matches.get(term, 0) for term in terms) for matches in token_matches)
+                    results.append((-score, price, product_id))
+                best += heapq.nsmallest(limit - len(best), results)
+
+            return [self._result(product_id) for _, _, product_id in best]
+
+    def _result(self, product_id):
+        """A product as returned by search(), with its store's name, category and pincode"""
+        product = self._products[product_id]
+        store = self._stores[product['store_id']]
+        return dict(product, **{key: store[key] for key in ('shop_name', 'category', 'pincode')})
+
+    def match_stores(self, text, category=None, pincode=None):
+        """Ids of the active stores with a product whose name has every known token of text.
+
+        Tokens no product name contains (e.g. 'fresh' or 'urgent') are ignored, so a
+        request names its item loosely. The smallest posting or facet set drives the
+        intersection, so the cost follows the number of matching products rather
+        than the number of stores.
+        """
+        tokens = {normalize_token(token) for token in tokenize(text)}
+        with self._lock:
+            sets = [self._name_postings[token] for token in tokens if token in self._name_postings]
+            if not sets:
+                return set()
+            for facet, value in (('category', category), ('pincode', pincode)):
+                if value is not None and value != '':
+                    sets.append(self._facets.get((facet, value), set()))
+            sets.sort(key=len)
+            matched = set(sets[0])
+            for other in sets[1:]:
+                if not matched:
+                    break
+                matched &= other
+            matched -= self._hidden
+            return {self._products[product_id]['store_id'] for product_id in matched}
+
+    def _in_price_range(self, product_ids, min_price, max_price):
+        """Yield (sort price, product id) for products inside the price range"""
+        for product_id in product_ids:
+            price = self._products[product_id]['price_value']
+            if price is None:
+                if min_price is not None or max_price is not None:
+                    continue
+                price = float('inf')
+            elif (min_price is not None and price < min_price) or (max_price is not None and price > max_price):
+                continue
+            yield price, product_id
+
+    def _walk(self, id_sets, filters, limit, min_price, max_price):
+        """Collect (price, id) of visible products in every set, walking price buckets upwards.
+
+        With a limit, returns the `limit` cheapest; every later bucket is pricier, so
+        the walk stops at the first bucket boundary with enough matches. Selective
+        queries intersect all sets at once, and only walk the buckets of the result
+        if it is too large to price product by product.
+        """
+        # Each product of the running intersection costs one lookup per term of a PostingUnion,
+        # so those come last, once the plain sets have narrowed it down
+        sets = sorted(id_sets + filters, key=lambda ids: (isinstance(ids, PostingUnion), len(ids)))
+        if sets and len(sets[0]) <= MATERIALIZE_LIMIT:
+            matched = sets[0] & sets[1] if len(sets) > 1 else set(sets[0])
+            for other in sets[2:]:
+                if not matched:
+                    break
+                matched &= other
+            matched -= self._hidden
+            if limit is None or len(matched) <= SCAN_LIMIT:
+                found = self._in_price_range(matched, min_price, max_price)
+                return heapq.nsmallest(limit, found) if limit is not None else list(found)
+            sets = [matched]
+
+        low = price_bucket(min_price) if min_price is not None else None
+        high = price_bucket(max_price) if max_price is not None else None
+        start = bisect.bisect_left(self._bucket_order, low) if low is not None else 0
+
+        found = []
+        for bucket in self._bucket_order[start:]:
+            if high is not None and bucket > high:
+                break
+            matched = self._price_buckets[bucket] & sets[0] if sets else set(self._price_buckets[bucket])
+            for other in sets[1:]:
+                if not matched:
+                    break
+                matched &= other
+            matched -= self._hidden
+            found.extend(self._in_price_range(matched, min_price, max_price))
+            if limit is not None and len(found) >= limit:
+                break
+        return heapq.nsmallest(limit, found) if limit is not None else found
+
+# Global index instance
+product_index = ProductIndex()
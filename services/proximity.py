@@ -0,0 +1,143 @@
+import csv
+import math
+import os
+import threading
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.2
+# Grid cells of 0.1 degree are roughly 11 km across
+CELL_DEGREES = 0.1
+# Give up widening the search past this many rings (~1,100 km)
+MAX_RINGS = 100
+MIN_PREFIX_LENGTH = 3
+
+DEFAULT_CENTROIDS_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                      'data', 'pincode_centroids.csv')
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometres"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+def cell_of(lat, lon):
+    return int(math.floor(lat / CELL_DEGREES)), int(math.floor(lon / CELL_DEGREES))
+
+class PincodeDirectory:
+    """Pincode -> (lat, lon) centroids, with prefix fallback for pincodes missing from the table"""
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv('PINCODE_CENTROIDS_FILE', DEFAULT_CENTROIDS_FILE)
+        self._centroids = {}
+        self._prefixes = {}
+        self.load()
+
+    def load(self):
+        """Read the centroid table and precompute average centroids per pincode prefix"""
+        centroids = {}
+        try:
+            with open(self.path, newline='', encoding='utf-8') as f:
+                rows = (line for line in f if not line.startswith('#'))
+                for row in csv.DictReader(rows):
+                    centroids[row['pincode'].strip()] = (float(row['latitude']), float(row['longitude']))
+        except FileNotFoundError:
+            print(f"Pincode centroid table not found at {self.path}; nearby search disabled")
+
+        sums = {}
+        for pincode, (lat, lon) in centroids.items():
+            for length in range(MIN_PREFIX_LENGTH, len(pincode)):
+                total = sums.setdefault(pincode[:length], [0.0, 0.0, 0])
+                total[0] += lat
+                total[1] += lon
+                total[2] += 1
+        self._centroids = centroids
+        self._prefixes = {prefix: (lat / count, lon / count) for prefix, (lat, lon, count) in sums.items()}
+
+    def locate(self, pincode):
+        """Return (lat, lon) for a pincode, or None if neither it nor its district is known"""
+        pincode = (pincode or '').strip()
+        if pincode in self._centroids:
+            return self._centroids[pincode]
+        for length in range(len(pincode) - 1, MIN_PREFIX_LENGTH - 1, -1):
+            centroid = self._prefixes.get(pincode[:length])
+            if centroid:
+                return centroid
+        return None
+
+class StoreProximityIndex:
+    """Uniform lat/lon grid of active stores for k-nearest-store queries"""
+
+    def __init__(self, directory=None):
+        self.directory = directory or PincodeDirectory()
+        self._lock = threading.Lock()
+        self._cells = {}   # (row, col) -> set of store ids
+        self._stores = {}  # store id -> (lat, lon, cell, category)
+
+    def __len__(self):
+        return len(self._stores)
+
+    def set_store(self, store):
+        """Place (or move) a store on the grid from its pincode; inactive or unplaceable stores are removed"""
+        location = self.directory.locate(store.get('pincode'))
+        with self._lock:
+            self._remove(store['id'])
+            if location is None or store.get('status', 'active') != 'active':
+                return
+            cell = cell_of(*location)
+            self._stores[store['id']] = (location[0], location[1], cell, store.get('category'))
+            self._cells.setdefault(cell, set()).add(store['id'])
+
+    def remove(self, store_id):
+        with self._lock:
+            self._remove(store_id)
+
+    def _remove(self, store_id):
+        entry = self._stores.pop(store_id, None)
+        if entry is not None:
+            cell = self._cells.get(entry[2])
+            if cell is not None:
+                cell.discard(store_id)
+                if not cell:
+                    del self._cells[entry[2]]
+
+    def nearest(self, lat, lon, k, category=None):
+        """Return up to k (distance_km, store_id) pairs, nearest first.
+
+        Searches rings of grid cells outward from the query cell and stops once the
+        next ring cannot hold anything closer than the current k-th result.
+        """
+        row, col = cell_of(lat, lon)
+        found = []
+        with self._lock:
+            for ring in range(MAX_RINGS + 1):
+                for cell in self._ring(row, col, ring):
+                    for store_id in self._cells.get(cell, ()):
+                        store_lat, store_lon, _, store_category = self._stores[store_id]
+                        if category and store_category != category:
+                            continue
+                        found.append((haversine_km(lat, lon, store_lat, store_lon), store_id))
+                if len(found) >= k:
+                    found.sort()
+                    found = found[:k]
+                    # Anything in ring + 1 is at least `ring` whole cells away on one axis
+                    min_cos = math.cos(math.radians(min(abs(lat) + (ring + 1) * CELL_DEGREES, 89.0)))
+                    if found[-1][0] <= ring * CELL_DEGREES * KM_PER_DEGREE * min_cos:
+                        break
+        found.sort()
+        return found[:k]
+
+    def _ring(self, row, col, ring):
+        """Cells whose Chebyshev distance from (row, col) is exactly `ring`"""
+        if ring == 0:
+            yield row, col
+            return
+        for d in range(-ring, ring + 1):
+            yield row - ring, col + d
+            yield row + ring, col + d
+        for d in range(-ring + 1, ring):
+            yield row + d, col - ring
+            yield row + d, col + ring
+
+# Global index instance
+store_proximity = StoreProximityIndex()
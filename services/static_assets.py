@@ -0,0 +1,127 @@
+import gzip
+import hashlib
+import os
+import threading
+import time
+
+DEFAULT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# URL path -> (file name, content type)
+STATIC_FILES = {
+    '/': ('index.html', 'text/html; charset=utf-8'),
+    '/index.html': ('index.html', 'text/html; charset=utf-8'),
+    '/script.js': ('script.js', 'application/javascript; charset=utf-8'),
+    '/styles.css': ('styles.css', 'text/css; charset=utf-8')
+}
+
+# Files smaller than this are not worth compressing
+MIN_GZIP_SIZE = 256
+
+class StaticAsset:
+    def __init__(self, body, content_type, mtime):
+        self.body = body
+        self.content_type = content_type
+        self.mtime = mtime
+        digest = hashlib.sha1(body).hexdigest()
+        self.etag = '"' + digest + '"'
+        self.gzip_body = None
+        self.gzip_etag = None
+        if len(body) >= MIN_GZIP_SIZE:
+            compressed = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(compressed) < len(body):
+                self.gzip_body = compressed
+                # Each encoding is a different representation, so it gets its own strong ETag
+                self.gzip_etag = '"' + digest + '-gz"'
+
+class StaticAssets:
+    """The front-end files, read and gzip-compressed once and served from memory.
+
+    With STATIC_RELOAD enabled the files are re-checked (at most once a second) and
+    reloaded when their modification time changes, for editing them during development.
+    """
+
+    def __init__(self, root=None):
+        self.root = root or os.getenv('STATIC_ROOT', DEFAULT_ROOT)
+        self.reload = os.getenv('STATIC_RELOAD', 'false').lower() in ('1', 'true', 'yes')
+        self.max_age = int(os.getenv('STATIC_MAX_AGE', 300))
+        self._assets = {}
+        self._lock = threading.Lock()
+        self._checked = 0.0
+
+    def load(self):
+        """Read and compress every static file; missing files are skipped"""
+        assets = {}
+        for file_name, content_type in set(STATIC_FILES.values()):
+            asset = self._read(file_name, content_type)
+            if asset is not None:
+                assets[file_name] = asset
+        with self._lock:
+            self._assets = assets
+            self._checked = time.monotonic()
+        return len(assets)
+
+    def _read(self, file_name, content_type):
+        path = os.path.join(self.root, file_name)
+        try:
+            with open(path, 'rb') as f:
+                mtime = os.fstat(f.fileno()).st_mtime
+                return StaticAsset(f.read(), content_type, mtime)
+        except FileNotFoundError:
+            print(f"Static file not found: {path}")
+            return None
+
+    def _refresh(self):
+        """Reload files whose modification time changed since they were read"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._checked < 1:
+                return
+            self._checked = now
+            current = dict(self._assets)
+        for file_name, content_type in set(STATIC_FILES.values()):
+            try:
+                mtime = os.stat(os.path.join(self.root, file_name)).st_mtime
+            except FileNotFoundError:
+                mtime = None
+            asset = current.get(file_name)
+            if asset is None and mtime is None:
+                continue
+            if asset is None or mtime is None or asset.mtime != mtime:
+                asset = self._read(file_name, content_type) if mtime is not None else None
+                with self._lock:
+                    if asset is None:
+                        self._assets.pop(file_name, None)
+                    else:
+                        self._assets[file_name] = asset
+
+    def get(self, path):
+        """Return the asset served at a URL path, or None"""
+        entry = STATIC_FILES.get(path)
+        if entry is None:
+            return None
+        if not self._checked:
+            self.load()
+        elif self.reload:
+            self._refresh()
+        return self._assets.get(entry[0])
+
+    def cache_control(self, asset):
+        """HTML is always revalidated; scripts and styles may be reused for max_age seconds"""
+        if self.reload or asset.content_type.startswith('text/html'):
+            return 'no-cache'
+        return f'public, max-age={self.max_age}'
+
+def etag_matches(if_none_match, etag):
+    """True if an If-None-Match header lists the given ETag (or is a wildcard)"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == '*' or candidate == etag:
+            return True
+    return False
+
+# Global asset cache
+static_assets = StaticAssets()
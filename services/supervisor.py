@@ -0,0 +1,183 @@
+import os
+import secrets
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+class Worker:
+    """One server process started by the supervisor"""
+
+    def __init__(self, slot, process):
+        self.slot = slot
+        self.process = process
+        self.started = time.monotonic()
+        self.retired = None
+        self.restart_at = None
+
+    @property
+    def pid(self):
+        return self.process.pid
+
+    def ready(self, events_dir):
+        # Workers bind their event socket just before they start accepting connections
+        return os.path.exists(os.path.join(events_dir, f'worker-{self.pid}.sock'))
+
+class Supervisor:
+    """Pre-forks SERVER_WORKERS server processes that share the port through SO_REUSEPORT.
+
+    Each worker is a fresh interpreter running the server script, so it opens its own
+    database pool and builds its own caches and indexes. Workers that exit are
+    restarted, backing off while they keep failing at startup. SIGHUP replaces the
+    workers one slot at a time, stopping an old worker only once its replacement is
+    accepting connections; SIGTERM or SIGINT stops them all. Stopped workers finish
+    their in-flight requests for up to SERVER_WORKER_GRACE seconds.
+    """
+
+    def __init__(self):
+        self.workers = int(os.getenv('SERVER_WORKERS', 0))
+        self.grace = float(os.getenv('SERVER_WORKER_GRACE', 40))
+        self.start_timeout = float(os.getenv('SERVER_WORKER_START_TIMEOUT', 120))
+        # Set in the environment of the processes the supervisor starts
+        worker_id = os.getenv('SERVER_WORKER_ID')
+        self.worker_id = int(worker_id) if worker_id is not None else None
+        self._workers = {}
+        self._stopping = []
+        self._backoff = {}
+        self._reload = False
+        self._stop = False
+        self._wake = threading.Event()
+
+    @property
+    def enabled(self):
+        return self.workers > 0 and self.worker_id is None
+
+    @property
+    def is_worker(self):
+        return self.worker_id is not None
+
+    @property
+    def runs_singletons(self):
+        """Whether this process runs once-per-server jobs such as archiving"""
+        return self.worker_id in (None, 0)
+
+    def run(self, argv=None):
+        """Start the workers and supervise them until SIGTERM or SIGINT"""
+        argv = argv or sys.argv
+        events_dir = tempfile.mkdtemp(prefix='localkirana-')
+        env = dict(os.environ, SERVER_EVENTS_DIR=events_dir)
+        # Sessions are signed so any worker can check a token another one issued
+        env.setdefault('SESSION_SECRET', secrets.token_hex(32))
+        # Share the cores between the workers' bcrypt pools rather than giving each all of them
+        env.setdefault('BCRYPT_WORKERS', str(max(1, (os.cpu_count() or 1) // self.workers)))
+        self._command = [sys.executable] + list(argv)
+        self._env = env
+        self._events_dir = events_dir
+
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, self._request_stop)
+        signal.signal(signal.SIGHUP, self._request_reload)
+        print(f"Supervisor {os.getpid()} starting {self.workers} workers")
+        try:
+            for slot in range(self.workers):
+                self._workers[slot] = self._spawn(slot)
+            while not self._stop:
+                self._wake.wait(1)
+                self._wake.clear()
+                if self._reload:
+                    self._reload = False
+                    self._rolling_restart()
+                self._reap()
+        finally:
+            for worker in self._workers.values():
+                self._retire(worker)
+            self._workers = {}
+            while self._stopping:
+                self._reap()
+                time.sleep(0.1)
+            shutil.rmtree(events_dir, ignore_errors=True)
+            print("Supervisor stopped.")
+
+    def _request_stop(self, signum, frame):
+        self._stop = True
+        self._wake.set()
+
+    def _request_reload(self, signum, frame):
+        self._reload = True
+        self._wake.set()
+
+    def _spawn(self, slot):
+        env = dict(self._env, SERVER_WORKER_ID=str(slot))
+        # Own process group, so a Ctrl+C in the terminal reaches only the supervisor,
+        # which then stops the workers gracefully
+        process = subprocess.Popen(self._command, env=env, start_new_session=True)
+        print(f"Started worker {slot} (pid {process.pid})")
+        return Worker(slot, process)
+
+    def _retire(self, worker):
+        """Ask a worker to stop accepting connections and exit once its requests finish"""
+        if worker.process.poll() is None:
+            worker.process.send_signal(signal.SIGTERM)
+        worker.retired = time.monotonic()
+        self._stopping.append(worker)
+
+    def _rolling_restart(self):
+        print("Reloading workers")
+        for slot, old in list(self._workers.items()):
+            new = self._spawn(slot)
+            deadline = time.monotonic() + self.start_timeout
+            while not new.ready(self._events_dir):
+                if new.process.poll() is not None or time.monotonic() > deadline or self._stop:
+                    print(f"Worker {slot} replacement failed to start; keeping pid {old.pid}")
+                    self._retire(new)
+                    new = None
+                    break
+                time.sleep(0.1)
+            if new is None:
+                if self._stop:
+                    return
+                continue
+            self._workers[slot] = new
+            self._retire(old)
+            self._reap()
+
+    def _reap(self):
+        now = time.monotonic()
+        for worker in list(self._stopping):
+            if worker.process.poll() is not None:
+                self._stopping.remove(worker)
+            elif now - worker.retired > self.grace:
+                print(f"Worker pid {worker.pid} still busy after {self.grace:g}s; killing it")
+                worker.process.kill()
+        for slot, worker in list(self._workers.items()):
+            code = worker.process.poll()
+            if code is None:
+                continue
+            if worker.restart_at is None:
+                # A worker that dies during startup is restarted with growing delays
+                if now - worker.started < 10:
+                    delay = self._backoff[slot] = min(self._backoff.get(slot, 0.5) * 2, 30)
+                else:
+                    delay = 0
+                    self._backoff.pop(slot, None)
+                print(f"Worker {slot} (pid {worker.pid}) exited with code {code}; restarting in {delay:g}s")
+                worker.restart_at = now + delay
+            if now >= worker.restart_at:
+                self._workers[slot] = self._spawn(slot)
+
+    def watch_parent(self, on_exit):
+        """In a worker, call on_exit() if the supervisor goes away"""
+        parent = os.getppid()
+
+        def watch():
+            while os.getppid() == parent:
+                time.sleep(1)
+            on_exit()
+
+        threading.Thread(target=watch, name='parent-watch', daemon=True).start()
+
+# Global supervisor instance
+supervisor = Supervisor()
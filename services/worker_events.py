@@ -0,0 +1,159 @@
+import errno
+import itertools
+import json
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+class WorkerEvents:
+    """Broadcasts in-memory state changes between the worker processes of one server.
+
+    Caches, search indexes, the chat notifier and the dashboard counters live in each
+    process, so a write served by one worker is published here for the others to apply.
+    Each worker binds a Unix datagram socket in SERVER_EVENTS_DIR, which the supervisor
+    creates; without it (a single process) publishing does nothing. Delivery is best
+    effort: an event for a worker whose socket buffer is full is dropped, and only the
+    caches' TTLs and the stats reconciliation correct for it.
+    
+    gather() also asks the other workers a question, such as their metrics, and
+    collects whatever their handlers return.
+    """
+
+    def __init__(self):
+        self.directory = os.getenv('SERVER_EVENTS_DIR')
+        self._socket = None
+        self._path = None
+        self._thread = None
+        self._handler = None
+        self._local = threading.local()
+        self._replies = itertools.count()
+
+    @property
+    def enabled(self):
+        return self.directory is not None
+
+    def start(self, handler):
+        """Bind this worker's socket and call handler(event) for each event from the others"""
+        if not self.enabled or self._thread is not None:
+            return False
+        self._path = os.path.join(self.directory, f'worker-{os.getpid()}.sock')
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.bind(self._path)
+        self._handler = handler
+        self._thread = threading.Thread(target=self._run, name='worker-events', daemon=True)
+        self._thread.start()
+        return True
+
+    def shutdown(self):
+        """Stop receiving events and remove this worker's socket"""
+        sock, self._socket = self._socket, None
+        self._thread = None
+        if sock is not None:
+            # An empty datagram wakes the receiving thread so it can exit
+            sock.sendto(b'', self._path)
+            os.remove(self._path)
+            sock.close()
+
+    @contextmanager
+    def deferred(self):
+        """Hold the events this thread publishes during the block, and yield them.
+
+        For writes made inside a longer transaction: the other workers re-read what
+        changed, so they must not hear of it before the commit. The events are sent
+        when the block completes and dropped if it raises.
+        """
+        held = self._local.held = []
+        try:
+            yield held
+        finally:
+            self._local.held = None
+        for event in held:
+            self._send(event)
+
+    def publish(self, kind, **fields):
+        """Send an event to every other worker; JSON-encodes fields, dates as strings"""
+        event = dict(fields, kind=kind)
+        held = getattr(self._local, 'held', None)
+        if held is not None:
+            held.append(event)
+        else:
+            self._send(event)
+
+    def gather(self, kind, timeout, **fields):
+        """Send an event to every other worker and return their handlers' results.
+
+        The results come back to a socket bound for this call; workers that haven't
+        answered within timeout seconds are left out.
+        """
+        if self._socket is None:
+            return []
+        reply_path = os.path.join(self.directory, f'reply-{os.getpid()}-{next(self._replies)}')
+        replies = []
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.bind(reply_path)
+            try:
+                expected = self._send(dict(fields, kind=kind, reply_to=reply_path))
+                deadline = time.monotonic() + timeout
+                while len(replies) < expected:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    sock.settimeout(remaining)
+                    try:
+                        replies.append(json.loads(sock.recv(1 << 22)))
+                    except socket.timeout:
+                        break
+            finally:
+                os.remove(reply_path)
+        return replies
+
+    def _send(self, event):
+        """Send an event to the other workers; returns how many it was delivered to"""
+        if self._socket is None:
+            return 0
+        kind = event['kind']
+        delivered = 0
+        payload = json.dumps(event, default=str).encode('utf-8')
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if path == self._path or not name.endswith('.sock'):
+                continue
+            try:
+                self._socket.sendto(payload, socket.MSG_DONTWAIT, path)
+                delivered += 1
+            except OSError as e:
+                if e.errno in (errno.ECONNREFUSED, errno.ENOENT):
+                    # A worker that died without removing its socket
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                else:
+                    print(f"Error sending {kind} event to {name}: {e}")
+        return delivered
+
+    def _run(self):
+        sock = self._socket
+        while True:
+            try:
+                payload = sock.recv(1 << 20)
+            except OSError:
+                return
+            if not payload:
+                return
+            try:
+                event = json.loads(payload)
+                result = self._handler(event)
+                if event.get('reply_to'):
+                    sock.sendto(json.dumps(result, default=str).encode('utf-8'), socket.MSG_DONTWAIT,
+                                event['reply_to'])
+            except (ConnectionRefusedError, FileNotFoundError):
+                # The asking worker gave up waiting and removed its reply socket
+                pass
+            except Exception as e:
+                print(f"Error applying worker event: {e}")
+
+# Global events instance
+worker_events = WorkerEvents()
@@ -0,0 +1,14 @@
+-- Composite indexes for the filtered, cursor-paginated bookings and requests feeds.
+-- Every feed query orders by (created_at DESC, id DESC), so each filter column
+-- leads an index that ends in (created_at, id).
+USE localkirana_db;
+
+CREATE INDEX idx_bookings_created ON bookings (created_at, id);
+CREATE INDEX idx_bookings_customer_created ON bookings (customer_id, created_at, id);
+CREATE INDEX idx_bookings_store_created ON bookings (store_id, created_at, id);
+CREATE INDEX idx_bookings_status_created ON bookings (status, created_at, id);
+
+CREATE INDEX idx_requests_created ON requests (created_at, id);
+CREATE INDEX idx_requests_customer_created ON requests (customer_id, created_at, id);
+CREATE INDEX idx_requests_target_store_created ON requests (target_store, created_at, id);
+CREATE INDEX idx_requests_status_created ON requests (status, created_at, id);
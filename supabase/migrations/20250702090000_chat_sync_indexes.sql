@@ -0,0 +1,7 @@
+-- Indexes for incremental chat sync (/api/chats/sync): look up a participant's
+-- chats from either side, then their messages past a message-id cursor.
+USE localkirana_db;
+
+CREATE INDEX idx_chats_participant1 ON chats (participant1_type, participant1_id);
+CREATE INDEX idx_chats_participant2 ON chats (participant2_type, participant2_id);
+CREATE INDEX idx_messages_chat_id ON messages (chat_id, id);
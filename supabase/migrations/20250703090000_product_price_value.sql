@@ -0,0 +1,10 @@
+-- Numeric price for range filtering and sorting. `price` stays the display
+-- string (e.g. '₹1,299'); `price_value` holds its parsed amount.
+USE localkirana_db;
+
+ALTER TABLE products ADD COLUMN price_value DECIMAL(12, 2) NULL AFTER price;
+
+UPDATE products
+SET price_value = CAST(NULLIF(REGEXP_SUBSTR(REPLACE(price, ',', ''), '[0-9]+(\\.[0-9]+)?'), '') AS DECIMAL(12, 2));
+
+CREATE INDEX idx_products_price_value ON products (price_value);
@@ -0,0 +1,7 @@
+-- Indexes for archiving (services/archive.py) and the chat history feed: the archiver
+-- scans messages oldest first by (created_at, id), and /api/chats/history pages one
+-- chat's messages newest first by the same key.
+USE localkirana_db;
+
+CREATE INDEX idx_messages_created ON messages (created_at, id);
+CREATE INDEX idx_messages_chat_created ON messages (chat_id, created_at, id);
@@ -0,0 +1,16 @@
+-- Per-store request inbox: each new request is routed to the stores whose catalogue
+-- has a matching product, and /api/stores/{id}/requests pages a store's matches newest
+-- first by (created_at, request_id). created_at is copied from the request.
+USE localkirana_db;
+
+CREATE TABLE request_matches (
+    store_id INT NOT NULL,
+    request_id INT NOT NULL,
+    created_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (store_id, request_id),
+    FOREIGN KEY (store_id) REFERENCES stores(id) ON DELETE CASCADE,
+    FOREIGN KEY (request_id) REFERENCES requests(id) ON DELETE CASCADE
+);
+
+CREATE INDEX idx_request_matches_store_created ON request_matches (store_id, created_at, request_id);
+CREATE INDEX idx_request_matches_request ON request_matches (request_id);